@@ -1,9 +1,18 @@
+import os
+from typing import Any, Callable, Dict, Optional
+
+from aggregates import stats_answer
+from cache import TTLCache, canonical_key, normalize_question
+from callbacks import install_tracing_handler
 from langchain.agents.agent import AgentExecutor
 from langchain.agents.mrkl.base import ZeroShotAgent
 from langchain.agents.tools import Tool
 from langchain.llms import OpenAI
-from langchain.utilities.serpapi import SerpAPIWrapper
 from movie_database_tool import LLMGraphChain
+from results import record_results
+from search import SearchClient
+from speculation import SpendCap, Speculator
+from traversal import collaboration_answer
 
 ZERO_SHOT_FORMAT_INSTRUCTIONS = """
 Use the following format:
@@ -28,27 +37,116 @@ g. Final Answer: Provide the ultimate response to the original input question.
 class MovieAgent(AgentExecutor):
     """Movie agent"""
 
+    speculator: Optional[Speculator] = None
+
     @staticmethod
     def function_name():
         return "MovieAgent"
 
     @classmethod
-    def initialize(cls, movie_graph, *args, **kwargs):
-        llm = OpenAI(temperature=0)
+    def initialize(
+        cls,
+        movie_graph,
+        *args,
+        llm=None,
+        search=None,
+        cache_path=None,
+        speculate: Optional[Callable[[str], bool]] = None,
+        speculation_budget: Optional[SpendCap] = None,
+        parse: Optional[Callable[[str], Optional[Dict]]] = None,
+        **kwargs,
+    ):
+        """Create the agent with its tools
+
+        With ``speculate``, the questions it accepts start the graph lookup
+        and the web search right away, see ``Speculator``. ``parse`` gets the
+        ``query_movies`` parameters of a graph lookup input without the LLM,
+        such as ``FastPath.parse``, so a lookup the agent rephrased still
+        uses the speculative one when both have the same parameters.
+        """
+        llm = llm or OpenAI(temperature=0)  # type: ignore
+        install_tracing_handler()
 
-        movie_tool = LLMGraphChain(llm=llm, graph=movie_graph, verbose=True)
+        # Cache the question translation and the graph results, on disk if set
+        cache_path = cache_path or os.environ.get("IMDB_CACHE_PATH")
+        question_cache = TTLCache(
+            maxsize=4096, ttl=24 * 3600, path=cache_path, namespace="question"
+        )
+        movie_tool = LLMGraphChain(
+            llm=llm,
+            graph=movie_graph,
+            verbose=True,
+            question_cache=question_cache,
+            result_cache=TTLCache(
+                maxsize=4096, ttl=3600, path=cache_path, namespace="result"
+            ),
+        )
+
+        def similar_movies(text: str) -> str:
+            scores = movie_graph.query_movies(similar_to=text.strip().strip('"'))
+            return record_results(scores)
+
+        def collaborations(text: str) -> str:
+            return collaboration_answer(movie_graph, text)
+
+        def movie_stats(text: str) -> str:
+            return stats_answer(movie_graph, text)
 
         # Load the tool configs that are needed.
-        search = SerpAPIWrapper()
+        search = search or SearchClient(
+            cache=TTLCache(
+                maxsize=4096, ttl=24 * 3600, path=cache_path, namespace="search"
+            ),
+            rate=float(os.environ.get("SERPAPI_RATE", 5)),
+        )
+
+        def movie_params(text: str) -> Optional[str]:
+            # Translated by the LLM once a lookup ran, or parsed locally
+            question = text.strip().strip('"')
+            params = question_cache.get(normalize_question(question))
+            if params is None and parse is not None:
+                params = parse(question)
+            if not isinstance(params, dict):
+                return None
+            params = {k: v for k, v in params.items() if v not in (None, "", [])}
+            return canonical_key(params, movie_graph.version) if params else None
+
+        movies_chain, search_run = movie_tool.run, search.run
+        speculator = None
+        if speculate is not None:
+            speculator = Speculator(
+                {"Movies_chain": movie_tool.run, "Search": search.run},
+                should_speculate=speculate,
+                budget=speculation_budget,
+                version=lambda: movie_graph.version,
+                match={"Movies_chain": movie_params},
+            )
+            movies_chain = speculator.wrap("Movies_chain")
+            search_run = speculator.wrap("Search")
         tools = [
             Tool(
                 name="Movies_chain",
-                func=movie_tool.run,
+                func=movies_chain,
                 description="Utilize this tool to search within a movie database, specifically designed to answer movie-related questions. The tool accepts inputs such as clear title, genre, director, actor, or year, ensuring accurate and targeted results. Ideal for inquiries that require information from one or more of the following categories: title, genre, director, actor, or year. This specialized tool offers streamlined search capabilities to help you find the movie information you need with ease.",
             ),
+            Tool(
+                name="Collaborations",
+                func=collaborations,
+                description="Use this tool for questions about people who worked together. The input is a list of actors or directors, such as Al Pacino, Robert De Niro, to get the people who worked with all of them and the number of movies they shared, or two people joined by an arrow, such as Christopher Nolan -> Steven Spielberg, to get the shortest chain of movies and people linking them.",
+            ),
+            Tool(
+                name="Movie_stats",
+                func=movie_stats,
+                description="Use this tool for statistics and best rated movies of a director, actor, genre or decade. The input is a key and a name, such as director: Akira Kurosawa or decade: 1990s, or a genre and a decade, such as genre: Drama, decade: 1990s. It returns the number of movies, their mean rating and runtime, and the best rated ones. To rank directors, actors, genres or decades, use rank: director, by: count or rank: genre, by: rating.",
+            ),
+            Tool(
+                name="Similar_movies",
+                func=similar_movies,
+                description="Use this tool to find movies with a story similar to a movie or to a plot description, such as movies like Inception or movies about a heist in dreams. The input is a single movie title or a short description of the plot. It returns the closest movies of the database with their similarity.",
+            ),
             Tool(
                 name="Search",
-                func=search.run,
+                func=search_run,
                 description="Use this tool when you need to gather broader or non-movie-specific information, such as finding the year a particular event occurred, researching historical context, searching for the year of nominated movies, or seeking other related data. After obtaining the necessary details, you can then use the movies_chain for more targeted movie information. This tool offers a wide range of search capabilities to help you find the answers you need on the internet.",
             ),
         ]
@@ -57,10 +155,18 @@ class MovieAgent(AgentExecutor):
             llm, tools, format_instructions=ZERO_SHOT_FORMAT_INSTRUCTIONS
         )
 
-        return cls.from_agent_and_tools(agent=agent, tools=tools, verbose=True)
+        return cls.from_agent_and_tools(
+            agent=agent, tools=tools, verbose=True, speculator=speculator
+        )
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     def run(self, *args, **kwargs):
         return super().run(*args, **kwargs)
+
+    def _call(self, inputs: Dict[str, str]) -> Dict[str, Any]:
+        if self.speculator is None:
+            return super()._call(inputs)
+        with self.speculator.request(inputs.get("input", "")):
+            return super()._call(inputs)
@@ -0,0 +1,711 @@
+import heapq
+import json
+import math
+import re
+from bisect import insort
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from results import MovieResult, record_results
+
+# Group-by keys of the views, genre_decade groups by both
+KINDS = ("director", "actor", "genre", "decade", "genre_decade")
+RANKINGS = ("count", "mean_rating")
+# Columns of a cleaned csv chunk read by the views
+FIELDS = ("Title", "Year", "Rating", "Runtime", "Genre", "Director", "Actors")
+# Statistics of the groups of a kind, one entry per group, and the offsets
+# of the best rated titles of every group
+COLUMNS = (
+    "count",
+    "rating_sum",
+    "rated",
+    "runtime_sum",
+    "timed",
+    "shortest",
+    "longest",
+    "top_starts",
+    "top_ratings",
+)
+
+Key = Tuple[str, Any]
+# Directors, actors, genres, decade, rating and runtime counted for a title
+Record = Tuple[Sequence, Sequence, Sequence, Optional[int], Any, Any]
+
+
+def _value(value) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+def _items(values) -> Sequence:
+    # Missing lists are NaN in a csv chunk
+    return values if isinstance(values, (list, tuple)) else ()
+
+
+def decade_of(year) -> Optional[int]:
+    """Get the decade of a year, such as 1990 for 1994"""
+    year = _value(year)
+    return None if year is None else int(year) // 10 * 10
+
+
+def parse_decade(text) -> int:
+    """Read a decade written as 1994, 1990s, 90s or '90s"""
+    if isinstance(text, (int, float)) and not isinstance(text, bool):
+        return int(text) // 10 * 10
+    match = re.fullmatch(r"(?:the\s+)?'?(\d{2}|\d{4})'?s?", str(text).strip().lower())
+    if match is None:
+        raise ValueError(f"Unknown decade {text!r}, expected such as 1990s or 90s")
+    year = int(match.group(1))
+    if year < 100:
+        # Two digits name a decade of the catalog, from the 1920s to the 2010s
+        year += 1900 if year >= 20 else 2000
+    return year // 10 * 10
+
+
+def movie_record(movie: Dict) -> Record:
+    """Get the counted fields of a movie in the format taken by ``add_movies``"""
+    return (
+        _items(movie.get("Director")),
+        _items(movie.get("Actors")),
+        _items(movie.get("Genre")),
+        decade_of(movie.get("Year")),
+        _value(movie.get("Rating")),
+        _value(movie.get("Runtime")),
+    )
+
+
+def record_keys(record: Record) -> List[Key]:
+    """Get the groups a title is counted in"""
+    directors, actors, genres, decade = record[:4]
+    keys = [("director", name) for name in directors]
+    keys += [("actor", name) for name in actors]
+    keys += [("genre", name) for name in genres]
+    if decade is not None:
+        keys.append(("decade", decade))
+        keys += [("genre_decade", (name, decade)) for name in genres]
+    return list(dict.fromkeys(keys))
+
+
+def _view(count, rating_sum, rated, runtime_sum, timed, shortest, longest, top):
+    return {
+        "count": count,
+        "mean_rating": round(rating_sum / rated, 2) if rated else None,
+        "mean_runtime": round(runtime_sum / timed, 1) if timed else None,
+        "min_runtime": shortest,
+        "max_runtime": longest,
+        "top": top,
+    }
+
+
+def _rank_key(by: str, key, view: Dict) -> Tuple:
+    if by == "count":
+        return -view["count"], str(key)
+    return -view["mean_rating"], -view["count"], str(key)
+
+
+class _Stats:
+    """Running statistics of a group changed since the columns were built"""
+
+    __slots__ = (
+        "members",
+        "rating_sum",
+        "rated",
+        "runtime_sum",
+        "timed",
+        "shortest",
+        "longest",
+        "top",
+    )
+
+    def __init__(
+        self,
+        members: Optional[set] = None,
+        rating_sum: float = 0.0,
+        rated: int = 0,
+        runtime_sum: float = 0.0,
+        timed: int = 0,
+        shortest: Optional[float] = None,
+        longest: Optional[float] = None,
+        top: Optional[List[Tuple[float, str]]] = None,
+    ):
+        self.members = set() if members is None else members
+        self.rating_sum = rating_sum
+        self.rated = rated
+        self.runtime_sum = runtime_sum
+        self.timed = timed
+        self.shortest = shortest
+        self.longest = longest
+        # Best rated titles, as sorted (-rating, title) pairs
+        self.top = [] if top is None else top
+
+    def add(self, title: str, rating, runtime, top_n: int):
+        self.members.add(title)
+        if rating is not None:
+            self.rating_sum += rating
+            self.rated += 1
+            if len(self.top) < top_n or (-rating, title) < self.top[-1]:
+                insort(self.top, (-rating, title))
+                del self.top[top_n:]
+        if runtime is not None:
+            self.runtime_sum += runtime
+            self.timed += 1
+            if self.shortest is None or runtime < self.shortest:
+                self.shortest = runtime
+            if self.longest is None or runtime > self.longest:
+                self.longest = runtime
+
+    def remove(self, title: str, rating, runtime, records: Dict, top_n: int):
+        # The next best, shortest or longest title is read from the records
+        # of the members when the removed title was one
+        self.members.discard(title)
+        if rating is not None:
+            self.rating_sum -= rating
+            self.rated -= 1
+            if (-rating, title) in self.top:
+                self.top = heapq.nsmallest(
+                    top_n,
+                    (
+                        (-records[t][4], t)
+                        for t in self.members
+                        if records[t][4] is not None
+                    ),
+                )
+        if runtime is not None:
+            self.runtime_sum -= runtime
+            self.timed -= 1
+            if runtime in (self.shortest, self.longest):
+                runtimes = [records[t][5] for t in self.members]
+                runtimes = [r for r in runtimes if r is not None]
+                self.shortest = min(runtimes, default=None)
+                self.longest = max(runtimes, default=None)
+
+    def view(self) -> Optional[Dict]:
+        if not self.members:
+            return None
+        top = [[title, -rating] for rating, title in self.top]
+        return _view(
+            len(self.members),
+            self.rating_sum,
+            self.rated,
+            self.runtime_sum,
+            self.timed,
+            self.shortest,
+            self.longest,
+            top,
+        )
+
+
+class _Groups:
+    """Statistics of the groups of one kind, as columns indexed by group code
+
+    The titles of every group are kept, as offsets into the titles sorted by
+    group, to start the running statistics of a group an update changes.
+    Groups read from a snapshot have no titles.
+    """
+
+    def __init__(
+        self,
+        keys: List,
+        columns: Dict[str, np.ndarray],
+        top_titles: List[str],
+        members: Optional[Tuple[np.ndarray, List[str]]] = None,
+    ):
+        self.keys = keys
+        self.codes = dict(zip(keys, range(len(keys))))
+        self.columns = columns
+        self.top_titles = top_titles
+        self.members = members
+        # Views read so far, the columns never change
+        self._views: Dict[int, Dict] = {}
+        self._orders: Dict[Tuple[str, int], np.ndarray] = {}
+        self._names: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def count(
+        cls,
+        keys: List,
+        positions: np.ndarray,
+        codes: np.ndarray,
+        title_columns: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+        top_n: int,
+    ) -> "_Groups":
+        """Count the titles at some positions in the groups of their codes
+
+        ``title_columns`` holds the titles, their rank in sorted order, their
+        rating and their runtime.
+        """
+        titles, title_ranks, ratings, runtimes = title_columns
+        # Each title once per group, sorted by group then catalog order
+        pairs = np.unique(codes.astype(np.int64) * len(titles) + positions)
+        codes, positions = np.divmod(pairs, max(len(titles), 1))
+        n = len(keys)
+        starts = np.searchsorted(codes, np.arange(n + 1))
+
+        rating, runtime = ratings[positions], runtimes[positions]
+        rated, timed = ~np.isnan(rating), ~np.isnan(runtime)
+        shortest, longest = np.full(n, np.nan), np.full(n, np.nan)
+        np.fmin.at(shortest, codes[timed], runtime[timed])
+        np.fmax.at(longest, codes[timed], runtime[timed])
+
+        # The best rated titles of a group come first once sorted by group,
+        # rating and title, as (-rating, title) pairs sort
+        order = np.flatnonzero(rated)
+        order = order[
+            np.lexsort((title_ranks[positions[order]], -rating[order], codes[order]))
+        ]
+        first = np.searchsorted(codes[order], np.arange(n))
+        order = order[np.arange(len(order)) - first[codes[order]] < top_n]
+
+        columns = {
+            "count": np.diff(starts),
+            "rating_sum": np.bincount(codes[rated], rating[rated], minlength=n),
+            "rated": np.bincount(codes[rated], minlength=n),
+            "runtime_sum": np.bincount(codes[timed], runtime[timed], minlength=n),
+            "timed": np.bincount(codes[timed], minlength=n),
+            "shortest": shortest,
+            "longest": longest,
+            "top_starts": np.searchsorted(codes[order], np.arange(n + 1)),
+            "top_ratings": rating[order],
+        }
+        top_titles = titles[positions[order]].tolist()
+        return cls(keys, columns, top_titles, (starts, titles[positions].tolist()))
+
+    def view(self, code: int) -> Dict:
+        view = self._views.get(code)
+        if view is None:
+            view = self._views[code] = self._read(code)
+        return view
+
+    def _read(self, code: int) -> Dict:
+        columns = self.columns
+        low, high = columns["top_starts"][code : code + 2].tolist()
+        top = zip(self.top_titles[low:high], columns["top_ratings"][low:high].tolist())
+        timed = int(columns["timed"][code])
+        return _view(
+            int(columns["count"][code]),
+            float(columns["rating_sum"][code]),
+            int(columns["rated"][code]),
+            float(columns["runtime_sum"][code]),
+            timed,
+            float(columns["shortest"][code]) if timed else None,
+            float(columns["longest"][code]) if timed else None,
+            [[title, rating] for title, rating in top],
+        )
+
+    def stats(self, code: int) -> _Stats:
+        """Start the running statistics of a group"""
+        assert self.members is not None, "Groups read from a snapshot have no titles"
+        starts, titles = self.members
+        view = self.view(code)
+        columns = self.columns
+        return _Stats(
+            set(titles[starts[code] : starts[code + 1]]),
+            float(columns["rating_sum"][code]),
+            int(columns["rated"][code]),
+            float(columns["runtime_sum"][code]),
+            int(columns["timed"][code]),
+            view["min_runtime"],
+            view["max_runtime"],
+            [(-rating, title) for title, rating in view["top"]],
+        )
+
+    def order(self, by: str, min_count: int) -> np.ndarray:
+        """Get the codes of the groups in the order of a ranking"""
+        order = self._orders.get((by, min_count))
+        if order is None:
+            columns = self.columns
+            names = np.argsort(np.argsort([str(key) for key in self.keys]))
+            if by == "count":
+                order = np.lexsort((names, -columns["count"]))
+            else:
+                order = np.flatnonzero(
+                    (columns["count"] >= min_count) & (columns["rated"] > 0)
+                )
+                means = columns["rating_sum"][order] / columns["rated"][order]
+                order = order[
+                    np.lexsort(
+                        (names[order], -columns["count"][order], -np.round(means, 2))
+                    )
+                ]
+            self._orders[by, min_count] = order
+        return order
+
+    def names(self) -> Dict[str, Any]:
+        """Get the keys by their lowercase name"""
+        if self._names is None:
+            self._names = {str(key).lower(): key for key in self.keys}
+        return self._names
+
+    def arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        arrays = {f"{prefix}.{column}": self.columns[column] for column in COLUMNS}
+        arrays[f"{prefix}.keys"] = _encoded(self.keys)
+        arrays[f"{prefix}.top_titles"] = _encoded(self.top_titles)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], prefix: str) -> "_Groups":
+        keys = [
+            tuple(key) if isinstance(key, list) else key
+            for key in _decoded(arrays[f"{prefix}.keys"])
+        ]
+        columns = {column: arrays[f"{prefix}.{column}"] for column in COLUMNS}
+        return cls(keys, columns, _decoded(arrays[f"{prefix}.top_titles"]))
+
+
+def _encoded(items: List) -> np.ndarray:
+    return np.frombuffer(json.dumps(items).encode(), dtype=np.uint8)
+
+
+def _decoded(array: np.ndarray) -> List:
+    return json.loads(array.tobytes())
+
+
+def count_records(records: Dict[str, Record], top_n: int = 10) -> Dict[str, _Groups]:
+    """Count the groups of every kind from the records of the titles"""
+    values = list(records.values())
+    titles = np.array(list(records), dtype=object)
+    decades = np.array([np.nan if r[3] is None else r[3] for r in values], float)
+    ratings = np.array([np.nan if r[4] is None else r[4] for r in values], float)
+    runtimes = np.array([np.nan if r[5] is None else r[5] for r in values], float)
+    columns = titles, np.argsort(np.argsort(titles)), ratings, runtimes
+
+    groups = {}
+    people = {}
+    for i, kind in enumerate(("director", "actor", "genre")):
+        names = pd.Series([r[i] for r in values], dtype=object).explode().dropna()
+        positions = names.index.to_numpy(dtype=np.int64)
+        codes, keys = pd.factorize(names.to_numpy(dtype=object))
+        people[kind] = positions, codes, list(keys)
+    dated = np.flatnonzero(~np.isnan(decades))
+    codes, keys = pd.factorize(decades[dated])
+    people["decade"] = dated, codes, [int(decade) for decade in keys]
+
+    # A genre of a decade is coded from the codes of both
+    positions, genre_codes, genres = people["genre"]
+    dated = ~np.isnan(decades[positions])
+    positions, genre_codes = positions[dated], genre_codes[dated]
+    decade_codes, decade_keys = pd.factorize(decades[positions])
+    n_decades = len(decade_keys)
+    codes, pairs = pd.factorize(genre_codes * n_decades + decade_codes)
+    people["genre_decade"] = (
+        positions,
+        codes,
+        [
+            (genres[pair // n_decades], int(decade_keys[pair % n_decades]))
+            for pair in pairs.tolist()
+        ],
+    )
+
+    for kind, (positions, codes, keys) in people.items():
+        groups[kind] = _Groups.count(keys, positions, codes, columns, top_n)
+    return groups
+
+
+class AggregateViews:
+    """Precomputed group-by views of the catalog
+
+    For every director, actor, genre, decade and genre of a decade, the view
+    holds the number of titles, their mean rating and runtime, the shortest
+    and longest runtime and the ``top_n`` best rated titles, so ``view``
+    answers with a dict lookup and the reading of a few columns. The groups
+    are counted at once with NumPy. Updates keep the running statistics of
+    the groups they change on top of the columns and replace their views,
+    so a reader never sees a view change. Views read from a snapshot are
+    read-only.
+    """
+
+    def __init__(self, top_n: int = 10):
+        self.top_n = top_n
+        self._groups: Dict[str, _Groups] = {}
+        # Views of the groups changed since the columns were built, None
+        # once a group has no title left
+        self.views: Dict[str, Dict[Any, Optional[Dict]]] = {kind: {} for kind in KINDS}
+        self._stats: Dict[Key, _Stats] = {}
+        # Counted fields of every title, to uncount it
+        self._records: Dict[str, Record] = {}
+        self._rankings: Dict[Tuple[str, str, int], List] = {}
+        self.read_only = False
+
+    @classmethod
+    def build(cls, frames: Iterable[pd.DataFrame], top_n: int = 10) -> "AggregateViews":
+        """Count the cleaned csv chunks of a catalog, the last row of a title wins"""
+        aggregates = cls(top_n)
+        for df in frames:
+            aggregates.add_frame(df)
+        aggregates.count()
+        return aggregates
+
+    def add_frame(self, df: pd.DataFrame):
+        """Keep the counted fields of a cleaned csv chunk until ``count``
+
+        Only the records of the titles are kept, not the chunk.
+        """
+        records = self._records
+        rows = zip(
+            df["Title"].tolist(),
+            [_items(names) for names in df["Director"].tolist()],
+            [_items(names) for names in df["Actors"].tolist()],
+            [_items(names) for names in df["Genre"].tolist()],
+            [decade_of(year) for year in df["Year"].tolist()],
+            [_value(rating) for rating in df["Rating"].tolist()],
+            [_value(runtime) for runtime in df["Runtime"].tolist()],
+        )
+        for title, *record in rows:
+            # A title read again moves to the position of its last row
+            records.pop(title, None)
+            records[title] = tuple(record)
+
+    def count(self):
+        """Count the groups of the records kept by ``add_frame``"""
+        self._groups = count_records(self._records, self.top_n)
+
+    @classmethod
+    def from_movies(cls, movies: Iterable[Dict], top_n: int = 10) -> "AggregateViews":
+        """Count movies in the format taken by ``add_movies``"""
+        aggregates = cls(top_n)
+        aggregates._records = {movie["Title"]: movie_record(movie) for movie in movies}
+        aggregates._groups = count_records(aggregates._records, top_n)
+        return aggregates
+
+    def update(self, movies: Iterable[Dict], removed: Iterable[str]):
+        """Count added movies and uncount removed titles
+
+        Movies use the format taken by ``add_movies``. A movie whose title
+        was counted replaces it.
+        """
+        if self.read_only:
+            raise ValueError("Aggregate views read from a snapshot are read-only")
+        changed = set()
+        for title in removed:
+            changed.update(self._remove(title))
+        for movie in movies:
+            title = movie["Title"]
+            changed.update(self._remove(title))
+            record = movie_record(movie)
+            keys = record_keys(record)
+            self._records[title] = record
+            for key in keys:
+                self._running(key).add(title, record[4], record[5], self.top_n)
+            changed.update(keys)
+
+        for kind, name in changed:
+            self.views[kind][name] = self._stats[kind, name].view()
+        kinds = {kind for kind, _ in changed}
+        self._rankings = {k: v for k, v in self._rankings.items() if k[0] not in kinds}
+
+    def _running(self, key: Key) -> _Stats:
+        stats = self._stats.get(key)
+        if stats is None:
+            kind, name = key
+            groups = self._groups.get(kind)
+            if groups is not None and name in groups.codes:
+                stats = groups.stats(groups.codes[name])
+            else:
+                stats = _Stats()
+            self._stats[key] = stats
+        return stats
+
+    def _remove(self, title: str) -> List[Key]:
+        record = self._records.pop(title, None)
+        if record is None:
+            return []
+        keys = record_keys(record)
+        for key in keys:
+            self._running(key).remove(
+                title, record[4], record[5], self._records, self.top_n
+            )
+        return keys
+
+    def view(self, kind: str, key) -> Optional[Dict]:
+        """Get the view of a group, or None if it has no title"""
+        if kind not in KINDS:
+            raise ValueError(f"Unknown kind {kind!r}, expected one of {KINDS}")
+        changed = self.views[kind]
+        if key in changed:
+            return changed.get(key)
+        groups = self._groups.get(kind)
+        if groups is None or key not in groups.codes:
+            return None
+        return groups.view(groups.codes[key])
+
+    def find(self, kind: str, text) -> Any:
+        """Get the group key a user-supplied name refers to, or None
+
+        Names match exactly, then case-insensitively, then by their words,
+        such as Kurosawa for Akira Kurosawa, preferring the largest group.
+        """
+        if kind == "decade":
+            return parse_decade(text)
+        if kind == "genre_decade":
+            genre, decade = text
+            return self.find("genre", genre), parse_decade(decade)
+        if self.view(kind, text) is not None:
+            return text
+        names = [{str(key).lower(): key for key in list(self.views[kind])}]
+        if kind in self._groups:
+            names.append(self._groups[kind].names())
+        text = str(text).strip().lower()
+        for lowered in names:
+            key = lowered.get(text)
+            if key is not None and self.view(kind, key) is not None:
+                return key
+        words = text.split()
+        if not words:
+            return None
+        matches = {
+            key
+            for lowered in names
+            for name, key in lowered.items()
+            if all(word in name for word in words)
+            and all(re.search(rf"\b{re.escape(word)}", name) for word in words)
+        }
+        counts = {key: (self.view(kind, key) or {}).get("count", 0) for key in matches}
+        best = max(sorted(matches, key=str), key=lambda k: counts[k], default=None)
+        return best if best is not None and counts[best] else None
+
+    def rank(
+        self, kind: str, by: str = "count", n: int = 10, min_count: int = 3
+    ) -> List[Tuple[Any, Dict]]:
+        """Get the n groups of a kind with the most titles or the best mean rating
+
+        Ranking by mean rating only keeps groups of ``min_count`` titles.
+        The groups of the columns are sorted once, those changed since are
+        sorted until the kind changes again, and both are merged.
+        """
+        if kind not in KINDS:
+            raise ValueError(f"Unknown kind {kind!r}, expected one of {KINDS}")
+        if by not in RANKINGS:
+            raise ValueError(f"Unknown ranking {by!r}, expected one of {RANKINGS}")
+        changed = self.views[kind]
+        ranking = self._rankings.get((kind, by, min_count))
+        if ranking is None:
+            # Copied at once, an update may add groups while they are sorted
+            ranking = [
+                (_rank_key(by, key, view), key, view)
+                for key, view in list(changed.items())
+                if view is not None
+                and (by == "count" or view["count"] >= min_count)
+                and (by == "count" or view["mean_rating"] is not None)
+            ]
+            ranking.sort(key=lambda item: item[0])
+            self._rankings[kind, by, min_count] = ranking
+
+        ranked = ranking[:n]
+        groups = self._groups.get(kind)
+        if groups is not None:
+            found = 0
+            for code in groups.order(by, min_count):
+                key = groups.keys[code]
+                if key in changed:
+                    continue
+                view = groups.view(code)
+                ranked.append((_rank_key(by, key, view), key, view))
+                found += 1
+                if found == n:
+                    break
+        ranked.sort(key=lambda item: item[0])
+        return [(key, view) for _, key, view in ranked[:n]]
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """Get the columns of every kind as named arrays, to store them in a snapshot
+
+        The changed groups are counted again with the others first.
+        """
+        groups = self._groups
+        if self._stats:
+            groups = count_records(self._records, self.top_n)
+        arrays = {"aggregates.top_n": np.array([self.top_n])}
+        for kind, kind_groups in groups.items():
+            arrays.update(kind_groups.arrays(f"aggregates.{kind}"))
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> Optional["AggregateViews"]:
+        """Read read-only views stored by ``arrays``, or None if they are missing"""
+        if "aggregates.top_n" not in arrays:
+            return None
+        aggregates = cls(int(arrays["aggregates.top_n"][0]))
+        aggregates._groups = {
+            kind: _Groups.from_arrays(arrays, f"aggregates.{kind}") for kind in KINDS
+        }
+        aggregates.read_only = True
+        return aggregates
+
+
+def format_view(kind: str, key, view: Dict) -> str:
+    """Describe the view of a group, followed by its best rated titles"""
+    name = f"{key[0]} of the {key[1]}s" if kind == "genre_decade" else key
+    name = f"the {key}s" if kind == "decade" else name
+    summary = f"{name} ({kind.replace('_', ' ')}): {view['count']} movies"
+    if view["mean_rating"] is not None:
+        summary += f", mean rating {view['mean_rating']}"
+    if view["mean_runtime"] is not None:
+        summary += (
+            f", runtime {view['min_runtime']:g} to {view['max_runtime']:g} min"
+            f" with a mean of {view['mean_runtime']}"
+        )
+    lines = [summary, "Best rated:"]
+    lines += [f"{title}: {rating:g}" for title, rating in view["top"]]
+    return "\n".join(lines)
+
+
+def parse_stats_request(text: str) -> Dict[str, str]:
+    """Read the ``key: value`` pairs of a stats tool input"""
+    pairs = {}
+    for part in re.split(r"[,\n]", text.strip().strip('"')):
+        if ":" in part:
+            key, value = part.split(":", 1)
+            pairs[key.strip().lower()] = value.strip()
+    return pairs
+
+
+def _ranking_of(text: str) -> str:
+    text = text.strip().lower().replace(" ", "_")
+    return "mean_rating" if text in ("rating", "rated", "best_rated") else text
+
+
+def stats_answer(database, text: str) -> str:
+    """Answer a stats question for the agent, as text
+
+    ``director: Akira Kurosawa`` describes a group, a ``genre`` with a
+    ``decade`` the genre in that decade, and ``rank: director, by: rating``
+    ranks the groups of a kind. The best rated titles of a group are kept as
+    the results of the request, other answers keep no result.
+    """
+    request = parse_stats_request(text)
+    try:
+        if "rank" in request:
+            kind = request["rank"].lower()
+            ranked = database.rank_groups(
+                kind,
+                _ranking_of(request.get("by", "count")),
+                int(request.get("n", 10)),
+            )
+            lines = [
+                f"{key}: {view['count']} movies, mean rating {view['mean_rating']}"
+                for key, view in ranked
+            ]
+            # No movie is listed, the lines are groups
+            return record_results([], "\n".join(lines) or f"No {kind} to rank")
+        name: Any
+        if "genre" in request and "decade" in request:
+            kind, name = "genre_decade", (request["genre"], request["decade"])
+        else:
+            kinds = [kind for kind in KINDS if kind in request]
+            if not kinds:
+                usage = f"Give one of {', '.join(KINDS[:4])} or rank, as director: name"
+                return record_results([], usage)
+            kind, name = kinds[0], request[kinds[0]]
+        key, view = database.aggregate(kind, name)
+    except KeyError as e:
+        return record_results([], f"No movies for {e.args[0]}")
+    except ValueError as e:
+        return record_results([], str(e))
+    results = [MovieResult(title, 1.0) for title, _ in view["top"]]
+    return record_results(results, format_view(kind, key, view))
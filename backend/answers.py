@@ -0,0 +1,101 @@
+import asyncio
+import hashlib
+import json
+import threading
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+import metrics
+from cache import TTLCache, canonical_key, normalize_question
+from results import project_card
+
+
+def etag(payload: Any) -> str:
+    """Get a strong ETag of a JSON payload"""
+    body = json.dumps(payload, sort_keys=True, default=str).encode()
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def etag_matches(tag: str, if_none_match: Optional[str]) -> bool:
+    """Whether an If-None-Match header lists the ETag, weak or not"""
+    if not if_none_match:
+        return False
+    tags = {value.strip().removeprefix("W/") for value in if_none_match.split(",")}
+    return tag in tags or "*" in tags
+
+
+def project(answer: Dict, fields: Optional[Iterable[str]] = None) -> Dict:
+    """Keep the requested fields of the movie cards of a full answer"""
+    if fields is None:
+        return answer
+    return {**answer, "movies": [project_card(m, fields) for m in answer["movies"]]}
+
+
+class AnswerCache:
+    """Share the agent answers of identical messages
+
+    Answers are kept up to ``ttl`` seconds under the normalized message and
+    the catalog version, so they are not read again once the catalog
+    changes. Concurrent misses of the same key share one agent run, and
+    wait for it on the event loop without holding a worker of the agent
+    pool. Failed runs are not cached.
+    """
+
+    def __init__(
+        self, maxsize: int = 1024, ttl: float = 300, path: Optional[str] = None
+    ):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl, path=path, namespace="answers")
+        self._tasks: Dict[str, asyncio.Future] = {}
+        self._answers = {
+            result: metrics.counter(
+                "agent_answers_total",
+                "Messages needing the agent by how they were answered",
+                labels={"result": result},
+            )
+            for result in ("cached", "shared", "run")
+        }
+        self._lock = threading.Lock()
+        self.counts = {"cached": 0, "shared": 0, "run": 0}
+
+    def key(self, message: str, version: str) -> str:
+        """Get the cache key of a message"""
+        return canonical_key(normalize_question(message), version)
+
+    async def arun(
+        self, message: str, version: str, func: Callable[[], Awaitable[Dict]]
+    ) -> Dict:
+        """Get the answer of a message, from the cache or shared with a run"""
+        key = self.key(message, version)
+        answer = self.cache.get(key)
+        if answer is not None:
+            self._count("cached")
+            return answer
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(self._arun(key, func))
+            task.add_done_callback(lambda task: self._done(key, task))
+        else:
+            self._count("shared")
+        # A cancelled request leaves the run to the others waiting for it
+        return await asyncio.shield(task)
+
+    async def _arun(self, key: str, func: Callable[[], Awaitable[Dict]]) -> Dict:
+        self._count("run")
+        answer = await func()
+        self.cache.set(key, answer)
+        return answer
+
+    def _done(self, key: str, task: asyncio.Future):
+        del self._tasks[key]
+        # Retrieve the exception, every request waiting for it may be gone
+        if not task.cancelled():
+            task.exception()
+
+    def _count(self, result: str):
+        self._answers[result].inc()
+        with self._lock:
+            self.counts[result] += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Get the counts of cached, shared and run answers"""
+        with self._lock:
+            return dict(self.counts)
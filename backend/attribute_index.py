@@ -0,0 +1,338 @@
+import copy
+from bisect import bisect_right
+from collections import defaultdict
+from collections.abc import Sequence
+from functools import lru_cache
+from typing import Callable, Dict, FrozenSet, Iterable, List, Set, Tuple
+
+import numpy as np
+from compact_graph import EDGE_TYPES, NODE_TYPES, CompactGraph
+from overlay import push_layer
+
+
+class _TitleKeys(Sequence):
+    """Title names of a compact graph, decoded on access"""
+
+    def __init__(self, graph: CompactGraph, title_ids: np.ndarray):
+        self._graph = graph
+        self._title_ids = title_ids
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        return self._graph.key(self._title_ids[position])
+
+    def __len__(self) -> int:
+        return len(self._title_ids)
+
+
+class _LayeredTitles(Sequence):
+    """Titles of the build followed by the titles of the added layers"""
+
+    def __init__(self, titles: Sequence, layers: Tuple):
+        self._titles = titles
+        self._starts = [start for start, _ in layers]
+        self._layers = [layer.titles for _, layer in layers]
+        self._length = len(titles) + sum(len(layer) for layer in self._layers)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += self._length
+        if not 0 <= position < self._length:
+            raise IndexError(position)
+        if position < len(self._titles):
+            return self._titles[position]
+        layer = bisect_right(self._starts, position) - 1
+        return self._layers[layer][position - self._starts[layer]]
+
+    def __len__(self) -> int:
+        return self._length
+
+
+class AttributeIndex:
+    """Inverted index from attribute values to the titles linked to them
+
+    Catalog changes are applied with ``updated``, which returns a new version
+    of the index and leaves the current one untouched for the queries still
+    reading it. Added titles are indexed in small layers placed after the
+    titles of the build, removed titles are hidden, so the positions of the
+    other titles never move until the index is rebuilt.
+    """
+
+    # Titles with their neighbors, kept by the layers to merge them
+    _entries: List[Tuple[str, List]]
+
+    def __init__(self, graph):
+        """Build the postings from the title nodes of the graph"""
+
+        if isinstance(graph, CompactGraph):
+            self._build_compact(graph)
+        else:
+            # Titles in graph order, so ties are broken the same way as a scan
+            self._build_entries(
+                (node, graph.neighbors(node))
+                for node, data in graph.nodes(data=True)
+                if data["type"] == "title"
+            )
+        self._build_haystack()
+
+    @classmethod
+    def from_entries(cls, entries: List[Tuple[str, List]]) -> "AttributeIndex":
+        """Index a list of titles with their neighbors, as one layer of changes"""
+        index = cls.__new__(cls)
+        index._build_entries(entries)
+        index._build_haystack()
+        index._entries = entries
+        return index
+
+    @classmethod
+    def from_postings(
+        cls,
+        titles: Sequence,
+        names: List[str],
+        name_postings: Callable[[int], Set[int]],
+        int_postings: Dict[int, Set[int]],
+    ) -> "AttributeIndex":
+        """Index titles from postings read elsewhere, such as a shard of them
+
+        ``name_postings`` gets the position of a lower-cased name in
+        ``names`` and returns the positions of its titles.
+        """
+        index = cls.__new__(cls)
+        index.titles = titles
+        index.position = titles.index
+        index._names = names
+        index._name_postings = name_postings
+        index._int_postings = int_postings
+        index._build_haystack()
+        return index
+
+    def _build_haystack(self):
+        # Join all names in a single string so that substring lookups run in C
+        self._offsets = []
+        offset = 0
+        for name in self._names:
+            self._offsets.append(offset)
+            offset += len(name) + 1
+        self._haystack = "\n".join(self._names)
+
+        # Layers of added titles, with their first position, and removed titles
+        self._layers: Tuple[Tuple[int, AttributeIndex], ...] = ()
+        self._removed: FrozenSet[int] = frozenset()
+        self._base_titles = self.titles
+        self._base_position = self.position
+        self._base_match_token = lru_cache(maxsize=4096)(self._match_token)
+        self._init_caches()
+
+    def _init_caches(self):
+        if self._layers or self._removed:
+            self.match_token = lru_cache(maxsize=4096)(self._match_layered_token)
+        else:
+            self.match_token = self._base_match_token
+        self.match = lru_cache(maxsize=4096)(self._match)
+        self.match_array = lru_cache(maxsize=4096)(self._match_array)
+
+    def _build_entries(self, entries: Iterable[Tuple[str, Iterable]]):
+        """Collect the postings from the neighbors of every title"""
+
+        self.titles: Sequence = []
+
+        # Postings for year neighbors and for lower-cased name neighbors
+        self._int_postings: Dict[int, Set[int]] = defaultdict(set)
+        name_postings: Dict[str, Set[int]] = defaultdict(set)
+        for position, (title, neighbors) in enumerate(entries):
+            self.titles.append(title)
+            for neighbor in neighbors:
+                if isinstance(neighbor, int):
+                    self._int_postings[neighbor].add(position)
+                elif isinstance(neighbor, str):
+                    name_postings[neighbor.lower()].add(position)
+
+        self._names: List[str] = list(name_postings)
+        self._name_postings: Callable[[int], Set[int]] = [
+            name_postings[name] for name in self._names
+        ].__getitem__
+        self._positions = {
+            title: position for position, title in enumerate(self.titles)
+        }
+        self.position = self._positions.__getitem__
+
+    def _build_compact(self, graph: CompactGraph):
+        """Read the postings lazily from the adjacency arrays"""
+
+        is_title = graph.node_type == NODE_TYPES.index("title")
+        self.titles = _TitleKeys(graph, np.flatnonzero(is_title))
+        position = np.cumsum(is_title) - 1
+
+        # Nodes linked to at least one title are the indexed attribute values
+        linked = np.zeros(len(graph), dtype=bool)
+        for edge_type in EDGE_TYPES:
+            indptr, indices = graph.indptr[edge_type], graph.indices[edge_type]
+            rows = np.repeat(np.arange(len(graph)), np.diff(indptr))
+            linked[rows[is_title[indices]]] = True
+
+        def postings(node_id: int) -> Set[int]:
+            titles = np.concatenate(
+                [graph.neighbor_ids(node_id, edge_type) for edge_type in EDGE_TYPES]
+            )
+            return set(position[titles[is_title[titles]]].tolist())
+
+        linked_ids = np.flatnonzero(linked & ~graph.int_keys)
+        self._names = [graph.names[i].lower() for i in linked_ids.tolist()]
+        self._name_postings = lambda name: postings(int(linked_ids[name]))
+        self._int_postings = {
+            graph.key(i): postings(i)
+            for i in np.flatnonzero(linked & graph.int_keys).tolist()
+        }
+        self.position = lambda title: int(position[graph.node_id(title)])
+
+    @property
+    def removed(self) -> FrozenSet[int]:
+        """Positions of the titles removed since the build"""
+        return self._removed
+
+    @property
+    def overlay_size(self) -> int:
+        """Number of titles added or removed since the build"""
+        return len(self.titles) - len(self._base_titles) + len(self._removed)
+
+    def updated(
+        self, entries: List[Tuple[str, List]], removed: Iterable[str]
+    ) -> "AttributeIndex":
+        """Get a new version with titles added after the others and titles removed
+
+        The ``entries`` are the added titles with their neighbors. The work
+        is proportional to the changes, the current version is not modified.
+        """
+        index = copy.copy(self)
+        index._removed = self._removed | {self.position(title) for title in removed}
+        if entries:
+            index._layers = push_layer(
+                self._layers,
+                (len(self.titles), AttributeIndex.from_entries(entries)),
+                size=lambda layer: len(layer[1].titles),
+                merge=lambda a, b: (
+                    a[0],
+                    AttributeIndex.from_entries(a[1]._entries + b[1]._entries),
+                ),
+            )
+        index.titles = _LayeredTitles(self._base_titles, index._layers)
+        index.position = index._layered_position
+        index._init_caches()
+        return index
+
+    def follows(self, other: "AttributeIndex") -> bool:
+        """Whether this version was derived from another by updates
+
+        Titles keep their positions from one such version to the next.
+        """
+        return self._base_titles is other._base_titles
+
+    def live_positions(self) -> np.ndarray:
+        """Get the positions of the titles that were not removed, in order"""
+        live = np.ones(len(self.titles), dtype=bool)
+        live[list(self._removed)] = False
+        return np.flatnonzero(live)
+
+    def _layered_position(self, title: str) -> int:
+        for start, layer in reversed(self._layers):
+            position = layer._positions.get(title)
+            if position is not None and start + position not in self._removed:
+                return start + position
+        position = self._base_position(title)
+        if position in self._removed:
+            raise KeyError(title)
+        return position
+
+    def _with_layers(
+        self,
+        matches: FrozenSet[int],
+        match: Callable[["AttributeIndex"], FrozenSet[int]],
+    ) -> FrozenSet[int]:
+        """Add the matches of the added layers and hide the removed titles"""
+        combined = set(matches)
+        for start, layer in self._layers:
+            combined.update(start + position for position in match(layer))
+        return frozenset(combined - self._removed)
+
+    def _match_layered_token(self, token: str) -> FrozenSet[int]:
+        return self._with_layers(
+            self._base_match_token(token), lambda layer: layer.match_token(token)
+        )
+
+    def _match_token(self, token: str) -> FrozenSet[int]:
+        """Get the titles with a neighbor name containing the token"""
+        matches: Set[int] = set()
+        start = self._haystack.find(token)
+        while start != -1:
+            name = bisect_right(self._offsets, start) - 1
+            matches.update(self._name_postings(name))
+            # Skip to the next name, one hit per name is enough
+            if name + 1 == len(self._names):
+                break
+            start = self._haystack.find(token, self._offsets[name + 1])
+        return frozenset(matches)
+
+    def _match(self, queried) -> FrozenSet[int]:
+        """Get the titles that partially match a queried attribute"""
+        if isinstance(queried, int):
+            matches = frozenset(self._int_postings.get(queried, ()))
+            if self._layers or self._removed:
+                matches = self._with_layers(matches, lambda layer: layer.match(queried))
+            return matches
+        elif isinstance(queried, str):
+            found: Set[int] = set()
+            for token in queried.split():
+                found.update(self.match_token(token.lower()))
+            return frozenset(found)
+        return frozenset()
+
+    def _match_array(self, queried) -> np.ndarray:
+        """Get the sorted positions of the titles matching a queried attribute"""
+        return np.sort(np.fromiter(self.match(queried), dtype=np.int64))
+
+    def counts(self, queried_attributes: Iterable) -> np.ndarray:
+        """Count the matched attributes of every title in one dense vector"""
+        counts = np.zeros(len(self.titles), dtype=np.int32)
+        for queried in queried_attributes:
+            # Other value types never match
+            if isinstance(queried, (int, str)):
+                counts[self.match_array(queried)] += 1
+        return counts
+
+    def candidates(self, queried_attributes: Iterable) -> Dict[int, int]:
+        """Count the matched attributes of every title sharing at least one"""
+        counts: Dict[int, int] = defaultdict(int)
+        for queried in queried_attributes:
+            # Other value types never match
+            if isinstance(queried, (int, str)):
+                for position in self.match(queried):
+                    counts[position] += 1
+        return counts
+
+
+def top_k(counts: np.ndarray, k: int) -> np.ndarray:
+    """Get the positions of the k highest non-zero counts, ties by position
+
+    Counts are small integers, so the k-th highest one is read from their
+    histogram instead of partitioning the whole vector.
+    """
+    histogram = np.bincount(counts, minlength=1)
+    histogram[0] = 0
+    cumulative = np.cumsum(histogram[::-1])
+    if cumulative[-1] <= k:
+        selected = np.flatnonzero(counts)
+    else:
+        # Everything above the k-th count, then the first titles tied with it
+        kth = len(histogram) - 1 - int(np.searchsorted(cumulative, k))
+        above = np.flatnonzero(counts > kth)
+        tied_mask = counts == kth
+        tied, start = [], 0
+        for _ in range(k - len(above)):
+            start += int(np.argmax(tied_mask[start:]))
+            tied.append(start)
+            start += 1
+        selected = np.concatenate([above, np.array(tied, dtype=above.dtype)])
+    return selected[np.lexsort((selected, -counts[selected]))]
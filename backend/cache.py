@@ -0,0 +1,206 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import metrics
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a question so that trivially different phrasings share a key"""
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?!. ")
+
+
+def canonical_key(params: Any, version: str = "") -> str:
+    """Serialize query parameters to a stable key, scoped to a catalog version"""
+    return f"{version}:{json.dumps(params, sort_keys=True, default=str)}"
+
+
+# One connection per SQLite file, shared by every cache stored in it, with
+# a lock serializing their statements
+_databases: Dict[str, Tuple[sqlite3.Connection, threading.Lock]] = {}
+_databases_lock = threading.Lock()
+
+
+def _database(path: str) -> Tuple[sqlite3.Connection, threading.Lock]:
+    """Open the cache table of a SQLite file, once per process"""
+    if path != ":memory:":
+        path = os.path.abspath(path)
+    with _databases_lock:
+        if path not in _databases:
+            db = sqlite3.connect(path, check_same_thread=False)
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS cache "
+                "(namespace TEXT, key TEXT, value TEXT, expires REAL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS cache_expires ON cache (namespace, expires)"
+            )
+            db.commit()
+            _databases[path] = (db, threading.Lock())
+        return _databases[path]
+
+
+class TTLCache:
+    """Thread-safe LRU cache with a time to live and an optional SQLite store
+
+    Entries are evicted when the cache holds more than ``maxsize`` items or
+    when they are older than ``ttl`` seconds. When ``path`` is given, entries
+    are also written to a SQLite table named after ``namespace`` and read back
+    on a memory miss, so they survive restarts, up to ``disk_maxsize`` entries.
+    Expired and surplus entries are pruned from the table every
+    ``prune_every`` writes. Values must be JSON serializable to be persisted.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: Optional[float] = 3600,
+        path: Optional[str] = None,
+        namespace: str = "cache",
+        disk_maxsize: int = 100_000,
+        prune_every: int = 100,
+    ):
+        self.maxsize = maxsize
+        self.disk_maxsize = disk_maxsize
+        self.prune_every = prune_every
+        self.ttl = ttl
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self._lookups = {
+            result: metrics.counter(
+                "cache_lookups_total",
+                "Cache lookups by cache and result",
+                labels={"cache": namespace, "result": result},
+            )
+            for result in ("hit", "miss")
+        }
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._writes = 0
+        if path:
+            self._db, self._db_lock = _database(path)
+
+    def _expires(self) -> float:
+        return time.time() + self.ttl if self.ttl is not None else float("inf")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Get a value, counting the lookup as a hit or a miss"""
+        with self._lock:
+            now = time.time()
+            item = self._items.get(key)
+            if item is not None and item[1] <= now:
+                del self._items[key]
+                item = None
+            if item is None and self._db is not None:
+                with self._db_lock:
+                    row = self._db.execute(
+                        "SELECT value, expires FROM cache "
+                        "WHERE namespace = ? AND key = ? AND expires > ?",
+                        (self.namespace, key, now),
+                    ).fetchone()
+                if row is not None:
+                    item = (json.loads(row[0]), row[1])
+                    self._store(key, item)
+            if item is None:
+                self.misses += 1
+                self._lookups["miss"].inc()
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            self._lookups["hit"].inc()
+            return item[0]
+
+    def set(self, key: str, value: Any):
+        """Store a value"""
+        with self._lock:
+            item = (value, self._expires())
+            self._store(key, item)
+            if self._db is not None:
+                with self._db_lock:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                        (self.namespace, key, json.dumps(value), item[1]),
+                    )
+                    self._writes += 1
+                    if self._writes >= self.prune_every:
+                        self._writes = 0
+                        self._prune(self._db)
+                    self._db.commit()
+
+    def _prune(self, db: sqlite3.Connection):
+        # Both deletes walk the (namespace, expires) index
+        db.execute(
+            "DELETE FROM cache WHERE namespace = ? AND expires <= ?",
+            (self.namespace, time.time()),
+        )
+        db.execute(
+            "DELETE FROM cache WHERE namespace = ? AND key IN "
+            "(SELECT key FROM cache WHERE namespace = ? "
+            "ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+            (self.namespace, self.namespace, self.disk_maxsize),
+        )
+
+    def _store(self, key: str, item: tuple):
+        self._items[key] = item
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        """Remove every entry, including the persisted ones"""
+        with self._lock:
+            self._items.clear()
+            if self._db is not None:
+                with self._db_lock:
+                    self._db.execute(
+                        "DELETE FROM cache WHERE namespace = ?", (self.namespace,)
+                    )
+                    self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """Get the hit and miss counters"""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._items)}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class SingleFlight:
+    """Share one call among the concurrent callers of the same key
+
+    The first caller of a key runs the function, callers arriving while it
+    runs wait for it and get its result or its exception.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Run or join the call of a key, return its result and if it was shared"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if future is None:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result(), True
+        try:
+            future.set_result(func())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result(), False
@@ -0,0 +1,321 @@
+import contextlib
+import io
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import metrics
+import tracing
+from langchain.callbacks import get_callback_manager
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.input import get_colored_text
+from langchain.schema import AgentAction, AgentFinish
+from results import start_tool_run
+
+_thought: ContextVar[Optional[io.StringIO]] = ContextVar("thought", default=None)
+_install_lock = threading.Lock()
+_installed: Dict[type, BaseCallbackHandler] = {}
+
+
+class CallbackHandler(BaseCallbackHandler):
+    """Callback handler ignoring every event, for handlers to override a few"""
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts, **kwargs: Any):
+        pass
+
+    def on_llm_end(self, response, **kwargs: Any):
+        pass
+
+    def on_llm_new_token(self, token: str, **kwargs: Any):
+        pass
+
+    def on_llm_error(self, error, **kwargs: Any):
+        pass
+
+    def on_chain_start(
+        self, serialized: Dict[str, Any], inputs: Dict[str, Any], **kwargs: Any
+    ):
+        pass
+
+    def on_chain_end(self, outputs: Dict[str, Any], **kwargs: Any):
+        pass
+
+    def on_chain_error(self, error, **kwargs: Any):
+        pass
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs: Any):
+        pass
+
+    def on_tool_end(self, output: str, **kwargs: Any):
+        pass
+
+    def on_tool_error(self, error, **kwargs: Any):
+        pass
+
+    def on_agent_action(self, action: AgentAction, **kwargs: Any):
+        pass
+
+    def on_text(self, text: str, **kwargs: Any):
+        pass
+
+    def on_agent_finish(self, finish: AgentFinish, **kwargs: Any):
+        pass
+
+
+def _install(handler_cls: type) -> BaseCallbackHandler:
+    """Register one handler of a class on the shared callback manager"""
+    with _install_lock:
+        handler = _installed.get(handler_cls)
+        if handler is None:
+            handler = _installed[handler_cls] = handler_cls()
+            get_callback_manager().add_handler(handler)
+        return handler
+
+
+class ThoughtCallbackHandler(CallbackHandler):
+    """Write the verbose agent trace to the buffer of the current request
+
+    The output matches ``StdOutCallbackHandler``, but goes to the buffer set
+    by ``capture_thought`` in the current context instead of ``sys.stdout``,
+    so concurrent requests never see each other's text.
+    """
+
+    def _write(self, text: str, color: Optional[str] = None, end: str = ""):
+        buffer = _thought.get()
+        if buffer is not None:
+            buffer.write((get_colored_text(text, color) if color else text) + end)
+
+    def on_chain_start(
+        self, serialized: Dict[str, Any], inputs: Dict[str, Any], **kwargs: Any
+    ):
+        class_name = serialized["name"]
+        self._write(f"\n\n\033[1m> Entering new {class_name} chain...\033[0m", end="\n")
+
+    def on_chain_end(self, outputs: Dict[str, Any], **kwargs: Any):
+        self._write("\n\033[1m> Finished chain.\033[0m", end="\n")
+
+    def on_agent_action(
+        self, action: AgentAction, color: Optional[str] = None, **kwargs: Any
+    ):
+        self._write(action.log, color=color)
+
+    def on_tool_end(
+        self,
+        output: str,
+        color: Optional[str] = None,
+        observation_prefix: Optional[str] = None,
+        llm_prefix: Optional[str] = None,
+        **kwargs: Any,
+    ):
+        if observation_prefix:
+            self._write(f"\n{observation_prefix}")
+        self._write(output, color=color)
+        if llm_prefix:
+            self._write(f"\n{llm_prefix}")
+
+    def on_text(self, text: str, color: Optional[str] = None, end: str = "", **kwargs):
+        self._write(str(text), color=color, end=end)
+
+    def on_agent_finish(
+        self, finish: AgentFinish, color: Optional[str] = None, **kwargs: Any
+    ):
+        self._write(finish.log, color=color, end="\n")
+
+
+def install_thought_handler():
+    """Register the thought handler on the shared callback manager once"""
+    _install(ThoughtCallbackHandler)
+
+
+@contextlib.contextmanager
+def capture_thought() -> Iterator[io.StringIO]:
+    """Collect the agent trace of the current request in a buffer"""
+    install_thought_handler()
+    buffer = io.StringIO()
+    token = _thought.set(buffer)
+    try:
+        yield buffer
+    finally:
+        _thought.reset(token)
+
+
+_step_sink: ContextVar[Optional[Callable[[str, Dict], None]]] = ContextVar(
+    "step_sink", default=None
+)
+
+
+class AgentStepCallbackHandler(CallbackHandler):
+    """Forward agent actions, observations and the final answer as events
+
+    Events go to the sink set by ``stream_steps`` in the current context, as
+    ``(event, data)`` pairs, while the agent is still running.
+    """
+
+    def __init__(self):
+        self._tool: ContextVar[Optional[str]] = ContextVar("tool", default=None)
+
+    def _emit(self, event: str, data: Dict):
+        sink = _step_sink.get()
+        if sink is not None:
+            sink(event, data)
+
+    def on_agent_action(self, action: AgentAction, **kwargs: Any):
+        self._tool.set(action.tool)
+        thought = action.log.split("\nAction:", 1)[0].strip()
+        self._emit(
+            "action",
+            {"thought": thought, "tool": action.tool, "tool_input": action.tool_input},
+        )
+
+    def on_tool_end(self, output: str, **kwargs: Any):
+        self._emit("observation", {"tool": self._tool.get(), "output": output})
+
+    def on_tool_error(self, error, **kwargs: Any):
+        self._emit("observation", {"tool": self._tool.get(), "error": str(error)})
+
+    def on_agent_finish(self, finish: AgentFinish, **kwargs: Any):
+        self._emit("final", {"response": finish.return_values.get("output")})
+
+
+@contextlib.contextmanager
+def stream_steps(sink: Callable[[str, Dict], None]) -> Iterator[None]:
+    """Send the agent steps of the current request to a sink while it runs"""
+    _install(AgentStepCallbackHandler)
+    token = _step_sink.set(sink)
+    try:
+        yield
+    finally:
+        _step_sink.reset(token)
+
+
+class TracingCallbackHandler(CallbackHandler):
+    """Time the LLM calls, tools and chains of the agent as tracing spans
+
+    LLM calls made inside ``LLMGraphChain`` are recorded as ``graph_llm``,
+    the other ones as ``agent_llm``. The Search tool is recorded as
+    ``search`` and other tools as ``tool:<name>``. Token usage reported by
+    the LLM is counted per stage. The handler is always called, even for
+    components that are not verbose.
+    """
+
+    # Chains worth a span of their own
+    CHAIN_STAGES = {
+        "AgentExecutor": "agent",
+        "MovieAgent": "agent",
+        "LLMGraphChain": "graph_chain",
+    }
+
+    def __init__(self):
+        # An agent runs in a single thread, so open spans are kept per thread
+        self._local = threading.local()
+        self._tokens: Dict[Tuple[str, str], metrics.Counter] = {}
+
+    @property
+    def always_verbose(self) -> bool:
+        return True
+
+    @property
+    def _stack(self) -> List[Tuple[str, str, float]]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _push(self, kind: str, name: str):
+        self._stack.append((kind, name, time.perf_counter()))
+
+    def _pop(self, kind: str) -> Optional[Tuple[str, float]]:
+        stack = self._stack
+        for i in range(len(stack) - 1, -1, -1):
+            if stack[i][0] == kind:
+                _, name, start = stack.pop(i)
+                return name, start
+        return None
+
+    def _in_chain(self, name: str) -> bool:
+        return any(entry[:2] == ("chain", name) for entry in self._stack)
+
+    def _end(self, kind: str, stage_of: Callable[[str], Optional[str]], **attributes):
+        popped = self._pop(kind)
+        if popped is not None:
+            name, start = popped
+            stage = stage_of(name)
+            if stage is not None:
+                tracing.record(stage, start, time.perf_counter() - start, **attributes)
+
+    def _llm_stage(self) -> str:
+        return "graph_llm" if self._in_chain("LLMGraphChain") else "agent_llm"
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts, **kwargs: Any):
+        self._push("llm", self._llm_stage())
+
+    def on_llm_end(self, response, **kwargs: Any):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        popped = self._pop("llm")
+        if popped is None:
+            return
+        stage, start = popped
+        tracing.record(stage, start, time.perf_counter() - start, **usage)
+        for kind, count in usage.items():
+            key = (stage, kind)
+            if key not in self._tokens:
+                self._tokens[key] = metrics.counter(
+                    "llm_tokens_total",
+                    "Tokens used by the LLM calls, by stage and kind",
+                    labels={"stage": stage, "kind": kind},
+                )
+            self._tokens[key].inc(count)
+
+    def on_llm_error(self, error, **kwargs: Any):
+        self._end("llm", lambda stage: stage, error=str(error))
+
+    def on_chain_start(
+        self, serialized: Dict[str, Any], inputs: Dict[str, Any], **kwargs: Any
+    ):
+        self._push("chain", serialized.get("name", ""))
+
+    def on_chain_end(self, outputs: Dict[str, Any], **kwargs: Any):
+        self._end("chain", self.CHAIN_STAGES.get)
+
+    def on_chain_error(self, error, **kwargs: Any):
+        self._end("chain", self.CHAIN_STAGES.get, error=str(error))
+
+    @staticmethod
+    def _tool_stage(name: str) -> str:
+        return "search" if name == "Search" else f"tool:{name}"
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs: Any):
+        self._push("tool", serialized.get("name", ""))
+
+    def on_tool_end(self, output: str, **kwargs: Any):
+        self._end("tool", self._tool_stage)
+
+    def on_tool_error(self, error, **kwargs: Any):
+        self._end("tool", self._tool_stage, error=str(error))
+
+
+def install_tracing_handler():
+    """Register the tracing handler on the shared callback manager once"""
+    _install(TracingCallbackHandler)
+
+
+class ToolRunCallbackHandler(CallbackHandler):
+    """Give every tool run of the agent an ID, under which its results are kept
+
+    langchain does not pass run IDs to the callbacks yet, so an ID is drawn
+    when a tool starts, see ``results.start_tool_run``. The handler is always
+    called, even for tools that are not verbose.
+    """
+
+    @property
+    def always_verbose(self) -> bool:
+        return True
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs: Any):
+        start_tool_run(str(kwargs.get("run_id") or uuid.uuid4().hex))
+
+
+def install_tool_run_handler():
+    """Register the tool run handler on the shared callback manager once"""
+    _install(ToolRunCallbackHandler)
@@ -0,0 +1,337 @@
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Union
+
+import numpy as np
+
+NODE_TYPES = ("title", "year", "genre", "director", "actor")
+EDGE_TYPES = (
+    "title_year_edge",
+    "title_director_edge",
+    "title_actor_edge",
+    "title_genre_edge",
+)
+
+
+class StringArray:
+    """Immutable list of strings stored as one UTF-8 buffer plus offsets"""
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+        self._view = data.data
+
+    @classmethod
+    def from_list(cls, items: List[str]) -> "StringArray":
+        """Encode a list of strings"""
+        encoded = [item.encode("utf-8") for item in items]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(item) for item in encoded], out=offsets[1:])
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(data, offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        start, end = self.offsets[i : i + 2].tolist()
+        return str(self._view[start:end], "utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        return (self[i] for i in range(len(self)))
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + self.offsets.nbytes
+
+
+# A column of title attributes, strings or numbers
+Column = Union[np.ndarray, StringArray]
+
+
+class NodeData(Mapping):
+    """Node data dict of a compact graph, attributes are built on access"""
+
+    def __init__(self, graph: "CompactGraph", node_id: int):
+        self._graph = graph
+        self._id = node_id
+
+    def _keys(self):
+        if self._graph.row[self._id] >= 0:
+            return ("type", "attributes")
+        return ("type",)
+
+    def __getitem__(self, key):
+        if key == "type":
+            return NODE_TYPES[self._graph.node_type[self._id]]
+        if key == "attributes" and self._graph.row[self._id] >= 0:
+            return self._graph.attributes(self._id)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self) -> int:
+        return len(self._keys())
+
+
+class NodeView:
+    """Subset of the networkx NodeView used by the database"""
+
+    def __init__(self, graph: "CompactGraph"):
+        self._graph = graph
+
+    def __call__(self, data: bool = False):
+        graph = self._graph
+        if not data:
+            return iter(graph)
+        return ((graph.key(i), NodeData(graph, i)) for i in range(len(graph)))
+
+    def __getitem__(self, node) -> NodeData:
+        return NodeData(self._graph, self._graph.node_id(node))
+
+    def __iter__(self):
+        return iter(self._graph)
+
+    def __contains__(self, node) -> bool:
+        return node in self._graph
+
+    def __len__(self) -> int:
+        return len(self._graph)
+
+
+class CompactGraph:
+    """Read-only movie graph backed by integer IDs and NumPy arrays
+
+    Node names are interned to integer IDs. The adjacency is kept as one
+    CSR matrix (``indptr``/``indices``) per edge type, holding both edge
+    directions, and the title attributes are kept in columnar arrays indexed
+    through ``row``. Lookups mimic the parts of the networkx API used by
+    ``MovieDatabase`` and ``run.get_attributes_from_node``.
+    """
+
+    def __init__(
+        self,
+        names: StringArray,
+        int_keys: np.ndarray,
+        node_type: np.ndarray,
+        indptr: Dict[str, np.ndarray],
+        indices: Dict[str, np.ndarray],
+        row: np.ndarray,
+        columns: Dict[str, Column],
+    ):
+        self.names = names
+        self.int_keys = int_keys
+        self.node_type = node_type
+        self.indptr = indptr
+        self.indices = indices
+        self.row = row
+        self.columns = columns
+        self._ids: Optional[Dict] = None
+
+    @property
+    def ids(self) -> Dict:
+        """Map from node name to integer ID, built on first use"""
+        if self._ids is None:
+            self._ids = {self.key(i): i for i in range(len(self))}
+        return self._ids
+
+    def key(self, node_id: int):
+        """Get the node name of an ID"""
+        name = self.names[node_id]
+        return int(name) if self.int_keys[node_id] else name
+
+    def node_id(self, node) -> int:
+        """Get the ID of a node name"""
+        return self.ids[node]
+
+    def attributes(self, node_id: int) -> Dict:
+        """Build the attributes dict of a title"""
+        row = self.row[node_id]
+        attributes = {}
+        for name, column in self.columns.items():
+            value = column[row]
+            attributes[name] = value.item() if isinstance(value, np.generic) else value
+        return attributes
+
+    def neighbor_ids(self, node_id: int, edge_type: str) -> np.ndarray:
+        """Get the IDs of the neighbors linked by one edge type"""
+        start, end = self.indptr[edge_type][node_id : node_id + 2].tolist()
+        return self.indices[edge_type][start:end]
+
+    @property
+    def nodes(self) -> NodeView:
+        return NodeView(self)
+
+    def neighbors(self, node) -> Iterator:
+        node_id = self.node_id(node)
+        for edge_type in EDGE_TYPES:
+            for neighbor in self.neighbor_ids(node_id, edge_type).tolist():
+                yield self.key(neighbor)
+
+    def degree(self, node) -> int:
+        node_id = self.node_id(node)
+        return sum(
+            int(indptr[node_id + 1] - indptr[node_id])
+            for indptr in self.indptr.values()
+        )
+
+    def __getitem__(self, node) -> Dict:
+        node_id = self.node_id(node)
+        return {
+            self.key(neighbor): {"type": edge_type}
+            for edge_type in EDGE_TYPES
+            for neighbor in self.neighbor_ids(node_id, edge_type).tolist()
+        }
+
+    def __contains__(self, node) -> bool:
+        try:
+            return node in self.ids
+        except TypeError:
+            return False
+
+    def __iter__(self) -> Iterator:
+        return (self.key(i) for i in range(len(self)))
+
+    def __len__(self) -> int:
+        return len(self.node_type)
+
+    def number_of_nodes(self) -> int:
+        return len(self)
+
+    def number_of_edges(self) -> int:
+        return sum(len(indices) for indices in self.indices.values()) // 2
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the array storage in bytes"""
+        arrays = [self.int_keys, self.node_type, self.row]
+        arrays += list(self.indptr.values()) + list(self.indices.values())
+        return (
+            self.names.nbytes
+            + sum(array.nbytes for array in arrays)
+            + sum(column.nbytes for column in self.columns.values())
+        )
+
+
+class CompactGraphBuilder:
+    """Accumulate nodes and edges, then freeze them into a CompactGraph
+
+    Adding a node or edge twice behaves as in networkx: the last node type,
+    title attributes and edge type win.
+    """
+
+    def __init__(self):
+        self._ids: Dict = {}
+        self._names: List[str] = []
+        self._int_keys = bytearray()
+        self._node_type = bytearray()
+        self._rows: Dict[int, int] = {}
+        self._columns: Dict[str, list] = {}
+        self._sources = np.zeros(0, dtype=np.int64)
+        self._targets = np.zeros(0, dtype=np.int64)
+        self._edge_types = np.zeros(0, dtype=np.int8)
+        self._pending: List[tuple] = []
+
+    def add_node(self, node, node_type: str) -> int:
+        """Add a node or update its type, returning its ID"""
+        node_id = self._ids.get(node)
+        if node_id is None:
+            node_id = self._ids[node] = len(self._names)
+            self._names.append(str(node))
+            self._int_keys.append(isinstance(node, (int, np.integer)))
+            self._node_type.append(NODE_TYPES.index(node_type))
+        else:
+            self._node_type[node_id] = NODE_TYPES.index(node_type)
+        return node_id
+
+    def node_type(self, node) -> Optional[str]:
+        """Get the type of a node, or None if it was not added"""
+        node_id = self._ids.get(node)
+        return None if node_id is None else NODE_TYPES[self._node_type[node_id]]
+
+    def add_title(self, title: str, attributes: Dict) -> int:
+        """Add a title node with its attributes"""
+        node_id = self.add_node(title, "title")
+        row = self._rows.setdefault(node_id, len(self._rows))
+        for name, value in attributes.items():
+            if name not in self._columns:
+                self._columns[name] = []
+            column = self._columns[name]
+            if len(column) <= row:
+                column.extend([None] * (row + 1 - len(column)))
+            column[row] = value
+        return node_id
+
+    def add_edges(self, title, items, edge_type: str):
+        """Add edges of one type between a title and its attribute nodes"""
+        source = self._ids[title]
+        code = EDGE_TYPES.index(edge_type)
+        for item in items:
+            self._pending.append((source, self._ids[item], code))
+        if len(self._pending) >= 1 << 20:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        edges = np.array(self._pending, dtype=np.int64)
+        self._sources = np.concatenate([self._sources, edges[:, 0]])
+        self._targets = np.concatenate([self._targets, edges[:, 1]])
+        self._edge_types = np.concatenate(
+            [self._edge_types, edges[:, 2].astype(np.int8)]
+        )
+        self._pending = []
+
+    def build(self) -> CompactGraph:
+        """Freeze the nodes and edges into arrays"""
+        self._flush()
+        num_nodes = len(self._names)
+
+        # Keep every undirected node pair at its first position with its last type
+        low = np.minimum(self._sources, self._targets)
+        high = np.maximum(self._sources, self._targets)
+        pairs = low * num_nodes + high
+        _, first = np.unique(pairs, return_index=True)
+        _, last = np.unique(pairs[::-1], return_index=True)
+        order = np.argsort(first)
+        first, last = first[order], (len(pairs) - 1 - last)[order]
+        sources = self._sources[first]
+        targets = self._targets[first]
+        edge_types = self._edge_types[last]
+
+        # One CSR matrix per edge type, holding both directions
+        indptr, indices = {}, {}
+        for code, edge_type in enumerate(EDGE_TYPES):
+            mask = edge_types == code
+            forward, backward = sources[mask], targets[mask]
+            loops = forward == backward
+            rows = np.concatenate([forward, backward[~loops]])
+            cols = np.concatenate([backward, forward[~loops]])
+            order = np.argsort(rows, kind="stable")
+            indptr[edge_type] = np.zeros(num_nodes + 1, dtype=np.int64)
+            np.cumsum(np.bincount(rows, minlength=num_nodes), out=indptr[edge_type][1:])
+            indices[edge_type] = cols[order].astype(np.int32)
+
+        # Title rows and columnar attributes
+        row = np.full(num_nodes, -1, dtype=np.int32)
+        row[list(self._rows)] = list(self._rows.values())
+        num_rows = len(self._rows)
+        columns: Dict[str, Column] = {}
+        for name, values in self._columns.items():
+            values.extend([None] * (num_rows - len(values)))
+            if all(isinstance(value, str) for value in values):
+                columns[name] = StringArray.from_list(values)
+            else:
+                columns[name] = np.array(values)
+
+        graph = CompactGraph(
+            names=StringArray.from_list(self._names),
+            int_keys=np.frombuffer(bytes(self._int_keys), dtype=np.bool_),
+            node_type=np.frombuffer(bytes(self._node_type), dtype=np.int8),
+            indptr=indptr,
+            indices=indices,
+            row=row,
+            columns=columns,
+        )
+        graph._ids = self._ids
+        return graph
@@ -1,21 +1,310 @@
-from typing import List, Optional, Tuple
+import hashlib
+import heapq
+import json
+import os
+import threading
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
 
 import networkx as nx
+import numpy as np
 import pandas as pd
+from aggregates import KINDS, AggregateViews
+from attribute_index import AttributeIndex, top_k
+from compact_graph import CompactGraph, CompactGraphBuilder
+from logger import logger
+from name_index import NameIndex
+from numeric_index import FILTERS, NumericIndex, Ranges, numeric_ranges, parse_order
+from related import RelatedTitles, relation_attributes, relation_of
+from results import MovieResult
+from semantic_index import SemanticIndex, semantic_path
+from shards import ShardPool
+from snapshot import (
+    file_checksum,
+    read_checksum,
+    read_snapshot,
+    snapshot_path,
+    write_snapshot,
+)
+from tracing import traced
+from traversal import (
+    EDGE_TYPES,
+    MAX_DEGREE,
+    MAX_NODES,
+    PERSON_EDGES,
+    PERSON_TYPES,
+    Collaborations,
+    expand,
+    shortest_path,
+)
+
+BACKENDS = ("networkx", "compact")
+SCORINGS = ("index", "vectorized")
+# Node types in the order create_graph adds them, a node keeps the last one
+NODE_PRECEDENCE = ("year", "genre", "director", "actor", "title")
+# Fields every added movie needs, they become the edges of its title node
+MOVIE_FIELDS = ("Title", "Year", "Genre", "Director", "Actors")
+DELTA_OPS = ("upsert", "remove")
+
+
+def outranks(node_type: str, current: str) -> bool:
+    """Check if a node type replaces the current type of a node"""
+    return NODE_PRECEDENCE.index(node_type) > NODE_PRECEDENCE.index(current)
 
 
 class MovieDatabase:
-    def __init__(self, csv_file: str = "data/imdb_top_1000.csv"):
-        """Initialize the movie database"""
+    # Indexes are rebuilt once the titles added or removed since their build
+    # exceed this fraction of the catalog, or min_overlay titles
+    max_overlay = 0.1
+    min_overlay = 1000
+
+    def __init__(
+        self,
+        csv_file: str = "data/imdb_top_1000.csv",
+        backend: str = "networkx",
+        scoring: str = "index",
+        chunksize: int = 10000,
+        shards: int = 0,
+    ):
+        """Initialize the movie database
+
+        The ``backend`` selects the graph storage: ``"networkx"`` keeps a
+        networkx graph, ``"compact"`` keeps integer IDs and NumPy arrays.
+        The ``scoring`` selects how ``query_movies`` ranks titles: ``"index"``
+        counts matches per candidate title, ``"vectorized"`` counts them for
+        the whole catalog at once with NumPy. The csv file is read
+        ``chunksize`` rows at a time. With ``shards`` above 1, titles are
+        scored in that many worker processes, see ``start_shards``. The
+        aggregate views are counted from the chunks the graph is built from,
+        each chunk reduced to the fields they count.
+        """
+
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+        if scoring not in SCORINGS:
+            raise ValueError(f"Unknown scoring {scoring!r}, expected one of {SCORINGS}")
+        self.scoring = scoring
+
+        # Catalog version, used to invalidate cached results
+        self.version = file_checksum(csv_file)
+        self.semantic_file = semantic_path(csv_file)
+
+        # Stream the cleaned rows of the csv file into the graph, keeping the
+        # counted fields of each chunk for the aggregate views
+        self.aggregates = AggregateViews()
+        chunks = self._counted(self.read_csv_chunks(csv_file, chunksize))
+        if backend == "compact":
+            self.graph = self.create_compact_graph_from_chunks(chunks)
+        else:
+            self.graph = self.create_graph_from_chunks(chunks)
+        self.aggregates.count()
+
+        self.build_indexes()
+        self.on_change(self._update_aggregates)
+        self.start_shards(shards)
+
+    def _counted(self, chunks: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        for df in chunks:
+            self.aggregates.add_frame(df)
+            yield df
+
+    def _update_aggregates(self, added: Dict, removed: Dict):
+        titles = [node for node, node_type in added.items() if node_type == "title"]
+        self.aggregates.update(
+            [self.movie(title) for title in titles],
+            [node for node, node_type in removed.items() if node_type == "title"],
+        )
+
+    def build_indexes(self):
+        """Build the lookup structures on top of the graph"""
+
+        # Create the inverted attribute index
+        self.index = AttributeIndex(self.graph)
+
+        # The name, numeric and semantic indexes are only built when first needed
+        self._names: Optional[NameIndex] = None
+        self._numeric: Optional[NumericIndex] = None
+        self._semantic: Optional[SemanticIndex] = None
+
+        # Catalog updates and index builds take turns, queries never wait
+        self._write_lock = threading.RLock()
+        self._listeners: List[Callable[[Dict, Dict], None]] = []
+        self.shards: Optional[ShardPool] = None
+        self.related: Optional[RelatedTitles] = None
+        self._collaborations: Optional[Collaborations] = None
+
+    def build_related(self, k: int = 10):
+        """Precompute the k most related titles of every title, see RelatedTitles
+
+        Queries on the attributes of a single title then read their top
+        titles from the table, and catalog updates maintain it.
+        """
+        with self._write_lock:
+            self._use_related(RelatedTitles.build(self, k))
+
+    def _use_related(self, related: RelatedTitles):
+        if self.related is None:
+            self.on_change(self._update_related)
+        self.related = related
 
-        # Process the csv file
-        df = self.process_csv(csv_file)
+    def _update_related(self, added: Dict, removed: Dict):
+        assert self.related is not None
+        titles = [node for node, node_type in added.items() if node_type == "title"]
+        self.related = self.related.updated(self, titles)
 
-        # Get the features
-        years, genres, directors, actors, titles = self.get_features(df)
+    def start_shards(self, shards: int):
+        """Score titles in worker processes, each one holding a range of them
 
-        # Create the graph
-        self.graph = self.create_graph(years, genres, directors, actors, titles)
+        Each worker maps the postings of the catalog from shared memory and
+        returns its top titles for a query, so scoring uses several cores.
+        Catalog updates are loaded into the workers, queries are scored in
+        this process in the meantime.
+        """
+        if shards > 1 and self.shards is None:
+            self.shards = ShardPool(self.index, self.graph, shards)
+            self.on_change(self._load_shards)
+
+    def _load_shards(self, added: Dict, removed: Dict):
+        assert self.shards is not None
+        self.shards.load(self.index, self.graph)
+
+    @property
+    def names(self) -> NameIndex:
+        """Normalized name index for autocomplete and typos, built on first use"""
+        if self._names is None:
+            with self._write_lock:
+                if self._names is None:
+                    self._names = NameIndex(self.graph)
+        return self._names
+
+    @property
+    def collaborations(self) -> Collaborations:
+        """Titles shared by every pair of people, built on first use"""
+        if self._collaborations is None:
+            with self._write_lock:
+                if self._collaborations is None:
+                    titles = self.index.titles
+                    self._collaborations = Collaborations.build(
+                        self.graph,
+                        (titles[p] for p in self.index.live_positions().tolist()),
+                    )
+                    self.on_change(self._update_collaborations)
+        return self._collaborations
+
+    def _update_collaborations(self, added: Dict, removed: Dict):
+        assert self._collaborations is not None
+        self._collaborations.update(
+            self.graph,
+            [node for node, node_type in added.items() if node_type == "title"],
+            [node for node, node_type in removed.items() if node_type == "title"],
+        )
+
+    @property
+    def numeric(self) -> NumericIndex:
+        """Sorted rating, runtime and year columns, built on first use"""
+        if self._numeric is None:
+            with self._write_lock:
+                if self._numeric is None:
+                    self._numeric = NumericIndex.build(self.graph, self.index)
+        return self._numeric
+
+    @property
+    def semantic(self) -> SemanticIndex:
+        """Overview similarity index, loaded from disk or built on first use"""
+        if self._semantic is None:
+            with self._write_lock:
+                if self._semantic is None:
+                    self._semantic = self._load_semantic()
+        return self._semantic
+
+    def _load_semantic(self) -> SemanticIndex:
+        semantic = SemanticIndex.load(self.semantic_file, self.version, self.index)
+        if semantic is None:
+            logger.info(f"Building semantic index {self.semantic_file}")
+            semantic = SemanticIndex.build(self.graph, self.index)
+            try:
+                semantic.save(self.semantic_file, self.version)
+            except OSError as e:
+                logger.warning(f"Could not save semantic index: {e}")
+        return semantic
+
+    @classmethod
+    def build_snapshot(
+        cls,
+        csv_file: str = "data/imdb_top_1000.csv",
+        snapshot_file: Optional[str] = None,
+        related: int = 10,
+    ) -> str:
+        """Build the compact graph from the csv file and write it to disk
+
+        The ``related`` most related titles of every title are stored with
+        the graph, unless it is 0, and so are the aggregate views.
+        """
+
+        snapshot_file = snapshot_file or snapshot_path(csv_file)
+        database = cls(csv_file, backend="compact")
+        arrays = RelatedTitles.build(database, related).arrays() if related else {}
+        arrays.update(database.aggregates.arrays())
+        write_snapshot(database.graph, snapshot_file, file_checksum(csv_file), arrays)
+        return snapshot_file
+
+    @classmethod
+    def load_snapshot(
+        cls,
+        snapshot_file: Optional[str] = None,
+        csv_file: str = "data/imdb_top_1000.csv",
+        rebuild: bool = True,
+        scoring: str = "index",
+        shards: int = 0,
+    ) -> "MovieDatabase":
+        """Load a database from a memory-mapped snapshot
+
+        The snapshot is rebuilt when it is missing or when the checksum of
+        the source csv file changed, unless ``rebuild`` is False.
+        """
+
+        snapshot_file = snapshot_file or snapshot_path(csv_file)
+        stale = not os.path.exists(snapshot_file) or (
+            os.path.exists(csv_file)
+            and read_checksum(snapshot_file) != file_checksum(csv_file)
+        )
+        if stale:
+            if not rebuild:
+                raise ValueError(f"Snapshot {snapshot_file} is missing or outdated")
+            logger.info(f"Rebuilding snapshot {snapshot_file} from {csv_file}")
+            cls.build_snapshot(csv_file, snapshot_file)
+
+        if scoring not in SCORINGS:
+            raise ValueError(f"Unknown scoring {scoring!r}, expected one of {SCORINGS}")
+        database = cls.__new__(cls)
+        database.scoring = scoring
+        database.graph, header, arrays = read_snapshot(snapshot_file)
+        database.version = header["checksum"]
+        database.semantic_file = semantic_path(snapshot_file)
+        database.build_indexes()
+        related = RelatedTitles.from_arrays(database.index, arrays)
+        if related is not None:
+            database._use_related(related)
+        aggregates = AggregateViews.from_arrays(arrays)
+        if aggregates is None:
+            # Snapshots written before the views were stored
+            titles = database.index.titles
+            aggregates = AggregateViews.from_movies(
+                database.movie(titles[p]) for p in database.index.live_positions()
+            )
+        database.aggregates = aggregates
+        database.start_shards(shards)
+        return database
 
     def process_csv(self, csv_file: str):
         """Process the csv file"""
@@ -23,9 +312,24 @@ class MovieDatabase:
         # Read csv file
         df = pd.read_csv(csv_file)
         df.index = pd.RangeIndex(start=0, stop=len(df))
+        return self.process_frame(df)
+
+    def read_csv_chunks(
+        self, csv_file: str, chunksize: int = 10000
+    ) -> Iterator[pd.DataFrame]:
+        """Read the csv file as cleaned chunks of rows"""
+        with pd.read_csv(csv_file, chunksize=chunksize) as reader:
+            for df in reader:
+                yield self.process_frame(df)
+
+    def process_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Clean the rows of the source csv format"""
 
         # Drop columns
-        df = df.drop(columns=["Certificate", "Meta_score", "No_of_Votes", "Gross"])
+        df = df.drop(
+            columns=["Certificate", "Meta_score", "No_of_Votes", "Gross"],
+            errors="ignore",
+        )
 
         # Rename columns
         df = df.rename(
@@ -131,6 +435,335 @@ class MovieDatabase:
 
         return G
 
+    def create_compact_graph(
+        self, years: set, genres: set, directors: set, actors: set, titles: dict
+    ) -> CompactGraph:
+        """Create an array-backed graph with the same nodes and edges"""
+
+        builder = CompactGraphBuilder()
+
+        # Add years, genres, directors, and actors nodes
+        for items, node_type in [
+            (years, "year"),
+            (genres, "genre"),
+            (directors, "director"),
+            (actors, "actor"),
+        ]:
+            for item in items:
+                builder.add_node(item, node_type)
+
+        # Iterate through the list of dictionaries and add nodes and edges
+        for movie in titles.values():
+            genre = movie.pop("Genre")
+            director = movie.pop("Director")
+            actor = movie.pop("Actors")
+            year = movie.pop("Year")
+            title = movie.pop("Title")
+
+            builder.add_title(title, movie)
+            builder.add_node(year, "year")
+            builder.add_edges(title, [year], "title_year_edge")
+            builder.add_edges(title, director, "title_director_edge")
+            builder.add_edges(title, actor, "title_actor_edge")
+            builder.add_edges(title, genre, "title_genre_edge")
+
+        return builder.build()
+
+    def create_graph_from_chunks(self, chunks: Iterable[pd.DataFrame]) -> nx.Graph:
+        """Create the graph of create_graph one chunk of movies at a time
+
+        Only the graph and the current chunk are in memory. Nodes get the
+        type create_graph gives them, see ``NODE_PRECEDENCE``, and titles
+        keep the order of the csv file.
+        """
+        self.graph = nx.Graph()
+        for df in chunks:
+            for movie in self._movies(df):
+                self._add_movie(movie, {}, {})
+        return self.graph
+
+    @staticmethod
+    def _movies(df: pd.DataFrame) -> Iterator[Dict]:
+        # One row dict at a time, to_dict would copy the whole chunk
+        columns = df.columns.tolist()
+        for row in zip(*(df[column].tolist() for column in columns)):
+            yield dict(zip(columns, row))
+
+    def create_compact_graph_from_chunks(
+        self, chunks: Iterable[pd.DataFrame]
+    ) -> CompactGraph:
+        """Create the graph of create_compact_graph one chunk of movies at a time"""
+
+        builder = CompactGraphBuilder()
+        for df in chunks:
+            for movie in self._movies(df):
+                genre = movie.pop("Genre")
+                director = movie.pop("Director")
+                actor = movie.pop("Actors")
+                year = movie.pop("Year")
+                title = movie.pop("Title")
+
+                for items, node_type in [
+                    ([year], "year"),
+                    (genre, "genre"),
+                    (director, "director"),
+                    (actor, "actor"),
+                ]:
+                    for item in items:
+                        current = builder.node_type(item)
+                        if current is None or outranks(node_type, current):
+                            builder.add_node(item, node_type)
+
+                builder.add_title(title, movie)
+                builder.add_edges(title, [year], "title_year_edge")
+                builder.add_edges(title, director, "title_director_edge")
+                builder.add_edges(title, actor, "title_actor_edge")
+                builder.add_edges(title, genre, "title_genre_edge")
+
+        return builder.build()
+
+    def on_change(self, listener: Callable[[Dict, Dict], None]):
+        """Call a listener after each catalog update
+
+        The listener gets the added and the removed nodes, mapped to their
+        node type. A node whose type changed is in both.
+        """
+        self._listeners.append(listener)
+
+    def movie(self, title: str) -> Dict:
+        """Get a movie in the format taken by ``add_movies``"""
+        if not self._is_title(title):
+            raise KeyError(title)
+        movie = dict(self.graph.nodes[title]["attributes"], Title=title)
+        movie.update(Genre=[], Director=[], Actors=[])
+        for neighbor, edge in self.graph[title].items():
+            if edge["type"] == "title_year_edge":
+                movie["Year"] = neighbor
+            elif edge["type"] == "title_genre_edge":
+                movie["Genre"].append(neighbor)
+            elif edge["type"] == "title_director_edge":
+                movie["Director"].append(neighbor)
+            elif edge["type"] == "title_actor_edge":
+                movie["Actors"].append(neighbor)
+        return movie
+
+    def add_movies(self, movies: Iterable[Dict]) -> Dict[str, int]:
+        """Add new movies to the catalog
+
+        Movies are dicts with the ``Title``, ``Year``, ``Genre``,
+        ``Director`` and ``Actors`` of a cleaned csv row, the last three as
+        lists, and any other attributes such as ``Rating`` or ``Overview``.
+        """
+        movies = list(movies)
+        existing = [movie.get("Title") for movie in movies]
+        existing = [title for title in existing if self._is_title(title)]
+        if existing:
+            raise ValueError(f"Movies already in the catalog: {existing}")
+        return self.apply_changes(movies, [])
+
+    def update_movie(self, title: str, changes: Dict) -> Dict[str, int]:
+        """Change some fields of a movie, such as its ``Actors``
+
+        An updated movie moves to the end of the catalog order, as if it was
+        removed and added again.
+        """
+        movie = {**self.movie(title), **changes}
+        if movie["Title"] == title:
+            return self.apply_changes([movie], [])
+        if self._is_title(movie["Title"]):
+            raise ValueError(f"Movie already in the catalog: {movie['Title']}")
+        return self.apply_changes([movie], [title])
+
+    def remove_movie(self, title: str) -> Dict[str, int]:
+        """Remove a movie, with the people, genres and years left without one"""
+        if not self._is_title(title):
+            raise KeyError(title)
+        return self.apply_changes([], [title])
+
+    def ingest_delta(self, delta_file: str) -> Dict[str, int]:
+        """Apply a csv or JSON lines file of changes to the catalog
+
+        Rows use the columns of the source csv file. An optional ``op`` column
+        holds ``upsert``, the default, to add or replace the movie of the
+        same title, or ``remove`` to remove it. The last row of a title wins
+        and removing a missing title does nothing.
+        """
+        upserts, removals = self.read_delta(delta_file)
+        return self.apply_changes(
+            upserts, [title for title in removals if self._is_title(title)]
+        )
+
+    def read_delta(self, delta_file: str) -> Tuple[List[Dict], List[str]]:
+        """Read the movies to upsert and the titles to remove from a delta file"""
+        if delta_file.endswith((".jsonl", ".json")):
+            df = pd.read_json(delta_file, lines=True, dtype=False)
+        else:
+            df = pd.read_csv(delta_file)
+        ops = df.pop("op").fillna("upsert") if "op" in df else None
+        if ops is None:
+            ops = pd.Series("upsert", index=df.index)
+        unknown = set(ops) - set(DELTA_OPS)
+        if unknown:
+            raise ValueError(f"Unknown ops {sorted(unknown)}, expected {DELTA_OPS}")
+
+        # Keep the last row of every title
+        df = df[~df["Series_Title"].duplicated(keep="last")]
+        ops = ops.loc[df.index]
+        removals = df.loc[ops == "remove", "Series_Title"].tolist()
+        upserts = df[ops == "upsert"]
+        if upserts.empty:
+            return [], removals
+        upserts = self.process_frame(upserts)
+        return upserts.to_dict(orient="records"), removals
+
+    def apply_changes(
+        self, upserts: List[Dict], removals: Iterable[str]
+    ) -> Dict[str, int]:
+        """Add or replace movies and remove titles, as one catalog update
+
+        The networkx graph is changed in place and the indexes get new
+        versions holding the changes in small layers, so the work depends on
+        the size of the changes, not of the catalog. Queries keep reading
+        the previous versions until the new ones are swapped in, and are
+        never blocked. Cached results are dropped by changing the catalog
+        ``version``.
+        """
+        if isinstance(self.graph, CompactGraph):
+            raise ValueError(
+                "The compact graph is read-only, update a networkx database "
+                "and rebuild the snapshot"
+            )
+        movies = {}
+        for movie in upserts:
+            missing = [field for field in MOVIE_FIELDS if field not in movie]
+            if missing:
+                raise ValueError(f"Movie {movie.get('Title')!r} misses {missing}")
+            movies[movie["Title"]] = movie
+        removals = list(dict.fromkeys(removals))
+
+        with self._write_lock:
+            for title in removals:
+                if title in movies or not self._is_title(title):
+                    raise ValueError(f"Cannot remove {title!r}")
+            graph = self.graph
+            replaced = [title for title in movies if self._is_title(title)]
+            added: Dict = {}
+            removed: Dict = {}
+
+            # Removed titles keep their adjacency for the queries reading it
+            neighbors = set()
+            for title in replaced + removals:
+                neighbors.update(graph.neighbors(title))
+                graph.remove_node(title)
+                removed[title] = "title"
+            for movie in movies.values():
+                self._add_movie(movie, added, removed)
+
+            # Drop the nodes left without a title, retype the people left
+            for node in neighbors:
+                if node not in graph or node in added:
+                    continue
+                node_type = graph.nodes[node]["type"]
+                if graph.degree(node) == 0:
+                    graph.remove_node(node)
+                    removed[node] = node_type
+                elif node_type in ("director", "actor"):
+                    edges = {edge["type"] for edge in graph[node].values()}
+                    role = "actor" if "title_actor_edge" in edges else "director"
+                    if role != node_type:
+                        graph.nodes[node]["type"] = added[node] = role
+                        removed[node] = node_type
+
+            index = self.index.updated(
+                [(title, list(graph.neighbors(title))) for title in movies],
+                replaced + removals,
+            )
+            semantic = self._semantic
+            if semantic is not None:
+                semantic = semantic.updated(graph, index)
+            if index.overlay_size > self._overlay_limit(len(index.titles)):
+                logger.info("Rebuilding the attribute index")
+                live = index.live_positions()
+                index = AttributeIndex(graph)
+                if semantic is not None:
+                    semantic = semantic.compacted(live, index)
+            names = self._names
+            if names is not None:
+                names = names.updated(graph, added, removed)
+                if names.overlay_size > self._overlay_limit(len(names.names)):
+                    logger.info("Rebuilding the name index")
+                    names = NameIndex(graph)
+            numeric = self._numeric
+            if numeric is not None:
+                numeric = numeric.updated(graph, index)
+
+            # The similarity search and the numeric filters read the attribute
+            # index of their own version, and results cached while the
+            # version changes are never read again
+            self.index, self._names = index, names
+            self._semantic, self._numeric = semantic, numeric
+            digest = hashlib.sha256(self.version.encode())
+            changes = [list(movies.values()), removals]
+            digest.update(json.dumps(changes, sort_keys=True, default=str).encode())
+            self.version = digest.hexdigest()
+
+            for listener in self._listeners:
+                listener(added, removed)
+
+        return {
+            "added": len(movies) - len(replaced),
+            "updated": len(replaced),
+            "removed": len(removals),
+        }
+
+    def _overlay_limit(self, size: int) -> float:
+        return max(self.min_overlay, self.max_overlay * size)
+
+    def _is_title(self, node) -> bool:
+        try:
+            return node in self.graph and self.graph.nodes[node]["type"] == "title"
+        except TypeError:
+            return False
+
+    def _add_movie(self, movie: Dict, added: Dict, removed: Dict):
+        """Add a title node with its edges, recording the new and retyped nodes"""
+        graph = self.graph
+        assert isinstance(graph, nx.Graph), "The compact graph is read-only"
+        movie = dict(movie)
+        genre = movie.pop("Genre")
+        director = movie.pop("Director")
+        actor = movie.pop("Actors")
+        year = movie.pop("Year")
+        title = movie.pop("Title")
+
+        for items, node_type in [
+            ([year], "year"),
+            (genre, "genre"),
+            (director, "director"),
+            (actor, "actor"),
+        ]:
+            for item in items:
+                if item not in graph:
+                    graph.add_node(item, type=node_type)
+                    added[item] = node_type
+                    continue
+                current = graph.nodes[item]["type"]
+                if outranks(node_type, current):
+                    graph.nodes[item]["type"] = added[item] = node_type
+                    removed.setdefault(item, current)
+
+        graph.add_node(title, type="title", attributes=movie)
+        added[title] = "title"
+        graph.add_edge(title, year, type="title_year_edge")
+        for items, edge_type in [
+            (director, "title_director_edge"),
+            (actor, "title_actor_edge"),
+            (genre, "title_genre_edge"),
+        ]:
+            for item in items:
+                graph.add_edge(title, item, type=edge_type)
+
+    @traced("query_movies")
     def query_movies(
         self,
         title: Optional[str] = None,
@@ -139,29 +772,118 @@ class MovieDatabase:
         director: Optional[str] = None,
         actor: Optional[str] = None,
         same_attributes_as: Optional[dict[str, str]] = None,
-    ) -> List[Tuple[str, float]]:
-        def get_neighbors_by_edge_type(node, edge_type):
-            return [
-                neighbor
-                for neighbor, edge_attrs in self.graph[node].items()
-                if edge_attrs["type"] == edge_type
-            ]
-
-        def matches_partial(queried, neighbor):
-            if isinstance(queried, int) and isinstance(neighbor, int):
-                return queried == neighbor
-            elif isinstance(queried, str) and isinstance(neighbor, str):
-                for q in queried.split():
-                    if q.lower() in neighbor.lower():
-                        return True
-            return False
+        similar_to: Optional[str] = None,
+        year_range: Optional[List[Optional[int]]] = None,
+        min_rating: Optional[float] = None,
+        max_runtime: Optional[int] = None,
+        order_by: Optional[str] = None,
+    ) -> List[MovieResult]:
+        """Find the titles matching the most queried attributes
 
-        def similarity_score(title, queried_attributes):
-            matching_attributes = sum(
-                any((matches_partial(attr, n) for n in self.graph.neighbors(title)))
-                for attr in queried_attributes
+        ``year_range``, ``min_rating`` and ``max_runtime`` leave out the
+        titles outside their inclusive range, ``order_by`` breaks ties by
+        ``rating``, ``year`` or ``runtime``, descending with a leading -.
+        """
+        queried_attributes = self.get_queried_attributes(
+            title=title,
+            year=year,
+            genre=genre,
+            director=director,
+            actor=actor,
+            same_attributes_as=same_attributes_as,
+        )
+        ranges = numeric_ranges(year_range, min_rating, max_runtime)
+        order = parse_order(order_by)
+        if similar_to:
+            return self.score_similar(queried_attributes, similar_to, ranges=ranges)
+        # The titles compared with are not among their own matches
+        sources = self._sources(same_attributes_as)
+        if ranges or order:
+            return self.score_filtered(
+                queried_attributes, ranges, order, sources=sources
             )
-            return matching_attributes / len(queried_attributes)
+        index = self.index
+        if not (year or genre or director or actor):
+            top = self.related_top(index, title, same_attributes_as)
+            if top is not None:
+                return self._movie_scores(index, top, queried_attributes)
+        return self.score_movies(queried_attributes, sources)
+
+    def query_movies_batch(self, queries: List[Dict]) -> List[List[MovieResult]]:
+        """Run query_movies for a list of parameter dicts, keeping their order
+
+        Identical queries are scored once, and the attribute matches are
+        cached by the index, so they are shared by the whole batch.
+        """
+        results: Dict = {}
+        if self.shards is not None:
+            # Send the distinct queries to the workers in one round trip
+            index = self.index
+            distinct: Dict[Tuple, List] = {}
+            for params in queries:
+                if not self._scored_alone(params):
+                    attributes = self.get_queried_attributes(**params)
+                    try:
+                        distinct.setdefault(tuple(attributes), attributes)
+                    except TypeError:
+                        pass
+            tops = self.shards.top(index, list(distinct.values()), 5, self.scoring)
+            if tops is not None:
+                for (key, attributes), top in zip(distinct.items(), tops):
+                    results[key] = self._movie_scores(index, top, attributes)
+
+        output = []
+        for params in queries:
+            if self._scored_alone(params):
+                output.append(self.query_movies(**params))
+                continue
+            queried_attributes = self.get_queried_attributes(**params)
+            if not any(params.get(k) for k in ("year", "genre", "director", "actor")):
+                index = self.index
+                related = self.related_top(
+                    index, params.get("title"), params.get("same_attributes_as")
+                )
+                if related is not None:
+                    output.append(
+                        self._movie_scores(index, related, queried_attributes)
+                    )
+                    continue
+            try:
+                key = tuple(queried_attributes)
+                hash(key)
+            except TypeError:
+                output.append(self.score_movies(queried_attributes))
+                continue
+            if key not in results:
+                results[key] = self.score_movies(queried_attributes)
+            output.append(list(results[key]))
+        return output
+
+    @staticmethod
+    def _scored_alone(params: Dict) -> bool:
+        # Similarity searches, numeric filters and queries leaving their
+        # source titles out are not shared in a batch
+        return bool(
+            params.get("similar_to") or params.get("same_attributes_as")
+        ) or any(params.get(name) is not None for name in FILTERS)
+
+    def _sources(self, same_attributes_as: Optional[dict[str, str]]) -> Set[str]:
+        """Get the titles same_attributes_as compares with"""
+        if not same_attributes_as:
+            return set()
+        titles = (self.resolve_name(v, "title") for v in same_attributes_as.values())
+        return {title for title in titles if self._is_title(title)}
+
+    def get_queried_attributes(
+        self,
+        title: Optional[str] = None,
+        year: Optional[int] = None,
+        genre: Optional[str] = None,
+        director: Optional[str] = None,
+        actor: Optional[str] = None,
+        same_attributes_as: Optional[dict[str, str]] = None,
+    ) -> List:
+        """Get the list of attributes a query is scored against"""
 
         queried_attributes = []
         if year:
@@ -169,45 +891,338 @@ class MovieDatabase:
         if genre:
             queried_attributes.append(genre)
         if director:
-            queried_attributes.append(director)
+            queried_attributes.append(self.resolve_name(director, "director"))
         if actor:
-            queried_attributes.append(actor)
+            queried_attributes.append(self.resolve_name(actor, "actor"))
 
         if same_attributes_as:
             for key, value in same_attributes_as.items():
                 queried_attributes.extend(
-                    get_neighbors_by_edge_type(
-                        self.graph, value, f"title_{key}_edself.graphe"
+                    relation_attributes(
+                        self.graph, self.resolve_name(value, "title"), relation_of(key)
                     )
                 )
 
         if title:
-            queried_attributes.extend(
-                get_neighbors_by_edge_type(title, "title_year_edge")
-            )
-            queried_attributes.extend(
-                get_neighbors_by_edge_type(title, "title_genre_edge")
-            )
-            queried_attributes.extend(
-                get_neighbors_by_edge_type(title, "title_director_edge")
-            )
-            queried_attributes.extend(
-                get_neighbors_by_edge_type(title, "title_actor_edge")
-            )
+            title = self.resolve_name(title, "title")
+            queried_attributes.extend(relation_attributes(self.graph, title, "title"))
+
+        return queried_attributes
 
+    def related_top(
+        self,
+        index: AttributeIndex,
+        title: Optional[str] = None,
+        same_attributes_as: Optional[dict[str, str]] = None,
+    ) -> Optional[List[Tuple[int, int]]]:
+        """Read the top titles of a query on a single title from the related table
+
+        Rows leave their own title out, a query on the title itself gets it
+        back in the place live scoring gives it, as it matches every one of
+        its attributes. Returns None when the query is on more than one
+        title, or when the table is missing or belongs to another index
+        version.
+        """
+        if self.related is None:
+            return None
+        if title and not same_attributes_as:
+            relation, source = "title", title
+        elif same_attributes_as and not title and len(same_attributes_as) == 1:
+            ((key, source),) = same_attributes_as.items()
+            relation = relation_of(key)
+        else:
+            return None
+        source = self.resolve_name(source, "title")
+        try:
+            position = index.position(source) if self._is_title(source) else None
+        except KeyError:
+            # Added by an update that is not swapped in yet
+            position = None
+        if position is None:
+            return None
+        if same_attributes_as:
+            return self.related.lookup(index, position, relation, 5)
+        top = self.related.lookup(index, position, relation, 4)
+        if top is None:
+            return None
+        matched = (position, len(relation_attributes(self.graph, source, relation)))
+        return sorted(top + [matched], key=lambda x: (-x[1], x[0]))
+
+    def person(self, name: str) -> str:
+        """Get the actor or director node a name refers to
+
+        Raises KeyError when no person goes by a close enough name.
+        """
+        if name in self.graph and self.graph.nodes[name]["type"] in PERSON_TYPES:
+            return name
+        person = self.names.resolve(name, types=PERSON_TYPES)
+        if person is None:
+            raise KeyError(name)
+        return person
+
+    def co_occurring(self, *names: str, k: int = 10) -> List[Tuple[str, int]]:
+        """Get the people who shared titles with every one of the given people
+
+        Each comes with the number of titles shared in total, from the
+        precomputed collaboration counts, see ``Collaborations.top``.
+        """
+        people = [self.person(name) for name in names]
+        return self.collaborations.top(people, k)
+
+    def expand(
+        self,
+        node,
+        hops: int = 2,
+        edge_types: Iterable[str] = EDGE_TYPES,
+        max_degree: int = MAX_DEGREE,
+        max_nodes: int = MAX_NODES,
+    ) -> Dict:
+        """Get the nodes at most ``hops`` edges away, with their depth
+
+        Hubs such as genres and years are reached but not expanded, see
+        traversal.expand.
+        """
+        if node not in self.graph:
+            raise KeyError(node)
+        return expand(self.graph, node, hops, tuple(edge_types), max_degree, max_nodes)
+
+    def shortest_path(
+        self,
+        source: str,
+        target: str,
+        edge_types: Iterable[str] = PERSON_EDGES,
+        max_depth: int = 8,
+        max_degree: int = MAX_DEGREE,
+        max_nodes: int = MAX_NODES,
+    ) -> Optional[List]:
+        """Find the shortest collaboration path between two people
+
+        By default the path only follows actor and director edges, so it
+        alternates people and the titles they shared, see
+        traversal.shortest_path for the limits.
+        """
+        return shortest_path(
+            self.graph,
+            self.person(source),
+            self.person(target),
+            tuple(edge_types),
+            max_depth,
+            max_degree,
+            max_nodes,
+        )
+
+    def aggregate(self, kind: str, name) -> Tuple[Any, Dict]:
+        """Get the precomputed view of a director, actor, genre or decade
+
+        People are resolved like query parameters, genres by their words
+        and decades from forms such as 1990s or 90s. The name of a
+        ``genre_decade`` is a ``(genre, decade)`` pair. Returns the group key
+        with its view, see ``AggregateViews``, and raises KeyError when no
+        title is in the group.
+        """
+        if kind not in KINDS:
+            raise ValueError(f"Unknown kind {kind!r}, expected one of {KINDS}")
+        aggregates = self.aggregates
+        key = name
+        if kind in PERSON_TYPES and aggregates.view(kind, name) is None:
+            key = self.names.resolve(name, types=PERSON_TYPES) or name
+        if aggregates.view(kind, key) is None:
+            key = aggregates.find(kind, key)
+        view = aggregates.view(kind, key)
+        if view is None:
+            raise KeyError(name)
+        return key, view
+
+    def rank_groups(
+        self, kind: str, by: str = "count", n: int = 10, min_count: int = 3
+    ) -> List[Tuple[Any, Dict]]:
+        """Get the n directors, actors, genres or decades with the most titles
+
+        With ``by="mean_rating"`` they are ranked by the mean rating of their
+        titles instead, among groups of at least ``min_count`` titles.
+        """
+        return self.aggregates.rank(kind, by, n, min_count)
+
+    def resolve_name(self, name, node_type: str):
+        """Map a misspelled or differently accented name to a graph node
+
+        Titles are resolved unless they are an exact node, people only when
+        their partial match finds nothing, so existing matches never change.
+        Unresolved names are returned unchanged.
+        """
+
+        if not isinstance(name, str):
+            return name
+        if node_type == "title":
+            if name in self.graph.nodes:
+                return name
+        elif self.index.match(name):
+            return name
+        return self.names.resolve(name, types=(node_type,)) or name
+
+    def score_movies(
+        self, queried_attributes: List, sources: Iterable[str] = ()
+    ) -> List[MovieResult]:
+        """Rank the titles by the fraction of queried attributes they match
+
+        The ``sources`` titles are left out.
+        """
+
+        # One version of the index for the whole query, updates swap it
+        index = self.index
+        excluded = self._positions(index, sources)
+        top = self.top_titles(index, queried_attributes, 5, excluded)
+        return self._movie_scores(index, top, queried_attributes)
+
+    @staticmethod
+    def _positions(index: AttributeIndex, titles: Iterable[str]) -> Set[int]:
+        positions = set()
+        for title in titles:
+            try:
+                positions.add(index.position(title))
+            except KeyError:
+                # Added by an update that is not swapped in yet
+                pass
+        return positions
+
+    def top_titles(
+        self,
+        index: AttributeIndex,
+        queried_attributes: List,
+        k: int,
+        excluded: Collection[int] = (),
+    ) -> List[Tuple[int, int]]:
+        """Get the k ``(position, count)`` pairs matching the most attributes
+
+        Ties are broken by position, so the order is the one of a scan. The
+        ``excluded`` positions are left out.
+        """
+        if excluded:
+            top = self.top_titles(index, queried_attributes, k + len(excluded))
+            return [pair for pair in top if pair[0] not in excluded][:k]
+        if self.shards is not None:
+            tops = self.shards.top(index, [queried_attributes], k, self.scoring)
+            if tops is not None:
+                return tops[0]
+        if self.scoring == "vectorized":
+            # Score the whole catalog at once and partially select the top k
+            counts = index.counts(queried_attributes)
+            positions = top_k(counts, k)
+            return list(zip(positions.tolist(), counts[positions].tolist()))
+        # Only score the titles that match at least one attribute
+        candidates = index.candidates(queried_attributes)
+        return heapq.nsmallest(k, candidates.items(), key=lambda x: (-x[1], x[0]))
+
+    def score_filtered(
+        self,
+        queried_attributes: List,
+        ranges: Ranges,
+        order: Optional[Tuple[str, bool]],
+        k: int = 5,
+        sources: Iterable[str] = (),
+    ) -> List[MovieResult]:
+        """Rank the titles within numeric ranges, ties broken by a column order
+
+        The titles in the ranges are read from the sorted columns and
+        intersected with the titles matching an attribute. Without queried
+        attributes, every title in the ranges scores 1 and the first k are
+        read in order from the sorted columns, without scoring the others.
+        The ``sources`` titles are left out.
+        """
+
+        # Positions of the numeric index follow its own attribute index version
+        numeric = self.numeric
+        index = numeric.index
+        if not queried_attributes:
+            if order is not None:
+                first = numeric.top(*order, ranges, k)
+            else:
+                first = numeric.select(ranges)[:k].tolist()
+            return self._movie_scores(index, [(p, 0) for p in first], [])
+
+        selected = numeric.select(ranges) if ranges else None
+        if self.scoring == "vectorized":
+            counts = index.counts(queried_attributes)
+            positions = np.flatnonzero(counts) if selected is None else selected
+            counts = counts[positions]
+        else:
+            matches = index.candidates(queried_attributes)
+            if selected is not None and len(selected) < len(matches):
+                positions = selected
+                counts = np.array([matches.get(p, 0) for p in selected.tolist()])
+            else:
+                positions = np.fromiter(matches, dtype=np.int64, count=len(matches))
+                counts = np.fromiter(matches.values(), dtype=np.int64)
+                if selected is not None:
+                    kept = np.isin(positions, selected, assume_unique=True)
+                    positions, counts = positions[kept], counts[kept]
+        matched = counts > 0
+        excluded = self._positions(index, sources)
+        if excluded:
+            matched &= ~np.isin(positions, list(excluded))
+        top = numeric.rank(positions[matched], counts[matched], order, k)
+        return self._movie_scores(index, top, queried_attributes)
+
+    def _movie_scores(
+        self, index: AttributeIndex, top: Iterable[Tuple[int, int]], queried_attributes
+    ) -> List[MovieResult]:
+        # Without queried attributes, the titles met every filter
+        total = len(queried_attributes)
+        titles = index.titles
         movie_scores = [
-            (m, similarity_score(m, queried_attributes))
-            for m, data in self.graph.nodes(data=True)
-            if data["type"] == "title"
+            MovieResult(titles[m], c / total if total else 1.0, titles[m])
+            for m, c in top
         ]
-        movie_scores = [(m, s) for m, s in movie_scores if s > 0]
-        movie_scores.sort(key=lambda x: x[1], reverse=True)
 
         # Keep only score 1 if exists
-        if any(s == 1 for m, s in movie_scores):
-            movie_scores = [(m, s) for m, s in movie_scores if s == 1]
+        if any(result.score == 1 for result in movie_scores):
+            movie_scores = [result for result in movie_scores if result.score == 1]
+
+        return movie_scores
 
-        return movie_scores[:5]
+    def score_similar(
+        self,
+        queried_attributes: List,
+        similar_to: str,
+        candidates: int = 50,
+        ranges: Optional[Ranges] = None,
+    ) -> List[MovieResult]:
+        """Rank the titles closest to a title or a plot description
+
+        The cosine similarity of the overviews counts as one more, partially
+        matched attribute, so the score stays the fraction of the query met.
+        Candidates outside the numeric ``ranges`` are left out.
+        """
+
+        # Positions of the semantic index follow its own attribute index version
+        semantic = self.semantic
+        index = semantic.index
+        title = self.names.resolve(similar_to, types=("title",), max_distance=0)
+        try:
+            position = index.position(title)
+            query = semantic.vector(position)
+        except KeyError:
+            position = None
+            query = semantic.encode(similar_to)
+
+        positions, similarities = semantic.search(query, candidates + 1)
+        if ranges:
+            numeric = self.numeric
+            if numeric.index is not index:
+                # Only while an update swaps the indexes
+                numeric = NumericIndex.build(self.graph, index)
+            kept = numeric.within(positions, ranges)
+            positions, similarities = positions[kept], similarities[kept]
+        counts = index.candidates(queried_attributes)
+        total = len(queried_attributes) + 1
+        scores = [
+            (p, (counts.get(p, 0) + max(s, 0.0)) / total)
+            for p, s in zip(positions.tolist(), similarities.tolist())
+            if p != position
+        ]
+        top = heapq.nsmallest(5, scores, key=lambda x: (-x[1], x[0]))
+        titles = index.titles
+        return [MovieResult(titles[p], round(s, 3), titles[p]) for p, s in top]
 
 
 if __name__ == "__main__":
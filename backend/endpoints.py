@@ -1,22 +1,339 @@
+import asyncio
+import json
 import logging
+import time
+from typing import Dict, List, Optional
 
-from agent import MovieAgent
-from database import MovieDatabase
-from fastapi import APIRouter, HTTPException, Query
-from run import get_result_and_thought_using_graph
+import metrics
+import tracing
+from answers import etag, etag_matches, project
+from fastapi import APIRouter, Body, Header, HTTPException, Query, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pool import AgentPool, PoolSaturatedError, QueueTimeoutError
+from results import CARD_FIELDS, current_tool_run, results_for
+from run import (
+    MOVIE_TOOLS,
+    get_movies_from_observation,
+    get_result_and_thought_using_graph,
+)
+from service import PARTS, Service
 
 # build router
 router = APIRouter()
 logger = logging.getLogger(__name__)
-movie_graph = MovieDatabase()
-agent_movie = MovieAgent.initialize(movie_graph=movie_graph)
+stream_first_event = metrics.histogram(
+    "predict_stream_time_to_first_byte_seconds",
+    "Time from a /predict_stream request to its first streamed event",
+)
+fast_path_latency = metrics.histogram(
+    "predict_fast_path_seconds", "Latency of messages answered by the fast path"
+)
+agent_latency = metrics.histogram(
+    "predict_agent_seconds", "Latency of messages answered by the agent"
+)
+# The database and the agent load in the background once the app starts
+service = Service()
+
+
+def check_ready(part: str = "database"):
+    """Reject a request until the database, or the agent, is loaded"""
+    status = service.status(part)
+    if status != "ready":
+        detail = f"The {part} failed to load" if status == "failed" else None
+        raise HTTPException(
+            status_code=503,
+            detail=detail or f"The {part} is loading",
+            headers={"Retry-After": "5"},
+        )
+
+
+def agent_pool() -> AgentPool:
+    """Get the agent pool, rejecting the request until the agent is loaded"""
+    check_ready("agent")
+    assert service.agent_pool is not None
+    return service.agent_pool
+
+
+def check_fields(fields: Optional[List[str]]):
+    """Reject a projection with unknown movie card fields"""
+    unknown = set(fields or ()) - set(CARD_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unknown fields {sorted(unknown)}, expected {list(CARD_FIELDS)}",
+        )
+
+
+def answer_fast(message: str, fields: Optional[List[str]] = None):
+    """Answer a structured message without the LLM, or return None"""
+    start = time.perf_counter()
+    with tracing.span("fast_path"):
+        result = service.fast_path.answer(message, fields)
+    if result is not None:
+        fast_path_latency.observe(time.perf_counter() - start)
+    return result
+
+
+def answer_fast_batch(messages: List[str], fields: Optional[List[str]] = None):
+    """Answer the structured messages of a batch together, the others get None"""
+    start = time.perf_counter()
+    with tracing.span("fast_path"):
+        results = service.fast_path.answer_batch(messages, fields)
+    answered = sum(result is not None for result in results)
+    for _ in range(answered):
+        fast_path_latency.observe((time.perf_counter() - start) / answered)
+    return results
+
+
+def answer_with_agent(message: str, fields: Optional[List[str]] = None):
+    """Answer a message with the agent, timing the run"""
+    start = time.perf_counter()
+    result = get_result_and_thought_using_graph(
+        service.agent, service.movie_graph, message, fields
+    )
+    agent_latency.observe(time.perf_counter() - start)
+    return result
 
 
 @router.get("/predict")
-def get_load(message: str = Query(...)):
+async def get_load(
+    response: Response,
+    message: str = Query(...),
+    timings: bool = Query(False),
+    fields: List[str] = Query(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    """Answer a message, with the time spent per stage if timings is set
+
+    Repeated ``fields`` parameters limit the movie cards to those fields.
+    Answers without timings carry an ETag, sending it back in If-None-Match
+    gets a 304 without a body while the answer is unchanged.
+    """
+    check_fields(fields)
+    check_ready()
+    # The agent pool copies the context, so its spans land in this trace
+    with tracing.trace() as trace:
+        result = await answer(message, fields)
+    if timings:
+        return {**result, "timings": trace.breakdown()}
+    tag = etag(result)
+    headers = {"ETag": tag, "Cache-Control": "no-cache"}
+    if etag_matches(tag, if_none_match):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return result
+
+
+async def answer(message: str, fields: Optional[List[str]] = None):
+    """Answer a message with the fast path, or with the agent in the pool
+
+    Identical messages share the cached answer, or wait for the agent run
+    of the first one without taking a place in the pool.
+    """
+    result = answer_fast(message, fields)
+    if result is not None:
+        return result
+    return await answer_in_pool(message, fields)
+
+
+async def answer_in_pool(message: str, fields: Optional[List[str]] = None):
+    """Answer a message with the agent in the pool, sharing identical runs"""
+    pool = agent_pool()
     try:
-        return get_result_and_thought_using_graph(agent_movie, movie_graph, message)
+        if service.answers is None:
+            return await pool.run(answer_with_agent, message, fields)
+        result = await service.answers.arun(
+            message,
+            service.movie_graph.version,
+            lambda: pool.run(answer_with_agent, message),
+        )
+        return project(result, fields)
+    except PoolSaturatedError as e:
+        raise HTTPException(
+            status_code=429, detail=str(e), headers={"Retry-After": "1"}
+        ) from e
+    except QueueTimeoutError as e:
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": "5"}
+        ) from e
     except Exception as e:
         # Log stack trace
         logger.exception(e)
         raise HTTPException(status_code=500, detail=str(e)) from e
+
+
+@router.post("/predict_batch")
+async def get_load_batch(
+    messages: List[str] = Body(...), fields: List[str] = Query(None)
+):
+    """Answer a JSON array of messages, streaming one JSON line per message
+
+    The messages the fast path parses are answered together, the others
+    run concurrently in the agent pool, at most one per worker so that the
+    batch leaves room for other requests. A message that cannot be answered,
+    because the pool is full for example, gets a line with the ``error`` and
+    its HTTP ``status`` instead.
+    """
+    check_fields(fields)
+    check_ready()
+    limit = asyncio.Semaphore(getattr(service.agent_pool, "max_workers", 1))
+
+    async def run(message: str):
+        async with limit:
+            try:
+                return await answer_in_pool(message, fields)
+            except HTTPException as e:
+                return {"error": e.detail, "status": e.status_code}
+
+    async def results():
+        # Repeated messages in the batch are only answered once
+        distinct = list(dict.fromkeys(messages))
+        answers = dict(zip(distinct, answer_fast_batch(distinct, fields)))
+        runs = {
+            message: asyncio.ensure_future(run(message))
+            for message, result in answers.items()
+            if result is None
+        }
+        try:
+            for message in messages:
+                if message in runs:
+                    answers[message] = await runs[message]
+                yield json.dumps(answers[message]) + "\n"
+        finally:
+            # Runs still waiting for a worker once the client is gone are dropped
+            for task in runs.values():
+                task.cancel()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+def format_event(event: str, data: Dict) -> str:
+    """Format a server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.get("/predict_stream")
+async def get_load_stream(message: str = Query(...), fields: List[str] = Query(None)):
+    """Stream the agent steps of a message as server-sent events
+
+    Events are ``action`` and ``observation`` for every agent step, ``movies``
+    with the movie cards as soon as a movie tool observation arrives,
+    ``final`` with the answer and ``result`` with the same payload as
+    /predict. Failures end the stream with an ``error`` event.
+    """
+    check_fields(fields)
+    check_ready()
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def sink(event: str, data: Dict):
+        loop.call_soon_threadsafe(queue.put_nowait, (event, data))
+        if event == "observation" and data.get("tool") in MOVIE_TOOLS:
+            try:
+                # The sink is called during the tool run that made the output
+                movies = get_movies_from_observation(
+                    service.movie_graph,
+                    data["output"],
+                    fields,
+                    results_for(current_tool_run()),
+                )
+            except Exception as e:
+                logger.debug(f"Could not build movie cards: {e}")
+            else:
+                loop.call_soon_threadsafe(
+                    queue.put_nowait, ("movies", {"movies": movies})
+                )
+
+    result = answer_fast(message, fields)
+    if result is not None:
+
+        async def fast_events():
+            stream_first_event.observe(time.perf_counter() - start)
+            yield format_event("movies", {"movies": result["movies"]})
+            yield format_event("final", {"response": result["response"]})
+            yield format_event("result", result)
+
+        return StreamingResponse(fast_events(), media_type="text/event-stream")
+
+    def run_agent():
+        # Imported here, so importing this module does not import langchain
+        from callbacks import stream_steps
+
+        try:
+            with stream_steps(sink):
+                result = answer_with_agent(message, fields)
+            sink("result", result)
+        except Exception as e:
+            # Log stack trace
+            logger.exception(e)
+            sink("error", {"detail": str(e)})
+
+    def finish(future: asyncio.Future):
+        # Runs on the loop after every event queued by the worker
+        if not future.cancelled() and future.exception() is not None:
+            queue.put_nowait(("error", {"detail": str(future.exception())}))
+        queue.put_nowait(None)
+
+    pool = agent_pool()
+    try:
+        future = pool.submit(run_agent)
+    except PoolSaturatedError as e:
+        raise HTTPException(
+            status_code=429, detail=str(e), headers={"Retry-After": "1"}
+        ) from e
+    future.add_done_callback(finish)
+
+    async def events():
+        first = True
+        while (item := await queue.get()) is not None:
+            if first:
+                stream_first_event.observe(time.perf_counter() - start)
+                first = False
+            yield format_event(*item)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@router.get("/autocomplete")
+def get_autocomplete(
+    q: str = Query(...),
+    limit: int = Query(10, ge=1, le=50),
+    type: List[str] = Query(None),
+):
+    """Suggest titles, actors and directors for a partial or misspelled name"""
+    check_ready()
+    return service.movie_graph.names.complete(q, limit=limit, types=type)
+
+
+@router.get("/metrics")
+def get_metrics():
+    """Expose the metrics in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/healthz")
+def get_health():
+    """Report that the process is up, even while the service is loading"""
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+def get_ready():
+    """Report whether the service can answer, with 503 until it can
+
+    The service is ready once the database and the agent are loaded. It is
+    degraded, and still ready, when only the agent failed: the fast path
+    and /autocomplete answer, messages needing the agent get a 503.
+    """
+    parts = {part: service.status(part) for part in PARTS}
+    content: Dict = {"status": "ready", **parts, "timings": service.timings}
+    if service.errors:
+        content["errors"] = {part: str(e) for part, e in service.errors.items()}
+    if parts["database"] != "ready":
+        content["status"] = parts["database"]
+    elif parts["agent"] != "ready":
+        content["status"] = "degraded" if parts["agent"] == "failed" else "starting"
+    if content["status"] in ("ready", "degraded"):
+        return content
+    return JSONResponse(content, status_code=503, headers={"Retry-After": "5"})
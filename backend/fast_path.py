@@ -0,0 +1,310 @@
+import heapq
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from overlay import push_layer
+from run import get_attributes_from_node
+from traversal import PERSON_EDGES, PERSON_TYPES, neighbors
+
+# Words that may surround the entities of a structured question
+FILLER_WORDS = {
+    "a", "all", "an", "and", "any", "are", "by", "directed", "director",
+    "directors", "featuring", "film", "films", "find", "from", "give", "i",
+    "in", "list", "made", "me", "movie", "movies", "of", "please", "released",
+    "show", "some", "starring", "the", "to", "want", "what", "which", "with",
+    "year", "actor", "actress", "acted", "genre", "there", "can", "you", "get",
+    "is", "was", "were", "that", "options", "title", "titles", "watch",
+}  # fmt: skip
+DIRECTOR_CUES = {"by", "directed", "director", "directors"}
+ACTOR_CUES = {"with", "starring", "featuring", "actor", "actress", "acted"}
+YEAR_PATTERN = re.compile(r"\b(1[89]\d\d|20\d\d)\b")
+WORD_PATTERN = re.compile(r"[\w'-]+")
+NAME_TYPES = ("actor", "director", "genre")
+# Edges from a title to the value of each query_movies parameter
+PARAMETER_EDGES = {
+    "director": "title_director_edge",
+    "actor": "title_actor_edge",
+    "genre": "title_genre_edge",
+    "year": "title_year_edge",
+}
+# Words after "what" or "which" asking for an attribute rather than titles
+ATTRIBUTE_WORDS = {"year", "genre", "director", "directors", "actor", "actress"}
+
+
+class AhoCorasick:
+    """Aho-Corasick automaton finding every dictionary key in one pass"""
+
+    def __init__(self, keys: List[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[str]] = [[]]
+        for key in keys:
+            state = 0
+            for char in key:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._output[state].append(key)
+
+        # Breadth-first pass to set the failure links
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, target in self._goto[state].items():
+                queue.append(target)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[target] = self._goto[fail].get(char, 0)
+                if self._fail[target] == target:
+                    self._fail[target] = 0
+                self._output[target] = (
+                    self._output[target] + self._output[self._fail[target]]
+                )
+
+    def find(self, text: str) -> List[Tuple[int, int, str]]:
+        """Get every ``(start, end, key)`` occurrence in the text"""
+        matches, state = [], 0
+        for i, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for key in self._output[state]:
+                matches.append((i + 1 - len(key), i + 1, key))
+        return matches
+
+
+class FastPath:
+    """Answer simple structured questions without calling the LLM
+
+    Actor, director and genre names from the graph are matched with an
+    Aho-Corasick automaton and years with a pattern. A person is a director,
+    an actor or both, from their edges, as their node has a single type. A
+    question is answered locally only when every other word is a known
+    filler word and at most one value is found per ``query_movies``
+    parameter; otherwise ``parse`` returns None and the caller falls back to
+    the agent. The titles linked to every value by the edge of its parameter
+    are then ranked by how many values they are linked to. Names added to the
+    catalog later are matched by small extra automatons.
+    """
+
+    def __init__(self, database):
+        self.database = database
+        self._types: Dict[str, Set[str]] = {}
+        self._names: Dict[str, str] = {}
+        for node, data in database.graph.nodes(data=True):
+            if data["type"] in NAME_TYPES and isinstance(node, str):
+                for alias in self._aliases(node, data["type"]):
+                    self._types.setdefault(alias, set()).update(
+                        self._roles(node, data["type"])
+                    )
+                    self._names[alias] = node
+        self._matcher = AhoCorasick(list(self._types))
+        # Keys of every automaton, and automatons of the keys added since
+        self._keys: Set[str] = set(self._types)
+        self._layers: Tuple[Tuple[List[str], AhoCorasick], ...] = ()
+        database.on_change(self.apply_changes)
+
+    def apply_changes(self, added: Dict, removed: Dict):
+        """Follow the names added to or removed from the catalog"""
+        # Copy on write, so that questions being parsed see one version
+        types, names = dict(self._types), dict(self._names)
+        for node, node_type in removed.items():
+            if node_type in NAME_TYPES and isinstance(node, str):
+                # Both roles of a person go, those left are added back below
+                dropped = set(PERSON_TYPES) if node_type in PERSON_TYPES else set()
+                for alias in self._aliases(node, node_type):
+                    remaining = types.get(alias, set()) - {node_type} - dropped
+                    if remaining:
+                        types[alias] = remaining
+                    else:
+                        types.pop(alias, None)
+
+        # People already in the catalog may direct one of the added titles
+        graph = self.database.graph
+        changed = dict(added)
+        for node, node_type in added.items():
+            if node_type == "title" and node in graph:
+                for person in neighbors(graph, node, PERSON_EDGES):
+                    if isinstance(person, str):
+                        changed.setdefault(person, graph.nodes[person]["type"])
+
+        new_keys = []
+        for node, node_type in changed.items():
+            if node_type in NAME_TYPES and isinstance(node, str) and node in graph:
+                for alias in self._aliases(node, node_type):
+                    types[alias] = types.get(alias, set()) | self._roles(
+                        node, node_type
+                    )
+                    names[alias] = node
+                    if alias not in self._keys:
+                        self._keys.add(alias)
+                        new_keys.append(alias)
+        if new_keys:
+            self._layers = push_layer(
+                self._layers,
+                (new_keys, AhoCorasick(new_keys)),
+                size=lambda layer: len(layer[0]),
+                merge=lambda a, b: (a[0] + b[0], AhoCorasick(a[0] + b[0])),
+            )
+        self._types, self._names = types, names
+
+    def _roles(self, node: str, node_type: str) -> Set[str]:
+        if node_type not in PERSON_TYPES:
+            return {node_type}
+        graph = self.database.graph
+        return {
+            role
+            for role, edge_type in zip(PERSON_TYPES, PERSON_EDGES)
+            if neighbors(graph, node, (edge_type,))
+        } or {node_type}
+
+    @staticmethod
+    def _aliases(name: str, node_type: str) -> List[str]:
+        key = name.lower()
+        if node_type != "genre":
+            return [key]
+        # Plural genres, such as "dramas" or "comedies"
+        plural = key[:-1] + "ies" if key.endswith("y") else key + "s"
+        return [key, plural]
+
+    def parse(self, question: str) -> Optional[Dict]:
+        """Get the query_movies parameters of a question, if confidently parsed"""
+        text = question.lower()
+        types, names = self._types, self._names
+
+        # Whole-word dictionary matches, longest first, without overlaps
+        found = self._matcher.find(text)
+        for _, matcher in self._layers:
+            found += matcher.find(text)
+        matches = [
+            (start, end, key)
+            for start, end, key in found
+            if key in types
+            and (start == 0 or not text[start - 1].isalnum())
+            and (end == len(text) or not text[end].isalnum())
+        ]
+        matches.sort(key=lambda m: (-(m[1] - m[0]), m[0]))
+        spans: List[Tuple[int, int, str]] = []
+        for match in matches:
+            if all(match[1] <= s[0] or match[0] >= s[1] for s in spans):
+                spans.append(match)
+        spans += [(m.start(), m.end(), m.group()) for m in YEAR_PATTERN.finditer(text)]
+        spans.sort()
+        if not spans:
+            return None
+
+        params: Dict = {}
+        field: Optional[str]
+        value: Union[int, str]
+        for start, end, key in spans:
+            if YEAR_PATTERN.fullmatch(key):
+                field, value = "year", int(key)
+            else:
+                field = self._resolve_type(types[key], text[:start])
+                if field is None:
+                    return None
+                value = names[key]
+            if field in params:
+                return None
+            params[field] = value
+
+        # Everything outside the entities must be filler
+        rest = text
+        for start, end, _ in reversed(spans):
+            rest = rest[:start] + " " + rest[end:]
+        words = WORD_PATTERN.findall(rest)
+        if any(word not in FILLER_WORDS for word in words):
+            return None
+        # Such as "what year was ... released", which asks for an attribute
+        for word, following in zip(words, words[1:]):
+            if word in ("what", "which") and following in ATTRIBUTE_WORDS:
+                return None
+        return params
+
+    @staticmethod
+    def _resolve_type(types: Set[str], before: str) -> Optional[str]:
+        # The cue words before a person's name pick their role, such as the
+        # "directed by" of a director who also acts
+        if types & set(PERSON_TYPES):
+            cues = set(WORD_PATTERN.findall(before)[-3:])
+            if cues & DIRECTOR_CUES and not cues & ACTOR_CUES:
+                types = types & {"director"}
+            elif cues & ACTOR_CUES and not cues & DIRECTOR_CUES:
+                types = types & {"actor"}
+        return next(iter(types)) if len(types) == 1 else None
+
+    def titles(self, params: Dict, k: int = 5) -> List[Tuple[str, float]]:
+        """Get the ``k`` titles linked to the most parameter values
+
+        Each value only counts through the edge of its parameter, so a
+        director's name is not matched by the titles they act in. As in
+        ``query_movies``, only the titles matching every value are kept when
+        there are any. Ties go to the best rated titles.
+        """
+        graph = self.database.graph
+        counts: Dict[str, int] = {}
+        for field, value in params.items():
+            if value in graph:
+                for title in neighbors(graph, value, (PARAMETER_EDGES[field],)):
+                    counts[title] = counts.get(title, 0) + 1
+
+        def rank(title: str):
+            rating = graph.nodes[title]["attributes"].get("Rating") or 0
+            return -counts[title], -rating, title
+
+        if len(params) in counts.values():
+            counts = {t: c for t, c in counts.items() if c == len(params)}
+        top = heapq.nsmallest(k, counts, key=rank)
+        return [(title, counts[title] / len(params)) for title in top]
+
+    def answer(
+        self, question: str, fields: Optional[Iterable[str]] = None
+    ) -> Optional[Dict]:
+        """Answer a question locally, in the same format as the agent"""
+        params = self.parse(question)
+        return None if params is None else self._answer(params, fields)
+
+    def answer_batch(
+        self, questions: List[str], fields: Optional[Iterable[str]] = None
+    ) -> List[Optional[Dict]]:
+        """Answer a list of questions locally, looking up each query once
+
+        Questions with the same parameters share their answer, and those that
+        cannot be answered locally get None.
+        """
+        answers: Dict[Tuple, Optional[Dict]] = {}
+        output: List[Optional[Dict]] = []
+        for question in questions:
+            params = self.parse(question)
+            if params is None:
+                output.append(None)
+                continue
+            key = tuple(sorted(params.items()))
+            if key not in answers:
+                answers[key] = self._answer(params, fields)
+            output.append(answers[key])
+        return output
+
+    def _answer(
+        self, params: Dict, fields: Optional[Iterable[str]] = None
+    ) -> Optional[Dict]:
+        scores = self.titles(params)
+        # Partial matches are left to the agent, which may find what was meant
+        if not scores or scores[0][1] < 1:
+            return None
+
+        titles = [title for title, _ in scores]
+        response = f"Here are the movies you asked for: {', '.join(titles)}."
+        return {
+            "movies": [
+                get_attributes_from_node(self.database.graph, title, fields=fields)
+                for title in titles
+            ],
+            "response": response,
+            "thought": f"Answered without the LLM, query parameters: {params}",
+        }
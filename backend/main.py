@@ -1,11 +1,23 @@
+import os
+from contextlib import asynccontextmanager
+
 from endpoints import router as endpoints_router
+from endpoints import service
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load the service in the background while the app serves requests"""
+    service.start()
+    yield
+    service.close()
+
+
 def create_app():
     """Create the FastAPI app and include the router."""
-    app = FastAPI()
+    app = FastAPI(lifespan=lifespan)
 
     origins = [
         "*",
@@ -25,6 +37,12 @@ def create_app():
 
 app = create_app()
 
+# With IMDB_PRELOAD set, the database and langchain load when this module is
+# imported, so a server importing the app before forking its workers shares
+# their pages
+if os.environ.get("IMDB_PRELOAD"):
+    service.preload(langchain=True)
+
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,160 @@
+import bisect
+import threading
+from typing import Dict, List, Optional, Tuple, Union
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_registry: Dict[Tuple, Union["Counter", "Histogram"]] = {}
+_registry_lock = threading.Lock()
+
+
+def _format_labels(labels: Dict[str, str], **extra: str) -> str:
+    pairs = {**labels, **extra}
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in pairs.items()
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Counter:
+    """Thread-safe monotonic counter in the Prometheus format"""
+
+    kind = "counter"
+
+    def __init__(
+        self, name: str, description: str, labels: Optional[Dict[str, str]] = None
+    ):
+        self.name = name
+        self.description = description
+        self.labels = labels or {}
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        """Increase the counter"""
+        with self._lock:
+            self.value += amount
+
+    def samples(self) -> List[Tuple[str, float]]:
+        return [(f"{self.name}{_format_labels(self.labels)}", self.value)]
+
+    def render(self) -> str:
+        return "\n".join(
+            [
+                f"# HELP {self.name} {self.description}",
+                f"# TYPE {self.name} counter",
+            ]
+            + [f"{name} {value}" for name, value in self.samples()]
+        )
+
+
+class Histogram:
+    """Thread-safe cumulative histogram in the Prometheus format"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        buckets=DEFAULT_BUCKETS,
+        labels: Optional[Dict[str, str]] = None,
+    ):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self.labels = labels or {}
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """Record one observation"""
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    def samples(self) -> List[Tuple[str, float]]:
+        """Get the cumulative bucket, sum and count samples"""
+        with self._lock:
+            samples: List[Tuple[str, float]] = []
+            total = 0
+            for bound, count in zip(self.buckets + (float("inf"),), self._counts):
+                total += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                labels = _format_labels(self.labels, le=le)
+                samples.append((f"{self.name}_bucket{labels}", total))
+            labels = _format_labels(self.labels)
+            samples.append((f"{self.name}_sum{labels}", self._sum))
+            samples.append((f"{self.name}_count{labels}", total))
+            return samples
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram",
+        ]
+        lines += [f"{name} {value}" for name, value in self.samples()]
+        return "\n".join(lines)
+
+
+def _key(name: str, labels: Optional[Dict[str, str]]) -> Tuple:
+    return (name,) + tuple(sorted((labels or {}).items()))
+
+
+def counter(
+    name: str, description: str, labels: Optional[Dict[str, str]] = None
+) -> Counter:
+    """Get or register a counter by name and labels"""
+    key = _key(name, labels)
+    with _registry_lock:
+        metric = _registry.get(key)
+        if metric is None:
+            metric = _registry[key] = Counter(name, description, labels)
+        if not isinstance(metric, Counter):
+            raise TypeError(f"{name} is already registered as another metric type")
+        return metric
+
+
+def histogram(
+    name: str,
+    description: str,
+    buckets=DEFAULT_BUCKETS,
+    labels: Optional[Dict[str, str]] = None,
+) -> Histogram:
+    """Get or register a histogram by name and labels"""
+    key = _key(name, labels)
+    with _registry_lock:
+        metric = _registry.get(key)
+        if metric is None:
+            metric = _registry[key] = Histogram(name, description, buckets, labels)
+        if not isinstance(metric, Histogram):
+            raise TypeError(f"{name} is already registered as another metric type")
+        return metric
+
+
+def render() -> str:
+    """Render every registered metric in the Prometheus text format
+
+    Series sharing a name, with different labels, are listed under a single
+    HELP and TYPE header.
+    """
+    with _registry_lock:
+        metrics = list(_registry.values())
+    families: Dict[str, List[Union[Counter, Histogram]]] = {}
+    for metric in metrics:
+        families.setdefault(metric.name, []).append(metric)
+    lines = []
+    for name, series in families.items():
+        lines.append(f"# HELP {name} {series[0].description}")
+        lines.append(f"# TYPE {name} {series[0].kind}")
+        for metric in series:
+            lines += [f"{sample} {value}" for sample, value in metric.samples()]
+    return "\n".join(lines) + "\n"
@@ -1,5 +1,6 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
 
+from cache import TTLCache, canonical_key, normalize_question
 from database import MovieDatabase
 from langchain.chains.base import Chain
 from langchain.chains.llm import LLMChain
@@ -7,6 +8,8 @@ from langchain.llms.base import BaseLLM
 from langchain.prompts.base import BasePromptTemplate
 from langchain.prompts.prompt import PromptTemplate
 from pydantic import BaseModel, Extra
+from results import MovieResult, record_results
+from tracing import span
 
 _PROMPT_TEMPLATE = """
 You are helping to create a query for searching a graph database that finds similar movies based on specified parameters.
@@ -19,6 +22,11 @@ genre (str, optional): The genre of the movie
 director (str, optional): The director of the movie
 actor (str, optional): The actor in the movie
 same_attributes_as (optional): A dictionary of attributes to match the same attributes as another movie (optional)
+similar_to (str, optional): A movie title or a plot description, to find movies with a similar story
+year_range (list, optional): The first and last release years, [first, last], use null for an open end
+min_rating (float, optional): The lowest IMDB rating, from 0 to 10
+max_runtime (int, optional): The longest runtime in minutes
+order_by (str, optional): rating, year or runtime to sort the movies by, with a leading - for descending, such as -rating for the best rated first
 
 Use the following format:
 Question: "Question here"
@@ -35,6 +43,14 @@ Output:
 same_attributes_as:
     director: Eternal Sunshine of the Spotless Mind
 
+Question: "Best rated thrillers after 2000 rated above 8 under two hours?"
+Output:
+genre: Thriller
+year_range: [2001, null]
+min_rating: 8
+max_runtime: 120
+order_by: -rating
+
 Begin!
 
 Question: {question}
@@ -61,6 +77,10 @@ class LLMGraphChain(Chain, BaseModel):
     input_key: str = "question"  #: :meta private:
     output_key: str = "answer"  #: :meta private:
     graph: MovieDatabase
+    question_cache: Optional[TTLCache] = None
+    """Cache from normalized question to the parsed query parameters."""
+    result_cache: Optional[TTLCache] = None
+    """Cache from query parameters and catalog version to the scored movies."""
 
     class Config:
         """Configuration for this pydantic object."""
@@ -84,25 +104,65 @@ class LLMGraphChain(Chain, BaseModel):
         """
         return [self.output_key]
 
-    def _process_llm_result(self, t: str) -> Dict[str, str]:
+    def _process_llm_result(
+        self, t: str, question: Optional[str] = None
+    ) -> Dict[str, str]:
         import yaml
 
         self.callback_manager.on_text("\nQuery:\n", verbose=self.verbose)
         self.callback_manager.on_text(t, color="green", verbose=self.verbose)
         # Convert t to a dictionary
-        t = yaml.safe_load(t)
-        output = self.graph.query_movies(**t)
+        with span("yaml_parse"):
+            params = yaml.safe_load(t)
+        output = self._query_graph(params)
+        # Only parameters that query_movies accepted are kept for the question
+        if self.question_cache is not None and question and isinstance(params, dict):
+            self.question_cache.set(normalize_question(question), params)
+        return output
+
+    def _query_graph(self, params: Dict) -> Dict[str, str]:
+        key = canonical_key(params, self.graph.version)
+        output = None
+        if self.result_cache is not None:
+            output = self.result_cache.get(key)
+        if output is not None:
+            output = [MovieResult(*i) for i in output]
+        else:
+            output = self.graph.query_movies(**params)
+            if self.result_cache is not None:
+                self.result_cache.set(key, output)
         self.callback_manager.on_text("\nAnswer: ", verbose=self.verbose)
-        self.callback_manager.on_text(output, color="yellow", verbose=self.verbose)
-        return {self.output_key: "\n".join([f"{i[0]}: {i[1]}" for i in output])}
+        self.callback_manager.on_text(
+            str([tuple(result) for result in output]),
+            color="yellow",
+            verbose=self.verbose,
+        )
+        # The agent reads text, the request keeps the results themselves
+        return {self.output_key: record_results(output)}
 
     def _call(self, inputs: Dict[str, str]) -> Dict[str, str]:
+        question = inputs[self.input_key]
+        self.callback_manager.on_text(question, verbose=self.verbose)
+
+        # Skip the LLM when the question was already translated
+        if self.question_cache is not None:
+            params = self.question_cache.get(normalize_question(question))
+            if params is not None:
+                import yaml
+
+                self.callback_manager.on_text(
+                    "\nQuery (cached):\n", verbose=self.verbose
+                )
+                self.callback_manager.on_text(
+                    yaml.safe_dump(params), color="green", verbose=self.verbose
+                )
+                return self._query_graph(params)
+
         llm_executor = LLMChain(
             prompt=self.prompt, llm=self.llm, callback_manager=self.callback_manager
         )
-        self.callback_manager.on_text(inputs[self.input_key], verbose=self.verbose)
-        t = llm_executor.predict(question=inputs[self.input_key], stop=["Output:"])
-        return self._process_llm_result(t)
+        t = llm_executor.predict(question=question, stop=["Output:"])
+        return self._process_llm_result(t, question)
 
     @property
     def _chain_type(self) -> str:
@@ -0,0 +1,379 @@
+import copy
+import re
+import unicodedata
+from bisect import bisect_left
+from typing import Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from overlay import push_layer
+
+NAME_TYPES = ("title", "director", "actor")
+
+
+def normalize_name(name: str) -> str:
+    """Case-fold a name and strip its accents and punctuation"""
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w]+", " ", stripped.casefold()).split())
+
+
+def trigrams(key: str) -> List[str]:
+    """Get the trigrams of a key, padded so that short keys have some"""
+    padded = f"  {key} "
+    return [padded[i : i + 3] for i in range(len(padded) - 2)]
+
+
+def bounded_levenshtein(a: str, b: str, limit: int) -> int:
+    """Edit distance between two strings, or ``limit + 1`` once it exceeds limit
+
+    Only the diagonal band of width ``2 * limit + 1`` is computed, since any
+    cell outside of it already costs more than the limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    over = limit + 1
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i, char_a in enumerate(a, 1):
+        low, high = max(1, i - limit), min(len(b), i + limit)
+        current = [over] * (len(b) + 1)
+        current[0] = i if i <= limit else over
+        best = current[0]
+        for j in range(low, high + 1):
+            cost = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != b[j - 1]),
+            )
+            current[j] = cost if cost < over else over
+            if cost < best:
+                best = cost
+        if best > limit:
+            return over
+        previous = current
+    return previous[-1]
+
+
+class NameIndex:
+    """Name resolution index over the title, actor and director nodes
+
+    Keys are normalized with ``normalize_name``. Prefix lookups bisect a
+    sorted list holding every key and every word-start suffix of it, which
+    gives the same results as a trie in a flat, compact structure. Typo
+    tolerant lookups gather candidates from a trigram index and verify them
+    with a bounded edit distance. Candidates are ranked by match quality,
+    then by the number of titles linked to the node.
+
+    Catalog changes are applied with ``updated``, which indexes the added
+    names in small layers searched along with the build and hides the
+    removed ones, without modifying the current version.
+    """
+
+    # Upper bound on the edit distances computed per fuzzy lookup
+    max_verified = 50
+    # Prefix spans longer than this are walked in rank order, not scanned
+    max_scanned = 1024
+
+    def __init__(self, graph, types: Iterable[str] = NAME_TYPES):
+        self.node_types = set(types)
+        self._build(
+            (node, data["type"], graph.degree(node))
+            for node, data in graph.nodes(data=True)
+            if data["type"] in self.node_types and isinstance(node, str)
+        )
+
+    @classmethod
+    def from_nodes(
+        cls, nodes: Iterable[Tuple[str, str, int]], types: Iterable[str] = NAME_TYPES
+    ) -> "NameIndex":
+        """Index names given with their node type and popularity"""
+        index = cls.__new__(cls)
+        index.node_types = set(types)
+        index._build(nodes)
+        return index
+
+    def _build(self, nodes: Iterable[Tuple[str, str, int]]):
+        self.names: List[str] = []
+        self.types: List[str] = []
+        self.keys: List[str] = []
+        self.popularity: List[int] = []
+        self._exact: Dict[str, List[int]] = {}
+        trigram_ids: Dict[str, List[int]] = {}
+        entries: List[Tuple[str, int]] = []
+
+        for node, node_type, popularity in nodes:
+            key = normalize_name(node)
+            if not key:
+                continue
+            node_id = len(self.names)
+            self.names.append(node)
+            self.types.append(node_type)
+            self.keys.append(key)
+            self.popularity.append(popularity)
+            self._exact.setdefault(key, []).append(node_id)
+            for gram in set(trigrams(key)):
+                trigram_ids.setdefault(gram, []).append(node_id)
+
+            # The full key and the suffixes starting at each later word
+            entries.append((key, node_id))
+            for match in re.finditer(r" ", key):
+                entries.append((key[match.end() :], node_id))
+
+        self._trigrams = {
+            gram: np.array(ids, dtype=np.int32) for gram, ids in trigram_ids.items()
+        }
+        self._words = [tuple(key.split()) for key in self.keys]
+        self._type_array = np.array(self.types)
+        self._lengths = np.array([len(key) for key in self.keys], dtype=np.int32)
+
+        entries.sort()
+        self._prefix_keys = [entry for entry, _ in entries]
+        self._prefix_ids = [node_id for _, node_id in entries]
+
+        # Static rank of every entry: names starting with it, then popularity
+        order = sorted(
+            range(len(entries)),
+            key=lambda i: (len(entries[i][0]) != len(self.keys[entries[i][1]]),)
+            + self._rank(entries[i][1], 0)[1:],
+        )
+        self._entry_ranks = np.empty(len(entries), dtype=np.int32)
+        self._entry_ranks[order] = np.arange(len(entries), dtype=np.int32)
+
+        # Layers of added names and IDs of the removed ones, see ``updated``
+        self._layers: Tuple[NameIndex, ...] = ()
+        self._removed: FrozenSet[int] = frozenset()
+
+    @property
+    def overlay_size(self) -> int:
+        """Number of names added or removed since the build"""
+        return sum(len(layer.names) for layer in self._layers) + len(self._removed)
+
+    def updated(
+        self, graph, added: Dict[str, str], removed: Iterable[str]
+    ) -> "NameIndex":
+        """Get a new version with names added and removed
+
+        ``added`` maps the new nodes of the graph to their type. The work is
+        proportional to the changes; the popularity of the names already
+        indexed is only refreshed by a rebuild.
+        """
+        removed = [node for node in removed if isinstance(node, str)]
+        index = copy.copy(self)
+        index._removed = self._removed | self._ids(removed)
+        layers = tuple(layer._without(removed) for layer in self._layers)
+        nodes = [
+            (node, node_type, graph.degree(node))
+            for node, node_type in added.items()
+            if node_type in self.node_types and isinstance(node, str)
+        ]
+        if nodes:
+            layers = push_layer(
+                layers,
+                NameIndex.from_nodes(nodes, self.node_types),
+                size=lambda layer: len(layer.names),
+                merge=lambda a, b: NameIndex.from_nodes(
+                    a._live_nodes() + b._live_nodes(), self.node_types
+                ),
+            )
+        index._layers = layers
+        return index
+
+    def _ids(self, nodes: Iterable[str]) -> FrozenSet[int]:
+        return frozenset(
+            node_id
+            for node in nodes
+            for node_id in self._exact.get(normalize_name(node), ())
+            if self.names[node_id] == node
+        )
+
+    def _without(self, nodes: Iterable[str]) -> "NameIndex":
+        ids = self._ids(nodes)
+        if not ids:
+            return self
+        index = copy.copy(self)
+        index._removed = self._removed | ids
+        return index
+
+    def _live_nodes(self) -> List[Tuple[str, str, int]]:
+        return [
+            node
+            for node_id, node in enumerate(zip(self.names, self.types, self.popularity))
+            if node_id not in self._removed
+        ]
+
+    def _range(self, prefix: str) -> Tuple[int, int]:
+        """Get the span of the sorted entries starting with a prefix"""
+        return (
+            bisect_left(self._prefix_keys, prefix),
+            bisect_left(self._prefix_keys, prefix + "\U0010ffff"),
+        )
+
+    def _ranked(self, lo: int, hi: int) -> Iterator[int]:
+        """Yield the entry positions of a span in rank order, sorting lazily"""
+        ranks = self._entry_ranks[lo:hi]
+        done, take = 0, 64
+        while done < len(ranks):
+            take = min(take, len(ranks))
+            top = np.argpartition(ranks, take - 1)[:take]
+            top = top[np.argsort(ranks[top])]
+            for i in top[done:].tolist():
+                yield lo + i
+            done, take = take, take * 8
+
+    def _rank(self, node_id: int, quality: int) -> Tuple:
+        return (quality, -self.popularity[node_id], len(self.keys[node_id]))
+
+    def _result(
+        self, search: Callable[["NameIndex"], Dict[int, Tuple]], limit: int
+    ) -> List[Dict]:
+        """Run a search on the build and on the added layers, best first"""
+        found = [
+            (rank, index.names[node_id], index.types[node_id])
+            for index in (self,) + self._layers
+            for node_id, rank in search(index).items()
+        ]
+        found.sort(key=lambda item: item[0])
+        return [
+            {"name": name, "type": node_type, "distance": rank[0]}
+            for rank, name, node_type in found[:limit]
+        ]
+
+    def _allowed(self, node_id: int, types: Optional[Iterable[str]]) -> bool:
+        return node_id not in self._removed and (
+            types is None or self.types[node_id] in types
+        )
+
+    def prefix(
+        self, text: str, limit: int = 10, types: Optional[Iterable[str]] = None
+    ) -> List[Dict]:
+        """Get the names with words starting with the words of the text
+
+        The words must follow each other, so "chris nol" completes
+        "Christopher Nolan". Whole names come first, then names starting
+        with the text, then names matching from a later word.
+        """
+        key = normalize_name(text)
+        if not key:
+            return []
+        return [
+            dict(result, distance=0)
+            for result in self._result(
+                lambda index: index._prefix(key, limit, types), limit
+            )
+        ]
+
+    def _prefix(
+        self, key: str, limit: int, types: Optional[Iterable[str]]
+    ) -> Dict[int, Tuple]:
+        words = key.split()
+
+        ranked: Dict[int, Tuple] = {}
+        for node_id in self._exact.get(key, ()):
+            if self._allowed(node_id, types):
+                ranked[node_id] = self._rank(node_id, 0)
+
+        # Entries starting with the whole text, best first when there are many
+        lo, hi = self._range(key)
+        walk = hi - lo > self.max_scanned
+        for i in self._ranked(lo, hi) if walk else range(lo, hi):
+            node_id = self._prefix_ids[i]
+            if not self._allowed(node_id, types) or walk and node_id in ranked:
+                continue
+            position = len(self._words[node_id]) - 1 - self._prefix_keys[i].count(" ")
+            rank = self._rank(node_id, 1 if position == 0 else 2)
+            if node_id not in ranked or rank < ranked[node_id]:
+                ranked[node_id] = rank
+            # Walked entries come best first, so the first names seen win
+            if walk and len(ranked) >= limit:
+                break
+
+        # Partial words before the last one, such as "chris nol", are matched
+        # word by word from the query word with the fewest entries
+        if len(words) > 1 and len(ranked) < limit:
+            ranges = [self._range(word) for word in words]
+            pivot = min(range(len(words)), key=lambda k: ranges[k][1] - ranges[k][0])
+            lo, hi = ranges[pivot]
+            for i in range(lo, hi) if hi - lo <= self.max_scanned else ():
+                node_id = self._prefix_ids[i]
+                if not self._allowed(node_id, types):
+                    continue
+                name_words = self._words[node_id]
+                first = len(name_words) - 1 - self._prefix_keys[i].count(" ") - pivot
+                if (
+                    first < 0
+                    or first + len(words) > len(name_words)
+                    or not all(
+                        name_words[first + k].startswith(word)
+                        for k, word in enumerate(words)
+                    )
+                ):
+                    continue
+                rank = self._rank(node_id, 1 if first == 0 else 2)
+                if node_id not in ranked or rank < ranked[node_id]:
+                    ranked[node_id] = rank
+        return ranked
+
+    def fuzzy(
+        self,
+        text: str,
+        max_distance: int = 2,
+        limit: int = 10,
+        types: Optional[Iterable[str]] = None,
+    ) -> List[Dict]:
+        """Get the names within an edit distance of the text, closest first"""
+        key = normalize_name(text)
+        # Short names allow fewer edits, so that "nolan" does not match "logan"
+        max_distance = min(max_distance, len(key) // 3)
+        if max_distance == 0:
+            return []
+        return self._result(lambda index: index._fuzzy(key, max_distance, types), limit)
+
+    def _fuzzy(
+        self, key: str, max_distance: int, types: Optional[Iterable[str]]
+    ) -> Dict[int, Tuple]:
+        grams = set(trigrams(key))
+        postings = [self._trigrams[gram] for gram in grams if gram in self._trigrams]
+        if not postings:
+            return {}
+        shared = np.bincount(np.concatenate(postings), minlength=len(self.keys))
+
+        # Each edit changes at most three of the distinct padded trigrams
+        required = max(1, len(grams) - 3 * max_distance)
+        mask = (shared >= required) & (np.abs(self._lengths - len(key)) <= max_distance)
+        if types is not None:
+            mask &= np.isin(self._type_array, list(types))
+        candidates = np.flatnonzero(mask)
+        # Verify the candidates sharing the most trigrams first
+        candidates = candidates[np.argsort(-shared[candidates], kind="stable")]
+
+        ranked: Dict[int, Tuple] = {}
+        for node_id in candidates[: self.max_verified].tolist():
+            if node_id in self._removed:
+                continue
+            distance = bounded_levenshtein(key, self.keys[node_id], max_distance)
+            if distance <= max_distance:
+                ranked[node_id] = self._rank(node_id, distance)
+        return ranked
+
+    def complete(
+        self, text: str, limit: int = 10, types: Optional[Iterable[str]] = None
+    ) -> List[Dict]:
+        """Autocomplete a partial name, falling back to typo tolerant matches"""
+        results = self.prefix(text, limit, types)
+        if len(results) < limit:
+            seen = {(result["name"], result["type"]) for result in results}
+            for result in self.fuzzy(text, limit=limit, types=types):
+                if (result["name"], result["type"]) not in seen:
+                    results.append(result)
+        return results[:limit]
+
+    def resolve(
+        self, text: str, types: Optional[Iterable[str]] = None, max_distance: int = 2
+    ) -> Optional[str]:
+        """Get the node name a user-supplied name refers to, if any"""
+        key = normalize_name(text)
+        for index in (self,) + self._layers:
+            for node_id in index._exact.get(key, ()):
+                if index._allowed(node_id, types):
+                    return index.names[node_id]
+        matches = self.fuzzy(text, max_distance=max_distance, limit=1, types=types)
+        return matches[0]["name"] if matches else None
@@ -0,0 +1,272 @@
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from attribute_index import AttributeIndex
+from compact_graph import NODE_TYPES, CompactGraph
+
+# Numeric columns of the titles, with the attribute holding them. The year
+# is read from the year neighbor instead.
+ATTRIBUTES = {"rating": "Rating", "runtime": "Runtime"}
+COLUMNS = ("year", *ATTRIBUTES)
+# Parameters of query_movies read by the numeric index
+FILTERS = ("year_range", "min_rating", "max_runtime", "order_by")
+
+Ranges = Dict[str, Tuple[float, float]]
+
+
+def _number(value) -> float:
+    if isinstance(value, bool):
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def title_values(graph, title) -> Dict[str, float]:
+    """Read the numeric columns of a title node, NaN when missing"""
+    attributes = graph.nodes[title]["attributes"]
+    values = {
+        column: _number(attributes.get(name)) for column, name in ATTRIBUTES.items()
+    }
+    values["year"] = math.nan
+    for neighbor, edge in graph[title].items():
+        if edge["type"] == "title_year_edge":
+            values["year"] = _number(neighbor)
+    return values
+
+
+def numeric_ranges(year_range=None, min_rating=None, max_runtime=None) -> Ranges:
+    """Get the inclusive ``(low, high)`` range of every filtered column
+
+    ``year_range`` is a ``[first, last]`` pair, either end may be None.
+    """
+    ranges = {}
+    if year_range is not None:
+        if isinstance(year_range, (int, float)):
+            year_range = (year_range, year_range)
+        if not isinstance(year_range, (list, tuple)) or len(year_range) != 2:
+            raise ValueError(f"year_range must be [first, last], got {year_range!r}")
+        first, last = year_range
+        ranges["year"] = (
+            -math.inf if first is None else _checked(first, "year_range"),
+            math.inf if last is None else _checked(last, "year_range"),
+        )
+    if min_rating is not None:
+        ranges["rating"] = (_checked(min_rating, "min_rating"), math.inf)
+    if max_runtime is not None:
+        ranges["runtime"] = (-math.inf, _checked(max_runtime, "max_runtime"))
+    return ranges
+
+
+def _checked(value, name: str) -> float:
+    number = _number(value)
+    if math.isnan(number):
+        raise ValueError(f"{name} must be a number, got {value!r}")
+    return number
+
+
+def parse_order(order_by: Optional[str]) -> Optional[Tuple[str, bool]]:
+    """Get the column and the descending flag of ``rating`` or ``-rating``"""
+    if order_by is None:
+        return None
+    text = str(order_by).strip().lower()
+    column = text.lstrip("-")
+    if column not in COLUMNS:
+        raise ValueError(
+            f"Unknown order_by {order_by!r}, expected one of {COLUMNS}, "
+            "with a leading - for descending"
+        )
+    return column, text.startswith("-")
+
+
+class NumericIndex:
+    """Sorted numeric columns of the titles, for range filters and ordering
+
+    For every column, the positions of the titles are kept sorted by value,
+    missing values last, so the titles within a range are one slice found
+    by binary search, and the first titles in the order of a column are
+    read from its start without looking at the others. ``values`` holds
+    the values by position, to check the other ranges of a query.
+
+    Like RelatedTitles, it belongs to one version of the attribute index.
+    Added titles are inserted in the sorted columns and removed titles are
+    skipped, until the index is rebuilt.
+    """
+
+    def __init__(self, index: AttributeIndex, values: Dict[str, np.ndarray]):
+        self.index = index
+        self.values = values
+        self._removed = np.array(sorted(index.removed), dtype=np.int64)
+        # Positions and sort keys by column and direction, built on first use
+        self._sorted: Dict[Tuple[str, bool], Tuple[np.ndarray, np.ndarray]] = {}
+
+    @classmethod
+    def build(cls, graph, index: AttributeIndex) -> "NumericIndex":
+        """Read the numeric columns of every title of the index"""
+        if isinstance(graph, CompactGraph) and not index.overlay_size:
+            # Without changes, the titles are the title nodes in graph order
+            title_ids = np.flatnonzero(graph.node_type == NODE_TYPES.index("title"))
+            return cls(index, cls._compact_values(graph, title_ids))
+        return cls(index, cls._graph_values(graph, index, range(len(index.titles))))
+
+    @staticmethod
+    def _graph_values(
+        graph, index: AttributeIndex, positions: Iterable[int]
+    ) -> Dict[str, np.ndarray]:
+        rows = []
+        for position in positions:
+            title = index.titles[position]
+            if position in index.removed or title not in graph:
+                rows.append(dict.fromkeys(COLUMNS, math.nan))
+            else:
+                rows.append(title_values(graph, title))
+        return {
+            column: np.array([row[column] for row in rows], dtype=np.float64)
+            for column in COLUMNS
+        }
+
+    @staticmethod
+    def _compact_values(
+        graph: CompactGraph, title_ids: np.ndarray
+    ) -> Dict[str, np.ndarray]:
+        values = {}
+        rows = graph.row[title_ids]
+        for column, name in ATTRIBUTES.items():
+            data = graph.columns.get(name)
+            if isinstance(data, np.ndarray) and data.dtype.kind in "iuf":
+                values[column] = data[rows].astype(np.float64)
+            else:
+                values[column] = np.full(len(title_ids), math.nan)
+
+        # The last year neighbor of every title, like title_values, years are few
+        indptr = graph.indptr["title_year_edge"]
+        ends = indptr[title_ids + 1]
+        linked = ends > indptr[title_ids]
+        nodes, inverse = np.unique(
+            graph.indices["title_year_edge"][ends[linked] - 1], return_inverse=True
+        )
+        years = np.array([_number(graph.key(i)) for i in nodes.tolist()])
+        values["year"] = np.full(len(title_ids), math.nan)
+        values["year"][linked] = years[inverse]
+        return values
+
+    def updated(self, graph, index: AttributeIndex) -> "NumericIndex":
+        """Get the version for an updated attribute index
+
+        Titles added since this version are inserted in the sorted columns,
+        in time proportional to the catalog but without sorting it again.
+        A rebuilt attribute index moves the titles, so the columns are read
+        again.
+        """
+        if not index.follows(self.index):
+            return NumericIndex.build(graph, index)
+        size = len(self.values[COLUMNS[0]])
+        added = self._graph_values(graph, index, range(size, len(index.titles)))
+        numeric = NumericIndex(
+            index,
+            {c: np.concatenate([self.values[c], added[c]]) for c in COLUMNS},
+        )
+        new_positions = np.arange(size, len(index.titles))
+        for (column, descending), (positions, keys) in list(self._sorted.items()):
+            new_keys = -added[column] if descending else added[column]
+            order = np.argsort(new_keys, kind="stable")
+            # Equal keys keep the earlier positions first
+            at = np.searchsorted(keys, new_keys[order], side="right")
+            numeric._sorted[column, descending] = (
+                np.insert(positions, at, new_positions[order]),
+                np.insert(keys, at, new_keys[order]),
+            )
+        return numeric
+
+    def sorted_column(
+        self, column: str, descending: bool = False
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the positions sorted by a column, and their ascending sort keys
+
+        Keys are the values, negated when ``descending``. Ties keep the
+        catalog order and missing values come last either way.
+        """
+        entry = self._sorted.get((column, descending))
+        if entry is None:
+            keys = -self.values[column] if descending else self.values[column]
+            positions = np.argsort(keys, kind="stable")
+            entry = self._sorted[column, descending] = (positions, keys[positions])
+        return entry
+
+    def _slice(self, column: str, low: float, high: float, descending: bool = False):
+        _, keys = self.sorted_column(column, descending)
+        if descending:
+            low, high = -high, -low
+        # Binary search of both bounds, missing values sort past any bound
+        return (
+            int(np.searchsorted(keys, low, side="left")),
+            int(np.searchsorted(keys, high, side="right")),
+        )
+
+    def within(self, positions: np.ndarray, ranges: Ranges) -> np.ndarray:
+        """Mask the live titles of ``positions`` within all the ranges"""
+        mask = np.ones(len(positions), dtype=bool)
+        for column, (low, high) in ranges.items():
+            values = self.values[column][positions]
+            mask &= (values >= low) & (values <= high)
+        if len(self._removed):
+            mask &= ~np.isin(positions, self._removed)
+        return mask
+
+    def select(self, ranges: Ranges) -> np.ndarray:
+        """Get the sorted positions of the live titles within all the ranges
+
+        The narrowest range is read from its sorted column, the titles in it
+        are then checked against the others.
+        """
+        slices = {
+            column: self._slice(column, *bounds) for column, bounds in ranges.items()
+        }
+        column = min(slices, key=lambda c: slices[c][1] - slices[c][0])
+        start, end = slices[column]
+        positions = self.sorted_column(column)[0][start:end]
+        return np.sort(positions[self.within(positions, ranges)])
+
+    def top(self, column: str, descending: bool, ranges: Ranges, k: int) -> List[int]:
+        """Get the first k live positions within the ranges, ordered by a column
+
+        The sorted column is read in growing chunks from its start, or from
+        its range, until k titles passed the other ranges.
+        """
+        positions = self.sorted_column(column, descending)[0]
+        if column in ranges:
+            start, end = self._slice(column, *ranges[column], descending)
+        else:
+            start, end = 0, len(positions)
+        found: List[int] = []
+        chunk = max(k, 64)
+        while start < end and len(found) < k:
+            batch = positions[start : min(start + chunk, end)]
+            found.extend(batch[self.within(batch, ranges)][: k - len(found)].tolist())
+            start += chunk
+            chunk *= 2
+        return found
+
+    def rank(
+        self,
+        positions: np.ndarray,
+        counts: np.ndarray,
+        order: Optional[Tuple[str, bool]],
+        k: int,
+    ) -> List[Tuple[int, int]]:
+        """Get the k ``(position, count)`` pairs with the highest counts
+
+        Ties are broken by the order, then by position.
+        """
+        keys = [positions]
+        if order is not None:
+            column, descending = order
+            values = self.values[column][positions]
+            values = -values if descending else values
+            # Missing values come last
+            keys.append(np.where(np.isnan(values), np.inf, values))
+        keys.append(-counts)
+        top = np.lexsort(keys)[:k]
+        return list(zip(positions[top].tolist(), counts[top].tolist()))
@@ -0,0 +1,21 @@
+from typing import Callable, Tuple, TypeVar
+
+Layer = TypeVar("Layer")
+
+
+def push_layer(
+    layers: Tuple[Layer, ...],
+    layer: Layer,
+    size: Callable[[Layer], int],
+    merge: Callable[[Layer, Layer], Layer],
+) -> Tuple[Layer, ...]:
+    """Append a layer of changes, merging the newest layers of similar size
+
+    Layers are merged like the digits of a binary counter, so every change is
+    merged a logarithmic number of times and searches visit few layers.
+    """
+    stack = list(layers) + [layer]
+    while len(stack) > 1 and size(stack[-2]) <= 2 * size(stack[-1]):
+        last = stack.pop()
+        stack[-1] = merge(stack[-1], last)
+    return tuple(stack)
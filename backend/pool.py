@@ -0,0 +1,94 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+
+class PoolSaturatedError(Exception):
+    """Raised when the pool has no free worker and its queue is full"""
+
+
+class QueueTimeoutError(Exception):
+    """Raised when a job waited in the queue for longer than allowed"""
+
+
+class AgentPool:
+    """Bounded thread pool with admission control for blocking agent runs
+
+    At most ``max_workers`` jobs run at once and at most ``max_queue`` more
+    wait for a worker. Further submissions are rejected right away with
+    ``PoolSaturatedError``, and a queued job that waited more than
+    ``queue_timeout`` seconds is dropped with ``QueueTimeoutError`` before it
+    starts.
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 16, queue_timeout=30.0):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="agent")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.completed = 0
+
+    def _run(self, submitted: float, func: Callable, *args: Any) -> Any:
+        if self.queue_timeout is not None:
+            if time.monotonic() - submitted > self.queue_timeout:
+                with self._lock:
+                    self.timed_out += 1
+                raise QueueTimeoutError("Request waited too long for a worker")
+        with self._lock:
+            self._running += 1
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self.completed += 1
+
+    def submit(self, func: Callable, *args: Any) -> asyncio.Future:
+        """Admit a blocking function into the pool and return its future
+
+        Admission happens right away, so ``PoolSaturatedError`` is raised
+        before the caller commits to a response.
+        """
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise PoolSaturatedError("Too many requests in progress")
+            self._pending += 1
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        future = loop.run_in_executor(
+            self._executor, context.run, self._run, time.monotonic(), func, *args
+        )
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future: asyncio.Future):
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, func: Callable, *args: Any) -> Any:
+        """Run a blocking function in the pool without blocking the event loop"""
+        return await self.submit(func, *args)
+
+    def stats(self) -> Dict[str, int]:
+        """Get the pool occupancy and counters"""
+        with self._lock:
+            return {
+                "running": self._running,
+                "queued": self._pending - self._running,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "completed": self.completed,
+            }
+
+    def close(self):
+        """Stop accepting jobs and wait for the running ones"""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,290 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from attribute_index import AttributeIndex
+
+# Padding of rows that lost titles, and may miss some past their end
+TRUNCATED = -2
+
+# Relations between titles, with the edges of the attributes they share.
+# The "title" relation shares all of them, in the order query_movies reads.
+RELATIONS = {
+    "title": (
+        "title_year_edge",
+        "title_genre_edge",
+        "title_director_edge",
+        "title_actor_edge",
+    ),
+    "year": ("title_year_edge",),
+    "genre": ("title_genre_edge",),
+    "director": ("title_director_edge",),
+    "actor": ("title_actor_edge",),
+}
+EDGES = RELATIONS["title"]
+
+# Keys of same_attributes_as, as they are worded in questions
+RELATION_KEYS = {
+    "title": "title",
+    "all": "title",
+    "year": "year",
+    "years": "year",
+    "genre": "genre",
+    "genres": "genre",
+    "director": "director",
+    "directors": "director",
+    "actor": "actor",
+    "actors": "actor",
+    "cast": "actor",
+    "star": "actor",
+    "stars": "actor",
+}
+
+
+def relation_of(key) -> str:
+    """Get the relation of a same_attributes_as key"""
+    relation = RELATION_KEYS.get(str(key).strip().lower())
+    if relation is None:
+        raise ValueError(
+            f"Unknown same_attributes_as key {key!r}, expected one of "
+            f"{sorted(RELATION_KEYS)}"
+        )
+    return relation
+
+
+def relation_attributes(graph, title, relation: str) -> List:
+    """Get the attributes of a title along the edges of a relation"""
+    neighbors = graph[title].items()
+    return [
+        neighbor
+        for edge_type in RELATIONS[relation]
+        for neighbor, edge_attrs in neighbors
+        if edge_attrs["type"] == edge_type
+    ]
+
+
+class RelatedTitles:
+    """Top related titles of every title, for every relation
+
+    Row ``p`` of a relation holds the positions and the match counts of the
+    ``k`` other titles that ``top_titles`` ranks first for the attributes
+    title ``p`` has in that relation, padded with -1. The rows are computed with
+    the scoring of the database, so a lookup gives the answer of the query,
+    and belong to one version of the attribute index.
+
+    Removing a title from a row keeps the other titles in order, so the row
+    stays exact but may miss titles past its end. Such a row is padded with
+    -2 instead, and is computed again once half of it is gone.
+    """
+
+    def __init__(
+        self,
+        index: AttributeIndex,
+        titles: Dict[str, np.ndarray],
+        counts: Dict[str, np.ndarray],
+    ):
+        self.index = index
+        self.titles = titles
+        self.counts = counts
+        self.k = titles["title"].shape[1]
+
+        # Titles having an attribute word, built on the first update
+        self._tokens: Optional[Dict] = None
+
+    @classmethod
+    def empty(cls, index: AttributeIndex, k: int) -> "RelatedTitles":
+        size = len(index.titles)
+        return cls(
+            index,
+            {r: np.full((size, k), -1, dtype=np.int32) for r in RELATIONS},
+            {r: np.zeros((size, k), dtype=np.uint16) for r in RELATIONS},
+        )
+
+    @classmethod
+    def build(cls, database, k: int = 10) -> "RelatedTitles":
+        """Run the query of every title and relation on the current index"""
+        index = database.index
+        related = cls.empty(index, k)
+        for position in index.live_positions().tolist():
+            related._score_row(database, position)
+        return related
+
+    def _score_row(self, database, position: int):
+        title = self.index.titles[position]
+        for relation in RELATIONS:
+            attributes = relation_attributes(database.graph, title, relation)
+            top = database.top_titles(self.index, attributes, self.k, {position})
+            self.titles[relation][position] = -1
+            self.counts[relation][position] = 0
+            for i, (related, count) in enumerate(top):
+                self.titles[relation][position, i] = related
+                self.counts[relation][position, i] = count
+
+    def lookup(
+        self, index: AttributeIndex, position: int, relation: str, k: int
+    ) -> Optional[List[Tuple[int, int]]]:
+        """Get the first k ``(position, count)`` pairs of a row
+
+        Returns None when the table was computed for another index version,
+        or when the row holds less than k titles and was truncated.
+        """
+        if index is not self.index or k > self.k:
+            return None
+        row = self.titles[relation][position, :k]
+        kept = row >= 0
+        if not kept.all() and self.titles[relation][position, -1] == TRUNCATED:
+            return None
+        counts = self.counts[relation][position, :k]
+        return list(zip(row[kept].tolist(), counts[kept].tolist()))
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """Get the table as named arrays, to store it in a snapshot"""
+        arrays = {}
+        for relation in RELATIONS:
+            arrays[f"related.{relation}.others"] = self.titles[relation]
+            arrays[f"related.{relation}.counts"] = self.counts[relation]
+        return arrays
+
+    @classmethod
+    def from_arrays(
+        cls, index: AttributeIndex, arrays: Dict[str, np.ndarray]
+    ) -> Optional["RelatedTitles"]:
+        """Read a table stored by ``arrays``, or None if it is missing
+
+        Tables stored with rows holding their own title are not read.
+        """
+        if any(f"related.{r}.others" not in arrays for r in RELATIONS):
+            return None
+        return cls(
+            index,
+            {r: arrays[f"related.{r}.others"] for r in RELATIONS},
+            {r: arrays[f"related.{r}.counts"] for r in RELATIONS},
+        )
+
+    def updated(self, database, added: Iterable[str]) -> "RelatedTitles":
+        """Get the table of the current index of a database after an update
+
+        The ``added`` titles are the ones added or replaced by the update.
+        Rows are renumbered if the index was rebuilt, removed titles are
+        dropped from the rows, rows of added titles are computed, and added
+        titles are inserted in the other rows they enter. Added titles come
+        after all others, so they enter a row after the titles of the same
+        count. The current table is not modified.
+        """
+        index, graph = database.index, database.graph
+        mapping = self._mapping(index, set(added))
+        related = RelatedTitles.empty(index, self.k)
+
+        # Move the rows of the titles kept by the update to their position
+        kept = np.flatnonzero(mapping >= 0)
+        stale: Set[int] = set()
+        for relation in RELATIONS:
+            rows = self.titles[relation][kept]
+            moved = np.where(rows >= 0, mapping[rows], rows)
+            counts = np.where(moved >= 0, self.counts[relation][kept], 0)
+            for i in np.flatnonzero(np.any((rows >= 0) & (moved < 0), axis=1)):
+                remaining = moved[i] >= 0
+                size = int(np.count_nonzero(remaining))
+                padding = -1 if rows[i, -1] == -1 else TRUNCATED
+                moved[i, :size], moved[i, size:] = moved[i, remaining], padding
+                counts[i, :size], counts[i, size:] = counts[i, remaining], 0
+                if padding == TRUNCATED and size < self.k // 2:
+                    stale.add(int(mapping[kept[i]]))
+            related.titles[relation][mapping[kept]] = moved
+            related.counts[relation][mapping[kept]] = counts
+
+        new = sorted(index.position(title) for title in added)
+        if index.follows(self.index) and self._tokens is not None:
+            related._tokens = self._tokens
+        else:
+            related._build_tokens(graph)
+        for position in new:
+            related._add_tokens(graph, position)
+
+        for position in new:
+            related._insert(graph, position, skip=stale.union(new))
+        for position in sorted(stale.union(new)):
+            related._score_row(database, position)
+        return related
+
+    def _mapping(self, index: AttributeIndex, added: Set[str]) -> np.ndarray:
+        """Map the positions of the kept titles to their new position, else -1"""
+        mapping = np.full(len(self.index.titles), -1, dtype=np.int32)
+        live = self.index.live_positions()
+        if index.follows(self.index):
+            live = live[~np.isin(live, list(index.removed))]
+            mapping[live] = live
+            return mapping
+        for position in live.tolist():
+            title = self.index.titles[position]
+            if title in added:
+                continue
+            try:
+                mapping[position] = index.position(title)
+            except KeyError:
+                pass
+        return mapping
+
+    def _build_tokens(self, graph):
+        self._tokens = defaultdict(set)
+        for position in self.index.live_positions().tolist():
+            self._add_tokens(graph, position)
+
+    def _add_tokens(self, graph, position: int):
+        """Index the attributes of a title by their words, and years by value"""
+        assert self._tokens is not None
+        for attribute, edge_attrs in graph[self.index.titles[position]].items():
+            entry = (position, EDGES.index(edge_attrs["type"]), attribute)
+            if isinstance(attribute, int):
+                self._tokens[attribute].add(entry)
+            elif isinstance(attribute, str):
+                for token in attribute.lower().split():
+                    self._tokens[token].add(entry)
+
+    def _matches(self, graph, title) -> Tuple[np.ndarray, np.ndarray]:
+        """Count the attributes of every title that match the neighbors of a title
+
+        Names match by substring, so every substring of a neighbor is looked
+        up among the attribute words. Returns the matched title positions
+        and their counts per edge type.
+        """
+        assert self._tokens is not None
+        matched: Set[Tuple] = set()
+        for neighbor in graph.neighbors(title):
+            if isinstance(neighbor, int):
+                matched.update(self._tokens.get(neighbor, ()))
+            elif isinstance(neighbor, str):
+                name = neighbor.lower()
+                for start in range(len(name)):
+                    for end in range(start + 1, len(name) + 1):
+                        matched.update(self._tokens.get(name[start:end], ()))
+        if not matched:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, np.zeros((0, len(EDGES)), dtype=np.int64)
+        positions, edges, _ = zip(*matched)
+        rows, inverse = np.unique(np.array(positions), return_inverse=True)
+        counts = np.zeros((len(rows), len(EDGES)), dtype=np.int64)
+        np.add.at(counts, (inverse, np.array(edges)), 1)
+        return rows, counts
+
+    def _insert(self, graph, position: int, skip: Set[int]):
+        """Insert an added title in the rows it enters"""
+        rows, matches = self._matches(graph, self.index.titles[position])
+        kept = ~np.isin(rows, list(skip | self.index.removed))
+        rows, matches = rows[kept], matches[kept]
+        for relation, edge_types in RELATIONS.items():
+            count = matches[:, [EDGES.index(e) for e in edge_types]].sum(axis=1)
+            titles, counts = self.titles[relation], self.counts[relation]
+            size = np.count_nonzero(titles[rows] >= 0, axis=1)
+            last = counts[rows, np.maximum(size - 1, 0)]
+            # Titles may follow the end of a full or truncated row, so it
+            # is only entered with a higher count than its last title
+            bounded = (titles[rows, -1] != -1) & (size > 0)
+            enters = (count > 0) & ~(bounded & (count <= last))
+            for row, row_count in zip(rows[enters].tolist(), count[enters].tolist()):
+                # After the titles of the same count, which come first
+                at = int(np.count_nonzero(counts[row] >= row_count))
+                titles[row, at + 1 :] = titles[row, at:-1].copy()
+                counts[row, at + 1 :] = counts[row, at:-1].copy()
+                titles[row, at] = position
+                counts[row, at] = row_count
@@ -0,0 +1,148 @@
+import contextlib
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+# Fields of a movie card: the title, the fields read from its edges and the
+# attributes of the title node
+ATTRIBUTE_FIELDS = ("Poster", "Runtime", "Rating", "Overview")
+CARD_FIELDS = ("title", "year", "genre", "directors", "actors") + ATTRIBUTE_FIELDS
+
+_EDGE_FIELDS = {
+    "title_year_edge": "year",
+    "title_director_edge": "directors",
+    "title_actor_edge": "actors",
+    "title_genre_edge": "genre",
+}
+
+
+class MovieResult(NamedTuple):
+    """A scored title returned by query_movies
+
+    It is a ``(title, score, node)`` tuple, where ``node`` is the graph node
+    of the title, so the card of the movie is built from the graph only when
+    needed, without looking the title up again.
+    """
+
+    title: str
+    score: float
+    node: Any = None
+
+
+def movie_card(graph, title: str, fields: Optional[Iterable[str]] = None) -> Dict:
+    """Build the card of a title with only the requested fields
+
+    Without ``fields`` the card holds every edge field and every attribute.
+    Attributes are only read when one of them is requested, and edges only
+    when an edge field is.
+    """
+    requested = CARD_FIELDS if fields is None else tuple(fields)
+    unknown = set(requested) - set(CARD_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields {sorted(unknown)}, expected {CARD_FIELDS}")
+
+    card: Dict[str, Any] = {
+        field: None if field == "year" else []
+        for field in ("actors", "genre", "directors", "year")
+        if field in requested
+    }
+    if card:
+        for item, attr in graph[title].items():
+            field = _EDGE_FIELDS.get(attr["type"])
+            if field not in card:
+                continue
+            if field == "year":
+                card["year"] = item
+            else:
+                card[field].append(item)
+
+    if any(field in ATTRIBUTE_FIELDS for field in requested):
+        attributes = graph.nodes[title]["attributes"]
+        if fields is not None:
+            attributes = {k: v for k, v in attributes.items() if k in requested}
+        card.update(attributes)
+    if "title" in requested:
+        card["title"] = title
+    return card
+
+
+def project_card(card: Dict, fields: Optional[Iterable[str]] = None) -> Dict:
+    """Keep the requested fields of a full movie card, as ``movie_card`` would"""
+    if fields is None:
+        return card
+    requested = set(fields)
+    return {field: value for field, value in card.items() if field in requested}
+
+
+class ToolRuns:
+    """Movie results recorded by the tool runs of a request
+
+    Results are kept by the ID of the tool run that recorded them, set by
+    ``start_tool_run``, and the IDs are kept in the order of the runs, which
+    is the order of the agent steps.
+    """
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.results: Dict[Optional[str], List[MovieResult]] = {}
+        self.current: Optional[str] = None
+
+    def step(self, step: int) -> Optional[List[MovieResult]]:
+        """Get the results recorded by the tool run of an agent step"""
+        if step >= len(self.ids):
+            return None
+        return self.results.get(self.ids[step])
+
+
+_results: ContextVar[Optional[ToolRuns]] = ContextVar("results", default=None)
+
+
+def format_results(results: Iterable[MovieResult]) -> str:
+    """Format results as the ``title: score`` lines of a tool observation"""
+    return "\n".join(f"{result[0]}: {result[1]}" for result in results)
+
+
+def start_tool_run(run_id: str):
+    """Record the results of the following tool calls under a tool run ID"""
+    runs = _results.get()
+    if runs is not None:
+        runs.ids.append(run_id)
+        runs.current = run_id
+
+
+def current_tool_run() -> Optional[str]:
+    """Get the ID of the tool run of the current request, if any"""
+    runs = _results.get()
+    return None if runs is None else runs.current
+
+
+def record_results(
+    results: List[MovieResult], observation: Optional[str] = None
+) -> str:
+    """Format results for the agent and keep them for the current tool run
+
+    An ``observation`` replaces the ``title: score`` lines of the results,
+    for tools answering with other text.
+    """
+    if observation is None:
+        observation = format_results(results)
+    runs = _results.get()
+    if runs is not None:
+        runs.results.setdefault(runs.current, []).extend(results)
+    return observation
+
+
+@contextlib.contextmanager
+def capture_results() -> Iterator[ToolRuns]:
+    """Keep the results of the movie tools run by the current request"""
+    runs = ToolRuns()
+    token = _results.set(runs)
+    try:
+        yield runs
+    finally:
+        _results.reset(token)
+
+
+def results_for(run_id: Optional[str]) -> Optional[List[MovieResult]]:
+    """Get the results recorded by a tool run of the current request"""
+    runs = _results.get()
+    return None if runs is None else runs.results.get(run_id)
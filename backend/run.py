@@ -1,37 +1,58 @@
-import contextlib
-import io
-from typing import Dict
+from typing import Dict, Iterable, List, Optional
 
 from logger import logger
+from results import MovieResult, capture_results, movie_card
+from tracing import span
 
+# Tools whose observations list movies as "title: score" lines
+MOVIE_TOOLS = ("Movies_chain", "Similar_movies", "Movie_stats")
 
-def get_attributes_from_node(graph, title: str) -> Dict:
-    """Get attributes from node"""
-    attribute_dict = {"actors": [], "genre": [], "directors": [], "year": None}
 
-    # Get attributes from node
-    attribute_dict.update(**graph.nodes[title]["attributes"])
+def get_attributes_from_node(
+    graph, title: str, names=None, fields: Optional[Iterable[str]] = None
+) -> Dict:
+    """Get attributes from node
 
-    # Add title
-    attribute_dict["title"] = title
+    With a ``NameIndex``, a title that is not a node, such as one the LLM
+    misspelled, is resolved to the closest title first. ``fields`` limits
+    the card to some of ``results.CARD_FIELDS``.
+    """
+    if names is not None and title not in graph.nodes:
+        title = names.resolve(title, types=("title",)) or title
 
-    for item, attr in graph[title].items():
-        if attr["type"] == "title_year_edge":
-            attribute_dict["year"] = item
-        elif attr["type"] == "title_director_edge":
-            attribute_dict["directors"].append(item)
-        elif attr["type"] == "title_actor_edge":
-            attribute_dict["actors"].append(item)
-        elif attr["type"] == "title_genre_edge":
-            attribute_dict["genre"].append(item)
+    return movie_card(graph, title, fields)
 
-    return attribute_dict
+
+def get_movies_from_observation(
+    database,
+    observation: str,
+    fields: Optional[Iterable[str]] = None,
+    results: Optional[List[MovieResult]] = None,
+) -> List[Dict]:
+    """Build the movie cards listed in a Movies_chain observation
+
+    The ``results`` recorded by the tool run are used when available, their
+    cards are built from their graph nodes. The text of the observation is
+    only parsed for the others.
+    """
+    if results is not None:
+        nodes = [
+            result.title if result.node is None else result.node for result in results
+        ]
+    else:
+        nodes = list(build_dict(observation))
+
+    return [
+        get_attributes_from_node(database.graph, node, database.names, fields)
+        for node in nodes
+    ]
 
 
 def get_result_and_thought_using_graph(
     langchain_object,
     database,
     message: str,
+    fields: Optional[Iterable[str]] = None,
 ):
     """Get result and thought from extracted json"""
     try:
@@ -48,7 +69,12 @@ def get_result_and_thought_using_graph(
 
         langchain_object.return_intermediate_steps = True
 
-        with io.StringIO() as output_buffer, contextlib.redirect_stdout(output_buffer):
+        # Imported here, so importing this module does not import langchain
+        from callbacks import capture_thought, install_tool_run_handler
+
+        install_tool_run_handler()
+        # Capture the verbose trace and the tool results of this request only
+        with capture_thought() as output_buffer, capture_results() as runs:
             try:
                 output = langchain_object(chat_input)
                 # output = {
@@ -85,19 +111,23 @@ def get_result_and_thought_using_graph(
                 logger.debug(f"Error: {str(exc)}")
                 output = langchain_object.run(chat_input)
 
-            intermediate_steps = [
-                action[1]
-                for action in output["intermediate_steps"]
-                if action[0].tool == "Movies_chain"
-            ][0]
-
-            movie_names = build_dict(intermediate_steps)
-
-            movies = [
-                get_attributes_from_node(database.graph, movie)
-                for movie in movie_names.keys()
+            # Every agent step is one tool run, in the same order
+            steps = [
+                (step, action[1])
+                for step, action in enumerate(output["intermediate_steps"])
+                if action[0].tool in MOVIE_TOOLS
             ]
 
+            # Runs that only used other tools, such as Collaborations or
+            # Search, list no movie
+            movies = []
+            if steps:
+                step, observation = steps[0]
+                with span("movie_cards"):
+                    movies = get_movies_from_observation(
+                        database, observation, fields, runs.step(step)
+                    )
+
             thought = output_buffer.getvalue().strip()
 
     except Exception as exc:
@@ -115,7 +145,7 @@ def build_dict(input):
     # Iterate over each pair and add it to the dictionary
     for pair in pairs:
         # Split the pair into movie and rating using the colon character
-        movie, rating = pair.split(": ")
+        movie, rating = pair.rsplit(": ", 1)
 
         # Convert the rating to a float and add it to the dictionary
         my_dict[movie] = float(rating)
@@ -0,0 +1,213 @@
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import metrics
+import requests
+from cache import SingleFlight, TTLCache, normalize_question
+from langchain.utilities.serpapi import SerpAPIWrapper
+from logger import logger
+from requests.adapters import HTTPAdapter
+
+SERPAPI_URL = "https://serpapi.com/search"
+# Statuses worth retrying, the others are errors of the request itself
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """Token bucket allowing ``rate`` calls per second, in bursts of ``capacity``"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take a token, sleeping until one is available, and return the wait"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class SearchClient:
+    """SerpAPI search with a cache, shared in-flight calls and a rate limit
+
+    Results are kept in ``cache``, for a day by default, which may persist
+    them on disk. Concurrent searches of the same query share one request.
+    Requests go through one pooled HTTP session, at most ``rate`` per
+    second, and are retried with exponential backoff on connection errors,
+    rate limits and server errors. ``url`` points the client to another
+    server speaking the SerpAPI protocol, such as a local stand-in.
+
+    ``run`` returns the same text as ``SerpAPIWrapper.run``.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        url: Optional[str] = None,
+        params: Optional[Dict[str, str]] = None,
+        cache: Optional[TTLCache] = None,
+        rate: float = 5.0,
+        burst: int = 10,
+        retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 10.0,
+        pool_size: int = 10,
+    ):
+        self.api_key = api_key or os.environ.get("SERPAPI_API_KEY")
+        if not self.api_key:
+            raise ValueError("Set SERPAPI_API_KEY or pass api_key to search")
+        self.url = url or os.environ.get("SERPAPI_URL", SERPAPI_URL)
+        self.params = params or {
+            "engine": "google",
+            "google_domain": "google.com",
+            "gl": "us",
+            "hl": "en",
+        }
+        self.cache = cache or TTLCache(maxsize=4096, ttl=24 * 3600, namespace="search")
+        self.limiter = TokenBucket(rate, burst)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._flights = SingleFlight()
+
+        # One session keeps the connections to the server alive
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._searches = {
+            result: metrics.counter(
+                "search_requests_total",
+                "Searches by how they were answered",
+                labels={"result": result},
+            )
+            for result in ("cached", "shared", "fetched", "failed")
+        }
+        self._latency = metrics.histogram(
+            "search_fetch_seconds", "Latency of the searches sent to the server"
+        )
+        self._lock = threading.Lock()
+        self.fetches = 0
+        self.fetch_seconds = 0.0
+        self.saved = {"cached": 0, "shared": 0}
+
+    def run(self, query: str) -> str:
+        """Search a query and get the text of its best result"""
+        key = normalize_question(query)
+        result = self.cache.get(key)
+        if result is not None:
+            self._count("cached")
+            return result
+        try:
+            result, shared = self._flights.do(key, lambda: self._fetch(key, query))
+        except Exception:
+            self._searches["failed"].inc()
+            raise
+        if shared:
+            self._count("shared")
+        return result
+
+    def _count(self, result: str):
+        self._searches[result].inc()
+        with self._lock:
+            self.saved[result] += 1
+
+    def _fetch(self, key: str, query: str) -> str:
+        # A search of the same query may have ended since the cache was read
+        result = self.cache.get(key)
+        if result is not None:
+            return result
+        start = time.perf_counter()
+        response = self.results(query)
+        elapsed = time.perf_counter() - start
+        self._latency.observe(elapsed)
+        self._searches["fetched"].inc()
+        with self._lock:
+            self.fetches += 1
+            self.fetch_seconds += elapsed
+        # Errors of the search are raised and never cached
+        result = SerpAPIWrapper._process_response(response)
+        self.cache.set(key, result)
+        return result
+
+    def results(self, query: str) -> dict:
+        """Get the raw JSON result of a query, retrying transient failures"""
+        params = {
+            **self.params,
+            "q": query,
+            "api_key": self.api_key,
+            "source": "python",
+            "output": "json",
+        }
+        error: Optional[Exception] = None
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire()
+            try:
+                response = self.session.get(
+                    self.url, params=params, timeout=self.timeout
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.retries:
+                    raise
+                error = e
+                delay = self.backoff * 2**attempt
+                logger.warning(f"Search failed ({e}), retrying in {delay:.1f} s")
+            else:
+                if (
+                    response.status_code not in RETRY_STATUSES
+                    or attempt == self.retries
+                ):
+                    # SerpAPI explains its errors in JSON, raised when processed
+                    if not response.ok and "json" not in response.headers.get(
+                        "Content-Type", ""
+                    ):
+                        response.raise_for_status()
+                    return response.json()
+                # Rate limited servers may say when to come back
+                retry_after = response.headers.get("Retry-After", "")
+                delay = (
+                    float(retry_after)
+                    if retry_after.replace(".", "", 1).isdigit()
+                    else self.backoff * 2**attempt
+                )
+                error = requests.HTTPError(
+                    f"Search got status {response.status_code}", response=response
+                )
+                logger.warning(f"{error}, retrying in {delay:.1f} s")
+            time.sleep(delay)
+        # The last attempt returns or raises above, fail loudly if it did not
+        raise error or RuntimeError(f"Search of {query!r} was never attempted")
+
+    def stats(self) -> Dict[str, float]:
+        """Get the searches answered without the server, and the time it saved
+
+        The time saved estimates each search not sent with the mean latency
+        of the searches that were.
+        """
+        with self._lock:
+            mean = self.fetch_seconds / self.fetches if self.fetches else 0.0
+            saved = sum(self.saved.values())
+            total = saved + self.fetches
+            return {
+                "fetched": self.fetches,
+                **self.saved,
+                "hit_rate": saved / total if total else 0.0,
+                "seconds_saved": saved * mean,
+            }
@@ -0,0 +1,436 @@
+import copy
+import os
+import re
+import tempfile
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from overlay import push_layer
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOP_WORDS = {
+    "a", "about", "after", "all", "an", "and", "are", "as", "at", "be", "been",
+    "but", "by", "can", "for", "from", "has", "have", "he", "her", "his", "in",
+    "into", "is", "it", "its", "of", "on", "one", "or", "she", "that", "the",
+    "their", "them", "they", "this", "to", "two", "was", "when", "where",
+    "which", "while", "who", "whose", "will", "with",
+}  # fmt: skip
+
+
+def semantic_path(csv_file: str) -> str:
+    """Default semantic index location next to the source csv file"""
+    return str(Path(csv_file).with_suffix(".semantic.npz"))
+
+
+def tokenize(text: str) -> List[str]:
+    """Split free text into lower-cased words without stop words"""
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOP_WORDS]
+
+
+def movie_document(graph, title: str) -> List[str]:
+    """Get the terms describing a title: its overview, genres and people
+
+    Genres and people are kept as whole terms, so that "Tom Hardy" is one
+    feature instead of two common words.
+    """
+    terms = tokenize(title) + tokenize(graph.nodes[title]["attributes"]["Overview"])
+    for neighbor, edge in graph[title].items():
+        if edge["type"] == "title_genre_edge":
+            terms.append(f"genre:{neighbor.lower()}")
+        elif edge["type"] in ("title_director_edge", "title_actor_edge"):
+            terms.append(f"person:{neighbor.lower()}")
+    return terms
+
+
+class SparseRows:
+    """Rows of a sparse matrix in the CSR layout"""
+
+    def __init__(self, data, indices, indptr, n_columns: int):
+        self.data = data
+        self.indices = indices
+        self.indptr = indptr
+        self.n_columns = n_columns
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    def dot(self, dense: np.ndarray, chunk: int = 1 << 18) -> np.ndarray:
+        """Multiply by a dense matrix, a bounded number of entries at a time"""
+        out = np.zeros((len(self), dense.shape[1]), dtype=np.float32)
+        start = 0
+        while start < len(self):
+            # Rows up to ``chunk`` stored entries, and at least one row
+            end = np.searchsorted(self.indptr, self.indptr[start] + chunk, "right")
+            end = min(max(int(end) - 1, start + 1), len(self))
+            lo, hi = self.indptr[start], self.indptr[end]
+            starts = self.indptr[start:end] - lo
+            nonempty = np.diff(self.indptr[start : end + 1]) > 0
+            if hi > lo:
+                products = self.data[lo:hi, None] * dense[self.indices[lo:hi]]
+                out[start:end][nonempty] = np.add.reduceat(
+                    products, starts[nonempty], axis=0
+                )
+            start = end
+        return out
+
+    def transpose(self) -> "SparseRows":
+        rows = np.repeat(np.arange(len(self)), np.diff(self.indptr))
+        order = np.argsort(self.indices, kind="stable")
+        indptr = np.zeros(self.n_columns + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.indices, minlength=self.n_columns), out=indptr[1:])
+        return SparseRows(self.data[order], rows[order], indptr, len(self))
+
+
+class TfidfSvdEncoder:
+    """TF-IDF term weights projected to dense vectors with a truncated SVD
+
+    The SVD is computed with the randomized range finder of Halko et al., on
+    the sparse TF-IDF matrix, so it needs neither a network connection nor a
+    dependency beyond NumPy.
+    """
+
+    def __init__(
+        self,
+        vocabulary: Dict[str, int],
+        idf: np.ndarray,
+        components: np.ndarray,
+    ):
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.components = components
+
+    @classmethod
+    def fit(
+        cls,
+        documents: Sequence[List[str]],
+        dims: int = 128,
+        min_df: int = 2,
+        max_fit: int = 20000,
+        seed: int = 0,
+    ) -> Tuple["TfidfSvdEncoder", np.ndarray]:
+        """Learn the encoder and return it with the unit document vectors
+
+        The SVD is fitted on at most ``max_fit`` random documents, then every
+        document is projected with it.
+        """
+        df = Counter(term for document in documents for term in set(document))
+        if len(documents) < 2 * min_df:
+            min_df = 1
+        terms = sorted(term for term, count in df.items() if count >= min_df)
+        vocabulary = {term: i for i, term in enumerate(terms)}
+        idf = np.log((1 + len(documents)) / (1 + np.array([df[t] for t in terms])))
+        encoder = cls(vocabulary, (idf + 1).astype(np.float32), np.zeros((0, 0)))
+
+        rng = np.random.default_rng(seed)
+        if len(documents) > max_fit:
+            sample = rng.choice(len(documents), max_fit, replace=False)
+            rows = encoder._weights([documents[i] for i in np.sort(sample)])
+        else:
+            rows = encoder._weights(documents)
+        dims = max(1, min(dims, len(rows) - 1, len(terms) - 1))
+        projection = rng.standard_normal((len(terms), dims + 10)).astype(np.float32)
+        basis = rows.dot(projection)
+        transposed = rows.transpose()
+        for _ in range(2):
+            basis, _ = np.linalg.qr(basis)
+            basis = rows.dot(transposed.dot(basis))
+        basis, _ = np.linalg.qr(basis)
+        _, _, vt = np.linalg.svd(transposed.dot(basis).T, full_matrices=False)
+        encoder.components = np.ascontiguousarray(vt[:dims].T, dtype=np.float32)
+        return encoder, encoder.transform(documents)
+
+    def _weights(self, documents: Sequence[List[str]]) -> SparseRows:
+        """Get the L2-normalized, sublinear TF-IDF rows of the documents"""
+        data: List[float] = []
+        indices: List[int] = []
+        indptr = [0]
+        for document in documents:
+            counts = Counter(
+                self.vocabulary[t] for t in document if t in self.vocabulary
+            )
+            ids = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+            weights = (1 + np.log(np.fromiter(counts.values(), dtype=np.float32))) * (
+                self.idf[ids]
+            )
+            norm = np.linalg.norm(weights)
+            data.extend((weights / norm if norm else weights).tolist())
+            indices.extend(ids.tolist())
+            indptr.append(len(indices))
+        return SparseRows(
+            np.array(data, dtype=np.float32),
+            np.array(indices, dtype=np.int64),
+            np.array(indptr, dtype=np.int64),
+            len(self.vocabulary),
+        )
+
+    def transform(self, documents: Sequence[List[str]]) -> np.ndarray:
+        """Get the unit vectors of documents"""
+        return normalize_rows(self._weights(documents).dot(self.components))
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.where(norms == 0, 1, norms)).astype(np.float32)
+
+
+class IVFIndex:
+    """Inverted file index for approximate maximum inner product search
+
+    The vectors are clustered with spherical k-means and stored grouped by
+    cluster. A search scores only the clusters whose centroids are closest
+    to the query.
+    """
+
+    def __init__(self, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray):
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+
+    @classmethod
+    def build(
+        cls, vectors: np.ndarray, n_lists: Optional[int] = None, seed: int = 0
+    ) -> "IVFIndex":
+        n_lists = min(len(vectors), n_lists or max(1, int(np.sqrt(len(vectors)))))
+        rng = np.random.default_rng(seed)
+
+        # Train on at most 64 vectors per cluster, then assign all of them
+        sample = vectors
+        if len(vectors) > 64 * n_lists:
+            sample = vectors[rng.choice(len(vectors), 64 * n_lists, replace=False)]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(10):
+            assignment = cls._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = np.bincount(assignment, minlength=n_lists) == 0
+            sums[empty] = centroids[empty]
+            centroids = normalize_rows(sums)
+        return cls.from_assignment(centroids, cls._assign(vectors, centroids))
+
+    @classmethod
+    def from_assignment(
+        cls, centroids: np.ndarray, assignment: np.ndarray
+    ) -> "IVFIndex":
+        """Group the IDs by the cluster they are assigned to"""
+        order = np.argsort(assignment, kind="stable").astype(np.int64)
+        offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=len(centroids)), out=offsets[1:])
+        return cls(centroids, order, offsets)
+
+    def assignment(self) -> np.ndarray:
+        """Get the cluster of every ID"""
+        assignment = np.empty(len(self.order), dtype=np.int64)
+        assignment[self.order] = np.repeat(
+            np.arange(len(self.centroids)), np.diff(self.offsets)
+        )
+        return assignment
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 16384):
+        return np.concatenate(
+            [
+                np.argmax(vectors[i : i + chunk] @ centroids.T, axis=1)
+                for i in range(0, len(vectors), chunk)
+            ]
+        )
+
+    def candidates(self, query: np.ndarray, n_probe: int) -> np.ndarray:
+        """Get the IDs stored in the clusters closest to the query"""
+        n_probe = min(n_probe, len(self.centroids))
+        closest = np.argpartition(-(self.centroids @ query), n_probe - 1)[:n_probe]
+        return np.concatenate(
+            [self.order[self.offsets[c] : self.offsets[c + 1]] for c in closest]
+        )
+
+
+def top_similar(
+    vectors: np.ndarray, ids: np.ndarray, query: np.ndarray, k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the k IDs with the highest inner product, best first"""
+    scores = vectors[ids] @ query
+    if k < len(ids):
+        selected = np.argpartition(-scores, k - 1)[:k]
+    else:
+        selected = np.arange(len(ids))
+    selected = selected[np.lexsort((ids[selected], -scores[selected]))]
+    return ids[selected], scores[selected]
+
+
+class SemanticIndex:
+    """Overview similarity search over the titles of the graph
+
+    Title vectors are stored in the order of the titles of an
+    ``AttributeIndex``, kept as ``index``, so the returned positions can be
+    combined with its attribute scores. Titles added to the catalog are
+    encoded with the fitted vocabulary in small layers searched exactly, and
+    removed titles are skipped, see ``updated``.
+    """
+
+    # Number of closest clusters scored per search
+    n_probe = 8
+    # Smaller catalogs are scanned exactly, which is as fast as the clusters
+    exact_below = 20000
+
+    def __init__(
+        self,
+        encoder: TfidfSvdEncoder,
+        vectors: np.ndarray,
+        ivf: IVFIndex,
+        index=None,
+    ):
+        self.encoder = encoder
+        self.vectors = vectors
+        self.ivf = ivf
+        self.index = index
+        # Positions and vectors of the titles added since the build
+        self._layers: Tuple[Tuple[np.ndarray, np.ndarray], ...] = ()
+
+    @classmethod
+    def build(cls, graph, index, dims: int = 128) -> "SemanticIndex":
+        """Embed the titles of an attribute index and cluster their vectors"""
+        documents = [
+            [] if position in index.removed else movie_document(graph, title)
+            for position, title in enumerate(index.titles)
+        ]
+        encoder, vectors = TfidfSvdEncoder.fit(documents, dims=dims)
+        return cls(encoder, vectors, IVFIndex.build(vectors), index)
+
+    @property
+    def size(self) -> int:
+        """Number of title positions covered, removed ones included"""
+        return len(self.vectors) + sum(len(positions) for positions, _ in self._layers)
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the array storage in bytes"""
+        arrays = [self.vectors, self.encoder.idf, self.encoder.components]
+        arrays += [self.ivf.centroids, self.ivf.order, self.ivf.offsets]
+        arrays += [array for layer in self._layers for array in layer]
+        return sum(array.nbytes for array in arrays)
+
+    def updated(self, graph, index) -> "SemanticIndex":
+        """Get a new version following a newer version of the attribute index
+
+        Only the titles added since this version are encoded, the current
+        version is not modified.
+        """
+        semantic = copy.copy(self)
+        semantic.index = index
+        positions = np.arange(self.size, len(index.titles), dtype=np.int64)
+        if len(positions):
+            titles = index.titles[self.size :]
+            documents = [
+                [] if position in index.removed else movie_document(graph, title)
+                for position, title in zip(positions.tolist(), titles)
+            ]
+            semantic._layers = push_layer(
+                self._layers,
+                (positions, self.encoder.transform(documents)),
+                size=lambda layer: len(layer[0]),
+                merge=lambda a, b: (
+                    np.concatenate([a[0], b[0]]),
+                    np.concatenate([a[1], b[1]]),
+                ),
+            )
+        return semantic
+
+    def compacted(self, live: np.ndarray, index) -> "SemanticIndex":
+        """Get the index of a rebuilt attribute index keeping the ``live`` positions
+
+        Vectors and clusters are reused, so nothing is encoded again.
+        """
+        shape = (self.size, self.vectors.shape[1])
+        vectors = np.empty(shape, dtype=self.vectors.dtype)
+        vectors[: len(self.vectors)] = self.vectors
+        assignment = np.empty(self.size, dtype=np.int64)
+        assignment[: len(self.vectors)] = self.ivf.assignment()
+        for positions, layer in self._layers:
+            vectors[positions] = layer
+            assignment[positions] = IVFIndex._assign(layer, self.ivf.centroids)
+        ivf = IVFIndex.from_assignment(self.ivf.centroids, assignment[live])
+        return SemanticIndex(self.encoder, vectors[live], ivf, index)
+
+    def vector(self, position: int) -> np.ndarray:
+        """Get the vector of a title position"""
+        if position < len(self.vectors):
+            return self.vectors[position]
+        for positions, vectors in self._layers:
+            if position <= positions[-1]:
+                return vectors[np.searchsorted(positions, position)]
+        raise IndexError(position)
+
+    def encode(self, text: str) -> np.ndarray:
+        """Get the unit vector of a free text description"""
+        return self.encoder.transform([tokenize(text)])[0]
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int = 10,
+        exact: bool = False,
+        n_probe: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the positions and cosine similarities of the closest titles"""
+        if exact or len(self.vectors) < self.exact_below:
+            ids = np.arange(len(self.vectors))
+        else:
+            ids = self.ivf.candidates(query, n_probe or self.n_probe)
+        removed = self.index.removed if self.index is not None else ()
+        if removed:
+            removed = np.fromiter(removed, dtype=np.int64, count=len(removed))
+            ids = ids[~np.isin(ids, removed)]
+        positions, scores = top_similar(self.vectors, ids, query, k)
+        if not self._layers:
+            return positions, scores
+
+        # The added titles are few, so they are all scored
+        found = [(positions, scores)]
+        for layer_positions, vectors in self._layers:
+            ids = np.flatnonzero(~np.isin(layer_positions, removed))
+            ids, layer_scores = top_similar(vectors, ids, query, k)
+            found.append((layer_positions[ids], layer_scores))
+        positions = np.concatenate([positions for positions, _ in found])
+        scores = np.concatenate([scores for _, scores in found])
+        best = np.lexsort((positions, -scores))[:k]
+        return positions[best], scores[best]
+
+    def save(self, path: str, checksum: str):
+        """Write the index next to the graph, replacing any previous file"""
+        directory = os.path.dirname(os.path.abspath(path))
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as f:
+            np.savez(
+                f,
+                checksum=np.array(checksum),
+                terms=np.array(list(self.encoder.vocabulary)),
+                idf=self.encoder.idf,
+                components=self.encoder.components,
+                vectors=self.vectors,
+                centroids=self.ivf.centroids,
+                order=self.ivf.order,
+                offsets=self.ivf.offsets,
+            )
+        os.chmod(f.name, 0o644)
+        os.replace(f.name, path)
+
+    @classmethod
+    def load(
+        cls, path: str, checksum: Optional[str] = None, index=None
+    ) -> Optional["SemanticIndex"]:
+        """Read a saved index, or return None if it is missing or outdated
+
+        ``index`` is the attribute index whose titles the vectors follow.
+        """
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as arrays:
+            if checksum is not None and str(arrays["checksum"]) != checksum:
+                return None
+            encoder = TfidfSvdEncoder(
+                {term: i for i, term in enumerate(arrays["terms"].tolist())},
+                arrays["idf"],
+                arrays["components"],
+            )
+            ivf = IVFIndex(arrays["centroids"], arrays["order"], arrays["offsets"])
+            return cls(encoder, arrays["vectors"], ivf, index)
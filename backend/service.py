@@ -0,0 +1,171 @@
+import gc
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from answers import AnswerCache
+from logger import logger
+from pool import AgentPool
+from speculation import SpendCap
+
+# Parts of the service, loaded in this order
+PARTS = ("database", "agent")
+
+
+def load_database():
+    """Load the movie database configured by the environment
+
+    IMDB_CSV names the catalog and IMDB_SNAPSHOT memory-maps a snapshot of
+    it, which holds the related titles table, other databases build it when
+    IMDB_RELATED is set. Shards are not started here, as their workers must
+    not be forked with the database.
+    """
+    # Imported here, with pandas and networkx, to keep the app quick to import
+    from database import MovieDatabase
+
+    csv_file = os.environ.get("IMDB_CSV", "data/imdb_top_1000.csv")
+    if os.environ.get("IMDB_SNAPSHOT"):
+        return MovieDatabase.load_snapshot(os.environ["IMDB_SNAPSHOT"], csv_file)
+    database = MovieDatabase(csv_file)
+    if int(os.environ.get("IMDB_RELATED", 0)):
+        database.build_related(int(os.environ["IMDB_RELATED"]))
+    return database
+
+
+class Service:
+    """State of the API, loaded after the app is imported
+
+    ``start`` loads the database and the fast path, then the agent and its
+    pool, in a background thread, so the app answers /healthz at once. The
+    two parts are ready, or fail, separately: the fast path and
+    /autocomplete only need the database. ``preload`` loads the database
+    ahead of time, in the master process of a server that forks its workers
+    afterwards.
+    """
+
+    def __init__(self):
+        self.movie_graph = None
+        self.fast_path = None
+        self.agent = None
+        self.agent_pool: Optional[AgentPool] = None
+        self.answers: Optional[AnswerCache] = None
+        self.errors: Dict[str, BaseException] = {}
+        self.timings: Dict[str, float] = {}
+        self._ready = {part: threading.Event() for part in PARTS}
+        self._loaded = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        """Whether the database and the agent are loaded"""
+        return all(event.is_set() for event in self._ready.values())
+
+    def status(self, part: str) -> str:
+        """Get whether the database or the agent is starting, ready or failed"""
+        if self._ready[part].is_set():
+            return "ready"
+        # Parts left unloaded once loading ended failed, or follow one that did
+        return "failed" if self._loaded.is_set() else "starting"
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait until loading ends, returning whether every part is loaded"""
+        self._loaded.wait(timeout)
+        return self.ready
+
+    def ambiguous(self, question: str) -> bool:
+        """Whether a question needs the agent, as the fast path cannot parse it"""
+        return self.fast_path.parse(question) is None
+
+    def preload(self, langchain: bool = False):
+        """Load the database now, so forked workers share its pages
+
+        With ``langchain``, the agent module and langchain are imported too,
+        the agent itself is still built by ``load`` in every worker.
+        """
+        start = time.perf_counter()
+        self.movie_graph = load_database()
+        self.timings["database"] = time.perf_counter() - start
+        if langchain:
+            import agent  # noqa: F401
+        # Move the loaded objects out of the collector's reach, a collection
+        # in a worker would otherwise write to, and copy, their pages
+        gc.freeze()
+
+    def start(self):
+        """Load the service in a background thread"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self.load, name="startup", daemon=True
+                )
+                self._thread.start()
+
+    def load(self):
+        """Load the database, then the agent, recording failures in ``errors``"""
+        start = time.perf_counter()
+        loaders = {"database": self._load_database, "agent": self._load_agent}
+        for part in PARTS:
+            try:
+                loaders[part]()
+            except Exception as e:
+                # Log stack trace
+                logger.exception(e)
+                self.errors[part] = e
+                break
+            self._ready[part].set()
+        if self.ready:
+            self.timings["ready"] = time.perf_counter() - start
+            logger.info(f"Service ready in {self.timings['ready']:.2f} s")
+        self._loaded.set()
+
+    def _load_database(self):
+        from fast_path import FastPath
+
+        if self.movie_graph is None:
+            self.preload()
+        # Score in IMDB_SHARDS processes when set
+        self.movie_graph.start_shards(int(os.environ.get("IMDB_SHARDS", 0)))
+        self.fast_path = FastPath(self.movie_graph)
+
+    def _load_agent(self):
+        # Imported here, as langchain alone takes about a second to import
+        loaded = time.perf_counter()
+        from agent import MovieAgent
+
+        # With IMDB_SPECULATE set, ambiguous questions start the graph lookup
+        # and the web search at once, within IMDB_SPECULATION_BUDGET extra
+        # calls per minute, and the fast path parses the lookups of the agent
+        self.agent = MovieAgent.initialize(
+            movie_graph=self.movie_graph,
+            speculate=self.ambiguous if os.environ.get("IMDB_SPECULATE") else None,
+            speculation_budget=SpendCap(
+                int(os.environ.get("IMDB_SPECULATION_BUDGET", 60))
+            ),
+            parse=self.fast_path.parse,
+        )
+        self.timings["agent"] = time.perf_counter() - loaded
+
+        # Bounded pool for the blocking agent runs
+        self.agent_pool = AgentPool(
+            max_workers=int(os.environ.get("IMDB_AGENT_WORKERS", 4)),
+            max_queue=int(os.environ.get("IMDB_AGENT_QUEUE", 16)),
+            queue_timeout=float(os.environ.get("IMDB_QUEUE_TIMEOUT", 30)),
+        )
+        # Agent answers shared by identical messages, IMDB_ANSWER_CACHE_SIZE
+        # set to 0 runs the agent for every message
+        answer_cache_size = int(os.environ.get("IMDB_ANSWER_CACHE_SIZE", 1024))
+        if answer_cache_size:
+            self.answers = AnswerCache(
+                maxsize=answer_cache_size,
+                ttl=float(os.environ.get("IMDB_ANSWER_CACHE_TTL", 300)),
+                path=os.environ.get("IMDB_CACHE_PATH"),
+            )
+
+    def close(self):
+        """Stop the agent pool and the shard workers"""
+        if self.agent_pool is not None:
+            self.agent_pool.close()
+        if self.movie_graph is not None and self.movie_graph.shards is not None:
+            self.movie_graph.shards.close()
@@ -0,0 +1,218 @@
+import gc
+import heapq
+import multiprocessing
+import threading
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from attribute_index import AttributeIndex, top_k
+from compact_graph import StringArray
+
+ALIGNMENT = 64
+
+
+def title_postings(index: AttributeIndex, graph) -> Dict[str, np.ndarray]:
+    """Invert the neighbors of the indexed titles into arrays
+
+    Every neighbor node gets the sorted positions of its titles, as a CSR
+    matrix with ``indptr`` and ``positions``. Removed titles are left out.
+    """
+    ids: Dict = {}
+    rows: List[int] = []
+    positions: List[int] = []
+    removed = index.removed
+    for position, title in enumerate(index.titles):
+        if position in removed:
+            continue
+        for neighbor in graph.neighbors(title):
+            if isinstance(neighbor, (int, str)):
+                rows.append(ids.setdefault(neighbor, len(ids)))
+                positions.append(position)
+
+    nodes = list(ids)
+    rows_array = np.array(rows, dtype=np.int64)
+    order = np.lexsort((np.array(positions, dtype=np.int64), rows_array))
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows_array, minlength=len(nodes)), out=indptr[1:])
+    names = StringArray.from_list([str(node) for node in nodes])
+    return {
+        "names.data": names.data,
+        "names.offsets": names.offsets,
+        "int_keys": np.array([isinstance(node, int) for node in nodes], dtype=bool),
+        "indptr": indptr,
+        "positions": np.array(positions, dtype=np.int32)[order],
+    }
+
+
+def _pack(arrays: Dict[str, np.ndarray]) -> Tuple[shared_memory.SharedMemory, Dict]:
+    """Copy named arrays into one shared memory block, with their layout"""
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        layout[name] = (array.dtype.str, array.shape, offset)
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    memory = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for name, array in _unpack(memory, layout).items():
+        array[...] = arrays[name]
+    return memory, layout
+
+
+def _unpack(memory: shared_memory.SharedMemory, layout: Dict) -> Dict[str, np.ndarray]:
+    """Map the arrays of a shared memory block in place"""
+    return {
+        name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=memory.buf, offset=offset)
+        for name, (dtype, shape, offset) in layout.items()
+    }
+
+
+def shard_index(arrays: Dict[str, np.ndarray], lo: int, hi: int) -> AttributeIndex:
+    """Index the titles at positions lo to hi, reading postings in place"""
+    indptr, positions = arrays["indptr"], arrays["positions"]
+    names = StringArray(arrays["names.data"], arrays["names.offsets"])
+    int_keys = arrays["int_keys"]
+
+    # Nodes linked to at least one title of the shard
+    nodes = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    linked = np.zeros(len(indptr) - 1, dtype=bool)
+    linked[nodes[(positions >= lo) & (positions < hi)]] = True
+
+    def postings(node_id: int) -> set:
+        node = positions[indptr[node_id] : indptr[node_id + 1]]
+        start, end = np.searchsorted(node, [lo, hi]).tolist()
+        return set((node[start:end] - lo).tolist())
+
+    name_ids = np.flatnonzero(linked & ~int_keys)
+    return AttributeIndex.from_postings(
+        range(lo, hi),
+        [names[i].lower() for i in name_ids.tolist()],
+        lambda name: postings(name_ids[name]),
+        {
+            int(names[i]): postings(i)
+            for i in np.flatnonzero(linked & int_keys).tolist()
+        },
+    )
+
+
+def score_shard(
+    index: AttributeIndex, queried_attributes: List, k: int, scoring: str
+) -> List[Tuple[int, int]]:
+    """Get the k best ``(position, count)`` pairs of a shard, ties by position"""
+    top: Iterable[Tuple[int, int]]
+    if scoring == "vectorized":
+        counts = index.counts(queried_attributes)
+        local = top_k(counts, k)
+        top = zip(local.tolist(), counts[local].tolist())
+    else:
+        candidates = index.candidates(queried_attributes)
+        top = heapq.nsmallest(k, candidates.items(), key=lambda x: (-x[1], x[0]))
+    return [(index.titles[p], c) for p, c in top]
+
+
+def _serve(connection):
+    """Worker loop: load a range of titles and score batches of queries"""
+    memory = index = None
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        if message[0] == "load":
+            _, name, layout, lo, hi = message
+            index = None
+            gc.collect()
+            if memory is not None:
+                memory.close()
+            memory = shared_memory.SharedMemory(name=name)
+            index = shard_index(_unpack(memory, layout), lo, hi)
+            connection.send(True)
+        else:
+            _, queries, k, scoring = message
+            connection.send([score_shard(index, q, k, scoring) for q in queries])
+
+    # Views into the block must be gone before it is closed
+    index = None
+    gc.collect()
+    if memory is not None:
+        memory.close()
+
+
+class ShardPool:
+    """Score titles in worker processes, each one holding a range of titles
+
+    The postings of the catalog are copied once into a shared memory block,
+    which every worker maps to index its own range of title positions. A
+    query is sent to every worker, which returns its local top k, and the
+    results are merged with the same ties as ``score_movies``. Workers are
+    forked where possible, so that importing the main module again, as
+    ``spawn`` does, never builds another database.
+    """
+
+    def __init__(self, index: AttributeIndex, graph, shards: int):
+        self.shards = shards
+        self.index: Optional[AttributeIndex] = None
+        self._lock = threading.Lock()
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        # Workers share the tracker of the blocks, which only the pool unlinks
+        resource_tracker.ensure_running()
+        self._connections = []
+        self._processes = []
+        for _ in range(shards):
+            parent, child = context.Pipe()
+            process = context.Process(  # type: ignore
+                target=_serve, args=(child,), daemon=True
+            )
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+        self.load(index, graph)
+
+    def load(self, index: AttributeIndex, graph):
+        """Split the titles of a version of the index between the workers"""
+        memory, layout = _pack(title_postings(index, graph))
+        try:
+            bounds = np.linspace(0, len(index.titles), self.shards + 1).astype(int)
+            with self._lock:
+                for connection, lo, hi in zip(
+                    self._connections, bounds[:-1].tolist(), bounds[1:].tolist()
+                ):
+                    connection.send(("load", memory.name, layout, lo, hi))
+                for connection in self._connections:
+                    connection.recv()
+                self.index = index
+        finally:
+            # Workers keep their mapping, the name is no longer needed
+            memory.close()
+            memory.unlink()
+
+    def top(
+        self, index: AttributeIndex, queries: List[List], k: int, scoring: str
+    ) -> Optional[List[List[Tuple[int, int]]]]:
+        """Get the k best ``(position, count)`` pairs of every query
+
+        Returns None when the workers do not hold this version of the index.
+        """
+        queries = [
+            [queried for queried in attributes if isinstance(queried, (int, str))]
+            for attributes in queries
+        ]
+        with self._lock:
+            if self.index is not index:
+                return None
+            for connection in self._connections:
+                connection.send(("score", queries, k, scoring))
+            results = [connection.recv() for connection in self._connections]
+        return [
+            heapq.nsmallest(k, sum(shards, []), key=lambda x: (-x[1], x[0]))
+            for shards in zip(*results)
+        ]
+
+    def close(self):
+        """Stop the workers"""
+        with self._lock:
+            for connection in self._connections:
+                connection.send(None)
+            for process in self._processes:
+                process.join()
+            self._connections, self._processes = [], []
+            self.index = None
@@ -0,0 +1,162 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from compact_graph import EDGE_TYPES, Column, CompactGraph, StringArray
+
+MAGIC = b"IMDBSNAP"
+VERSION = 1
+ALIGNMENT = 64
+
+
+def file_checksum(path: str) -> str:
+    """Get the SHA-256 checksum of a file"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def snapshot_path(csv_file: str) -> str:
+    """Default snapshot location next to the source csv file"""
+    return str(Path(csv_file).with_suffix(".snapshot"))
+
+
+def _graph_arrays(graph: CompactGraph) -> Dict[str, np.ndarray]:
+    """Flatten a compact graph into named arrays"""
+    arrays = {
+        "names.data": graph.names.data,
+        "names.offsets": graph.names.offsets,
+        "int_keys": graph.int_keys,
+        "node_type": graph.node_type,
+        "row": graph.row,
+    }
+    for edge_type in EDGE_TYPES:
+        arrays[f"indptr.{edge_type}"] = graph.indptr[edge_type]
+        arrays[f"indices.{edge_type}"] = graph.indices[edge_type]
+    for name, column in graph.columns.items():
+        if isinstance(column, StringArray):
+            arrays[f"columns.{name}.data"] = column.data
+            arrays[f"columns.{name}.offsets"] = column.offsets
+        elif column.dtype.hasobject:
+            raise ValueError(f"Column {name!r} can not be stored in a snapshot")
+        else:
+            arrays[f"columns.{name}"] = column
+    return arrays
+
+
+def read_checksum(path: str) -> str:
+    """Get the source checksum stored in a snapshot header"""
+    with open(path, "rb") as f:
+        return _read_header(f)["checksum"]
+
+
+def _read_header(f) -> Dict:
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"{f.name} is not a movie graph snapshot")
+    size = int.from_bytes(f.read(8), "little")
+    header = json.loads(f.read(size))
+    if header["version"] != VERSION:
+        raise ValueError(f"Unsupported snapshot version {header['version']}")
+    return header
+
+
+def write_snapshot(
+    graph: CompactGraph,
+    path: str,
+    checksum: str,
+    extra: Optional[Dict[str, np.ndarray]] = None,
+):
+    """Write a compact graph to a snapshot file
+
+    The file holds a JSON header followed by the raw arrays, each aligned so
+    that it can be mapped in place. It is written to a temporary file first
+    and moved into place, so concurrent readers never see a partial file.
+    The ``extra`` arrays, such as precomputed tables, are stored alongside.
+    """
+    extra = extra or {}
+    arrays = {**_graph_arrays(graph), **extra}
+
+    # Lay out the aligned arrays, relative to the end of the header
+    entries, offset = {}, 0
+    for name, array in arrays.items():
+        entries[name] = [array.dtype.str, list(array.shape), offset]
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    header = {
+        "version": VERSION,
+        "checksum": checksum,
+        "columns": list(graph.columns),
+        "extra": list(extra),
+        "arrays": entries,
+    }
+    encoded = json.dumps(header).encode()
+    start = -(-(len(MAGIC) + 8 + len(encoded)) // ALIGNMENT) * ALIGNMENT
+
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as f:
+        f.write(MAGIC + len(encoded).to_bytes(8, "little") + encoded)
+        for name, array in arrays.items():
+            f.seek(start + entries[name][2])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(start + offset)
+    os.chmod(f.name, 0o644)
+    os.replace(f.name, path)
+
+
+def read_snapshot(path: str) -> Tuple[CompactGraph, Dict, Dict[str, np.ndarray]]:
+    """Memory-map a snapshot file into a read-only compact graph
+
+    Returns the graph, the header and the extra arrays stored with it.
+    """
+    with open(path, "rb") as f:
+        header = _read_header(f)
+        start = f.tell()
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    start = -(-start // ALIGNMENT) * ALIGNMENT
+
+    def array(name: str) -> np.ndarray:
+        dtype, shape, offset = header["arrays"][name]
+        count = int(np.prod(shape))
+        return np.frombuffer(
+            buffer, dtype=np.dtype(dtype), count=count, offset=start + offset
+        ).reshape(shape)
+
+    columns: Dict[str, Column] = {}
+    for name in header["columns"]:
+        if f"columns.{name}" in header["arrays"]:
+            columns[name] = array(f"columns.{name}")
+        else:
+            columns[name] = StringArray(
+                array(f"columns.{name}.data"), array(f"columns.{name}.offsets")
+            )
+
+    graph = CompactGraph(
+        names=StringArray(array("names.data"), array("names.offsets")),
+        int_keys=array("int_keys"),
+        node_type=array("node_type"),
+        indptr={t: array(f"indptr.{t}") for t in EDGE_TYPES},
+        indices={t: array(f"indices.{t}") for t in EDGE_TYPES},
+        row=array("row"),
+        columns=columns,
+    )
+    extra = {name: array(name) for name in header.get("extra", ())}
+    return graph, header, extra
+
+
+if __name__ == "__main__":
+    from database import MovieDatabase
+
+    parser = argparse.ArgumentParser(description="Build the movie graph snapshot")
+    parser.add_argument("--csv", default="data/imdb_top_1000.csv")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    path = MovieDatabase.build_snapshot(args.csv, args.output)
+    print(f"Snapshot written to {path}")
@@ -0,0 +1,202 @@
+import contextlib
+import contextvars
+import functools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import metrics
+from cache import TTLCache, normalize_question
+from logger import logger
+from results import MovieResult, capture_results, record_results
+
+# Speculative calls of the current request, by tool and normalized input,
+# with their tool and input
+_calls: contextvars.ContextVar[
+    Optional[Dict[str, Tuple[str, str, Future]]]
+] = contextvars.ContextVar("speculative_calls", default=None)
+
+
+class SpendCap:
+    """Limit on the speculative calls started in a sliding time window
+
+    It is shared by all requests, so speculation can never cost more than
+    ``calls`` LLM or API calls every ``period`` seconds on top of the calls
+    the agent asks for.
+    """
+
+    def __init__(self, calls: int = 60, period: float = 60.0):
+        self.calls = calls
+        self.period = period
+        self._started: deque = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        """Take one call from the budget, if any is left"""
+        with self._lock:
+            now = time.monotonic()
+            while self._started and self._started[0] <= now - self.period:
+                self._started.popleft()
+            if len(self._started) >= self.calls:
+                return False
+            self._started.append(now)
+            return True
+
+
+class Speculator:
+    """Run slow tools on the question while the agent plans its first step
+
+    For a question ``should_speculate`` accepts, every tool of ``tools`` is
+    started on the question in a worker thread as soon as the request
+    begins, so the graph lookup and the web search run concurrently with
+    each other and with the first LLM call. The tools returned by ``wrap``
+    answer a call with the same tool and input from the speculative call,
+    waiting for it if it is still running, and the movie results it
+    recorded are merged into the results of the request.
+
+    The agent rarely calls a tool with the question itself, so ``match``
+    can give the canonical form of a tool's inputs, such as the parsed
+    ``query_movies`` parameters of a graph lookup. A call whose input has
+    the same canonical form as the input of a speculative call, once that
+    one ends, is answered by it too.
+
+    Calls the agent never asks for are cancelled when the request ends if
+    they have not started, otherwise their results are kept in a cache for
+    the next requests. Speculative calls run in their own context, so they
+    never write to the trace of the request, and are limited to
+    ``max_calls`` per request and by the shared ``budget``.
+    """
+
+    def __init__(
+        self,
+        tools: Dict[str, Callable[[str], str]],
+        should_speculate: Optional[Callable[[str], bool]] = None,
+        budget: Optional[SpendCap] = None,
+        max_calls: int = 2,
+        max_workers: int = 4,
+        version: Callable[[], str] = lambda: "",
+        cache: Optional[TTLCache] = None,
+        match: Optional[Dict[str, Callable[[str], Optional[str]]]] = None,
+    ):
+        self.tools = tools
+        self.match = match or {}
+        self.should_speculate = should_speculate or (lambda question: True)
+        self.budget = budget or SpendCap()
+        self.max_calls = max_calls
+        self.version = version
+        self.cache = cache or TTLCache(maxsize=1024, ttl=600, namespace="speculative")
+        self._executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix="speculation"
+        )
+        self._outcomes = {
+            outcome: {
+                name: metrics.counter(
+                    "speculative_calls_total",
+                    "Speculative tool calls by tool and outcome",
+                    labels={"tool": name, "outcome": outcome},
+                )
+                for name in tools
+            }
+            for outcome in ("used", "cached", "cancelled", "over_budget")
+        }
+
+    def _key(self, name: str, tool_input: str) -> str:
+        text = normalize_question(str(tool_input).strip().strip('"'))
+        return f"{self.version()}:{name}:{text}"
+
+    @contextlib.contextmanager
+    def request(self, question: str) -> Iterator[None]:
+        """Speculate for the question of the current request"""
+        calls: Dict[str, Tuple[str, str, Future]] = {}
+        token = _calls.set(calls)
+        try:
+            if self.should_speculate(question):
+                for name in list(self.tools)[: self.max_calls]:
+                    self._start(calls, name, question)
+            yield
+        finally:
+            _calls.reset(token)
+            self._finish(calls)
+
+    def _start(self, calls: Dict, name: str, tool_input: str):
+        key = self._key(name, tool_input)
+        if key in calls or self.cache.get(key) is not None:
+            return
+        if not self.budget.acquire():
+            self._outcomes["over_budget"][name].inc()
+            return
+        # An empty context keeps the call out of the trace of the request
+        future = self._executor.submit(
+            contextvars.Context().run, self._call, name, tool_input
+        )
+        calls[key] = name, tool_input, future
+
+    def _call(self, name: str, tool_input: str) -> Tuple[str, List[MovieResult]]:
+        with capture_results() as runs:
+            observation = self.tools[name](tool_input)
+        return observation, [r for results in runs.results.values() for r in results]
+
+    def _finish(self, calls: Dict[str, Tuple[str, str, Future]]):
+        """Cancel the calls nobody asked for, or cache their results"""
+        for key, (name, _, future) in calls.items():
+            if future.cancel():
+                self._outcomes["cancelled"][name].inc()
+            else:
+                future.add_done_callback(functools.partial(self._keep, key))
+                self._outcomes["cached"][name].inc()
+
+    def _keep(self, key: str, future: Future):
+        if future.exception() is None:
+            self.cache.set(key, future.result())
+        else:
+            logger.debug(f"Speculative call {key} failed: {future.exception()}")
+
+    def wrap(self, name: str) -> Callable[[str], str]:
+        """Get the tool function answering from the speculative calls"""
+        func = self.tools[name]
+
+        def run(tool_input: str) -> str:
+            key = self._key(name, tool_input)
+            calls = _calls.get() or {}
+            _, _, future = calls.pop(key, (None, None, None))
+            if future is None:
+                future = self._matching(calls, name, tool_input)
+            # A started call ends before a new one would, unless it failed
+            if (
+                future is not None
+                and not future.cancel()
+                and future.exception() is None
+            ):
+                self._outcomes["used"][name].inc()
+                observation, results = future.result()
+            else:
+                cached = self.cache.get(key)
+                if cached is None:
+                    return func(tool_input)
+                observation, results = cached
+            # The results of the call become results of the tool run asking
+            return record_results([MovieResult(*r) for r in results], observation)
+
+        return run
+
+    def _matching(
+        self, calls: Dict[str, Tuple[str, str, Future]], name: str, tool_input: str
+    ) -> Optional[Future]:
+        """Take the started speculative call of a tool matching another input"""
+        canonical = self.match.get(name)
+        if canonical is None:
+            return None
+        target = canonical(tool_input)
+        if target is None:
+            return None
+        for key, (call_name, call_input, future) in list(calls.items()):
+            if call_name != name or not (future.running() or future.done()):
+                continue
+            # The canonical form of the question may only be known once its
+            # call ended, which happens before a new call would end
+            if future.exception() is None and canonical(call_input) == target:
+                del calls[key]
+                return future
+        return None
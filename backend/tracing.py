@@ -0,0 +1,112 @@
+import contextlib
+import functools
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import metrics
+
+STAGE_BUCKETS = (
+    0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5,
+    10, 30,
+)  # fmt: skip
+
+_trace: ContextVar[Optional["Trace"]] = ContextVar("trace", default=None)
+_stage_histograms: Dict[str, metrics.Histogram] = {}
+
+
+class Trace:
+    """Timed spans recorded while serving one request"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+
+    def add(self, name: str, start: float, duration: float, **attributes: Any):
+        self.spans.append(
+            {
+                "name": name,
+                "start_ms": round((start - self.start) * 1e3, 3),
+                "duration_ms": round(duration * 1e3, 3),
+                **attributes,
+            }
+        )
+
+    def breakdown(self) -> Dict[str, Any]:
+        """Get the spans with the total time spent per stage"""
+        stages: Dict[str, float] = {}
+        for span in self.spans:
+            stages[span["name"]] = stages.get(span["name"], 0) + span["duration_ms"]
+        return {
+            "total_ms": round((time.perf_counter() - self.start) * 1e3, 3),
+            "stages": {name: round(ms, 3) for name, ms in stages.items()},
+            "spans": self.spans,
+        }
+
+
+def stage_histogram(name: str) -> metrics.Histogram:
+    """Get the latency histogram of a stage"""
+    histogram = _stage_histograms.get(name)
+    if histogram is None:
+        histogram = metrics.histogram(
+            "stage_duration_seconds",
+            "Time spent in each stage of a request",
+            STAGE_BUCKETS,
+            labels={"stage": name},
+        )
+        _stage_histograms[name] = histogram
+    return histogram
+
+
+def record(name: str, start: float, duration: float, **attributes: Any):
+    """Record a finished span in the metrics and in the current trace"""
+    stage_histogram(name).observe(duration)
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(name, start, duration, **attributes)
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes: Any) -> Iterator[None]:
+    """Time a block of code as a stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, start, time.perf_counter() - start, **attributes)
+
+
+def traced(name: str) -> Callable:
+    """Decorator timing every call of a function as a stage"""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, start, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+@contextlib.contextmanager
+def trace() -> Iterator[Trace]:
+    """Collect the spans of the current request
+
+    The trace is stored in a context variable, so the spans of work run in
+    ``AgentPool`` threads, which copy the context, land in it as well.
+    """
+    current = Trace()
+    token = _trace.set(current)
+    try:
+        yield current
+    finally:
+        _trace.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
@@ -0,0 +1,246 @@
+import heapq
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from compact_graph import CompactGraph
+
+PERSON_TYPES = ("director", "actor")
+# Edges linking the people to their titles
+PERSON_EDGES = ("title_director_edge", "title_actor_edge")
+EDGE_TYPES = PERSON_EDGES + ("title_genre_edge", "title_year_edge")
+
+# Nodes linked to more titles are reached but not expanded, such as genres
+MAX_DEGREE = 500
+# Nodes visited by a traversal before it gives up
+MAX_NODES = 100000
+
+
+def neighbors(graph, node, edge_types: Sequence[str] = EDGE_TYPES) -> List:
+    """Get the neighbors of a node along some edge types"""
+    if isinstance(graph, CompactGraph):
+        node_id = graph.node_id(node)
+        return [
+            graph.key(neighbor)
+            for edge_type in edge_types
+            for neighbor in graph.neighbor_ids(node_id, edge_type).tolist()
+        ]
+    return [n for n, edge in graph[node].items() if edge["type"] in edge_types]
+
+
+def _check_edges(edge_types: Sequence[str]):
+    unknown = set(edge_types) - set(EDGE_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown edge types {sorted(unknown)}, expected {EDGE_TYPES}")
+
+
+def expand(
+    graph,
+    start,
+    hops: int = 2,
+    edge_types: Sequence[str] = EDGE_TYPES,
+    max_degree: int = MAX_DEGREE,
+    max_nodes: int = MAX_NODES,
+) -> Dict:
+    """Get the nodes at most ``hops`` edges away from a node, with their depth
+
+    Nodes of a degree above ``max_degree`` are returned but not expanded,
+    except the start, and the search stops once ``max_nodes`` nodes were
+    reached.
+    """
+    _check_edges(edge_types)
+    depths = {start: 0}
+    frontier = [start]
+    for depth in range(1, hops + 1):
+        following = []
+        for node in frontier:
+            if node != start and graph.degree(node) > max_degree:
+                continue
+            for neighbor in neighbors(graph, node, edge_types):
+                if neighbor not in depths:
+                    depths[neighbor] = depth
+                    following.append(neighbor)
+                    if len(depths) >= max_nodes:
+                        return depths
+        frontier = following
+    return depths
+
+
+def shortest_path(
+    graph,
+    source,
+    target,
+    edge_types: Sequence[str] = PERSON_EDGES,
+    max_depth: int = 8,
+    max_degree: int = MAX_DEGREE,
+    max_nodes: int = MAX_NODES,
+) -> Optional[List]:
+    """Find a shortest path between two nodes along some edge types
+
+    The search runs from both ends, always growing the smaller frontier by
+    one level, so it visits about the square root of the nodes a search
+    from one end would. Hubs are skipped as in ``expand``. Returns None when
+    the nodes are more than ``max_depth`` edges apart, or when more than
+    ``max_nodes`` nodes were visited.
+    """
+    _check_edges(edge_types)
+    if source == target:
+        return [source]
+    parents = ({source: None}, {target: None})
+    frontiers = ([source], [target])
+    depth = 0
+    while frontiers[0] and frontiers[1] and depth < max_depth:
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        seen, other = parents[side], parents[1 - side]
+        following = []
+        for node in frontiers[side]:
+            if node not in (source, target) and graph.degree(node) > max_degree:
+                continue
+            for neighbor in neighbors(graph, node, edge_types):
+                if neighbor in seen:
+                    continue
+                seen[neighbor] = node
+                if neighbor in other:
+                    return _join(parents, neighbor)
+                following.append(neighbor)
+        if len(parents[0]) + len(parents[1]) > max_nodes:
+            return None
+        if side == 0:
+            frontiers = (following, frontiers[1])
+        else:
+            frontiers = (frontiers[0], following)
+        depth += 1
+    return None
+
+
+def _join(parents: Tuple[Dict, Dict], middle) -> List:
+    path = []
+    node = middle
+    while node is not None:
+        path.append(node)
+        node = parents[0][node]
+    path.reverse()
+    node = parents[1][middle]
+    while node is not None:
+        path.append(node)
+        node = parents[1][node]
+    return path
+
+
+class Collaborations:
+    """Number of titles shared by every pair of people
+
+    Co-stars and collaborators are read from the counts of a person instead
+    of walking the graph, so questions on prolific people stay fast. The
+    people of every title are kept to remove it later. Updates replace the
+    counts of the people they change, never change them in place, so a
+    reader going through the collaborators of a person sees one version.
+    """
+
+    def __init__(self):
+        self.counts: Dict[str, Dict[str, int]] = {}
+        self.people: Dict[str, Tuple[str, ...]] = {}
+
+    @classmethod
+    def build(cls, graph, titles: Iterable[str]) -> "Collaborations":
+        collaborations = cls()
+        counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        for title in titles:
+            people = tuple(dict.fromkeys(neighbors(graph, title, PERSON_EDGES)))
+            collaborations.people[title] = people
+            for person in people:
+                shared = counts[person]
+                for other in people:
+                    if other != person:
+                        shared[other] += 1
+        collaborations.counts = {person: dict(c) for person, c in counts.items()}
+        return collaborations
+
+    def update(self, graph, added: Iterable[str], removed: Iterable[str]):
+        """Count the people of the added titles, uncount those of the removed
+
+        A title both removed and added was replaced.
+        """
+        changes: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        for title in removed:
+            for person, other in self._pairs(self.people.pop(title, ())):
+                changes[person][other] -= 1
+        for title in added:
+            people = tuple(dict.fromkeys(neighbors(graph, title, PERSON_EDGES)))
+            self.people[title] = people
+            for person, other in self._pairs(people):
+                changes[person][other] += 1
+
+        for person, change in changes.items():
+            shared = dict(self.counts.get(person, {}))
+            for other, delta in change.items():
+                count = shared.get(other, 0) + delta
+                if count > 0:
+                    shared[other] = count
+                else:
+                    shared.pop(other, None)
+            if shared:
+                self.counts[person] = shared
+            else:
+                self.counts.pop(person, None)
+
+    @staticmethod
+    def _pairs(people: Tuple[str, ...]):
+        return ((a, b) for a in people for b in people if a != b)
+
+    def top(self, people: Sequence[str], k: int = 10) -> List[Tuple[str, int]]:
+        """Get the k people sharing titles with all the given people
+
+        They are ranked by the fewest titles shared with one of them, then
+        by the titles shared in total.
+        """
+        shared = [self.counts.get(person, {}) for person in people]
+        if not shared:
+            return []
+        smallest = min(shared, key=len)
+        ranked = []
+        for other in smallest:
+            if other in people:
+                continue
+            counts = [s.get(other, 0) for s in shared]
+            if all(counts):
+                ranked.append((min(counts), sum(counts), other))
+        top = heapq.nsmallest(k, ranked, key=lambda x: (-x[0], -x[1], x[2]))
+        return [(other, total) for _, total, other in top]
+
+
+def parse_collaboration(text: str) -> Tuple[str, List[str]]:
+    """Split a tool input into ``("path", [a, b])`` or ``("with", names)``
+
+    ``A -> B`` asks for a path between two people, ``A, B and C`` for the
+    people who worked with all of them.
+    """
+    text = text.strip().strip('"').strip()
+    if "->" in text:
+        names = [name.strip() for name in text.split("->")]
+        if len(names) != 2 or not all(names):
+            raise ValueError("A path goes from one person to another, as A -> B")
+        return "path", names
+    names = [name.strip() for name in re.split(r",|\band\b|&", text) if name.strip()]
+    if not names:
+        raise ValueError("Give the names of one or more people")
+    return "with", names
+
+
+def collaboration_answer(database, text: str) -> str:
+    """Answer a collaboration question for the agent, as text"""
+    try:
+        kind, names = parse_collaboration(text)
+        if kind == "path":
+            path = database.shortest_path(*names)
+            if path is None:
+                return f"No collaboration path between {names[0]} and {names[1]}"
+            return " -> ".join(str(node) for node in path)
+        people = database.co_occurring(*names)
+    except KeyError as e:
+        return f"No actor or director named {e.args[0]}"
+    except ValueError as e:
+        return str(e)
+    if not people:
+        return f"Nobody worked with all of {', '.join(names)}"
+    return "\n".join(f"{person}: {count} shared movies" for person, count in people)
@@ -0,0 +1,107 @@
+"""Measure the aggregate views against a pandas group-by per question
+
+For each catalog size, times counting the cleaned csv chunks into the
+views, reading the view of a director, actor, genre or genre of a decade,
+first from the columns then again, and the same statistics computed with
+a pandas filter and group-by over the whole catalog, as a question would
+without the views. It also times an update of a few titles, and the
+ranking of the directors by mean rating, first sorted from the columns,
+then merged with the groups the updates changed.
+
+Usage:
+    python benchmarks/aggregate_views.py --sizes 1000,10000,100000 --queries 200
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from aggregates import AggregateViews, decade_of  # noqa: E402
+from database import MovieDatabase  # noqa: E402
+from suite import synthetic_csv  # noqa: E402
+
+COLUMNS = {"director": "Director", "actor": "Actors", "genre": "Genre"}
+
+
+def grouped(df: pd.DataFrame, kind: str, key, top_n: int = 10):
+    """Compute the view of a group from the catalog frame"""
+    if kind == "genre_decade":
+        genre, decade = key
+        rows = df[df["Genre"].map(lambda g: genre in g) & (df["Decade"] == decade)]
+    else:
+        rows = df[df[COLUMNS[kind]].map(lambda values: key in values)]
+    stats = rows.agg({"Rating": "mean", "Runtime": ["mean", "min", "max"]})
+    top = rows.sort_values(["Rating", "Title"], ascending=[False, True]).head(top_n)
+    return len(rows), stats, list(zip(top["Title"], top["Rating"]))
+
+
+def p50(func, items) -> float:
+    """Get the median time of a function over the items in microseconds"""
+    timings = []
+    for item in items:
+        start = time.perf_counter()
+        func(*item)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default="data/imdb_top_1000.csv")
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    for size in [int(s) for s in args.sizes.split(",")]:
+        csv_file = synthetic_csv(args.csv, size)
+        database = MovieDatabase(csv_file)
+        frames = list(database.read_csv_chunks(csv_file))
+        start = time.perf_counter()
+        AggregateViews.build(frames)
+        build = time.perf_counter() - start
+        df = pd.concat(frames).drop_duplicates("Title", keep="last")
+        df["Decade"] = df["Year"].map(decade_of)
+
+        rng = random.Random(0)
+        questions = []
+        for _ in range(args.queries):
+            movie = rng.choice(frames[0].to_dict(orient="records"))
+            kind = rng.choice(("director", "actor", "genre", "genre_decade"))
+            if kind == "genre_decade":
+                key = rng.choice(movie["Genre"]), decade_of(movie["Year"])
+            else:
+                key = rng.choice(movie[COLUMNS[kind]])
+            questions.append((kind, key))
+
+        titles = list(database.index.titles)
+        updates = []
+        for _ in range(20):
+            movies = [database.movie(t) for t in rng.sample(titles, 10)]
+            for movie in movies:
+                movie["Rating"] = round(rng.uniform(7.5, 9.5), 1)
+            updates.append((movies, []))
+
+        first = p50(database.aggregates.view, questions)
+        viewed = p50(database.aggregates.view, questions)
+        scanned = p50(lambda kind, key: grouped(df, kind, key), questions[:20])
+        ranked = p50(database.rank_groups, [("director", "mean_rating")])
+        updated = p50(database.aggregates.update, updates)
+        changed = p50(database.rank_groups, [("director", "mean_rating")] * 20)
+        print(
+            f"{size:>7} titles: build {build * 1e3:8.1f} ms  "
+            f"view p50 {first:5.1f} us, read again {viewed:4.1f} us  "
+            f"group-by p50 {scanned:8.1f} us  "
+            f"update of 10 p50 {updated:7.1f} us  "
+            f"rank {ranked / 1e3:6.1f} ms, after updates {changed:6.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
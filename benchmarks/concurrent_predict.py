@@ -0,0 +1,72 @@
+"""Check per-request thoughts and throughput of the agent pool under load
+
+Every request runs the full MovieAgent with a stub LLM that sleeps on each
+call, through the same AgentPool and callback capture as /predict.
+
+Usage:
+    python benchmarks/concurrent_predict.py --requests 32 --latency 0.1
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from agent import MovieAgent  # noqa: E402
+from database import MovieDatabase  # noqa: E402
+from pool import AgentPool  # noqa: E402
+from run import get_result_and_thought_using_graph  # noqa: E402
+from stubs import StubLLM, StubSearch, director_questions  # noqa: E402
+
+
+async def run_load(pool, agent, database, questions):
+    return await asyncio.gather(
+        *(
+            pool.run(get_result_and_thought_using_graph, agent, database, question)
+            for question in questions
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default="data/imdb_top_1000.csv")
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.1)
+    args = parser.parse_args()
+
+    database = MovieDatabase(args.csv)
+    completions = director_questions(database, args.requests)
+    questions = list(completions)
+
+    print(f"{'workers':>7} {'seconds':>8} {'req/s':>7} {'wrong thoughts':>15}")
+    for workers in [1, 2, 4, 8, 16]:
+        llm = StubLLM(completions=completions, latency=args.latency)
+        agent = MovieAgent.initialize(database, llm=llm, search=StubSearch())
+        pool = AgentPool(max_workers=workers, max_queue=len(questions))
+        start = time.perf_counter()
+        # The default stdout handler still prints, keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = asyncio.run(run_load(pool, agent, database, questions))
+        elapsed = time.perf_counter() - start
+
+        # A thought must mention its own question and no other one
+        wrong = sum(
+            question not in result["thought"]
+            or any(
+                other in result["thought"] for other in questions if other != question
+            )
+            for question, result in zip(questions, results)
+        )
+        print(
+            f"{workers:>7} {elapsed:>8.2f} {len(questions) / elapsed:>7.1f} {wrong:>15}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Measure how often the fast path answers and how much latency it saves
+
+Structured questions are generated from the names in the graph and mixed with
+free-form ones that need the agent. Every question is answered by the fast
+path when possible and by the agent with a stub LLM otherwise.
+
+Usage:
+    python benchmarks/fast_path_rate.py --questions 200 --latency 0.5
+"""
+import argparse
+import contextlib
+import io
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from agent import MovieAgent  # noqa: E402
+from database import MovieDatabase  # noqa: E402
+from fast_path import FastPath  # noqa: E402
+from run import get_result_and_thought_using_graph  # noqa: E402
+from stubs import StubLLM, StubSearch  # noqa: E402
+
+TEMPLATES = [
+    ("Movies with {actor}", {"actor"}),
+    ("Show me movies directed by {director}", {"director"}),
+    ("{genre} movies from {year}", {"genre", "year"}),
+    ("{genre} movies with {actor}", {"genre", "actor"}),
+    ("Which movies did {director} make that {actor} liked?", {"director", "actor"}),
+    ("Movies similar to the ones {actor} is famous for", {"actor"}),
+    ("Best {genre} movie of the {decade}s", {"genre", "decade"}),
+]
+
+
+def questions(database: MovieDatabase, count: int, seed: int = 0):
+    """Fill the templates with names drawn from the graph"""
+    rng = random.Random(seed)
+    by_type = {}
+    for node, data in database.graph.nodes(data=True):
+        by_type.setdefault(data["type"], []).append(node)
+    result = []
+    for _ in range(count):
+        template, _ = rng.choice(TEMPLATES)
+        year = rng.choice(by_type["year"])
+        result.append(
+            template.format(
+                actor=rng.choice(by_type["actor"]),
+                director=rng.choice(by_type["director"]),
+                genre=rng.choice(by_type["genre"]),
+                year=year,
+                decade=year // 10 * 10,
+            )
+        )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default="data/imdb_top_1000.csv")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    database = MovieDatabase(args.csv)
+    fast_path = FastPath(database)
+    llm = StubLLM(latency=args.latency)
+    agent = MovieAgent.initialize(database, llm=llm, search=StubSearch())
+
+    fast, slow = [], []
+    for question in questions(database, args.questions):
+        start = time.perf_counter()
+        if fast_path.answer(question) is not None:
+            fast.append(time.perf_counter() - start)
+            continue
+        # The stub translates every question to the same graph query
+        llm.completions = {question: "genre: Drama\n"}
+        with contextlib.redirect_stdout(io.StringIO()):
+            get_result_and_thought_using_graph(agent, database, question)
+        slow.append(time.perf_counter() - start)
+
+    hit_rate = len(fast) / (len(fast) + len(slow))
+    fast_ms = statistics.mean(fast) * 1000 if fast else 0.0
+    slow_ms = statistics.mean(slow) * 1000 if slow else 0.0
+    print(f"fast path hit rate: {hit_rate:.1%}")
+    print(f"mean latency, fast path: {fast_ms:.2f} ms, agent: {slow_ms:.0f} ms")
+    print(f"latency saved per fast path hit: {slow_ms - fast_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Compare memory and lookup latency of the networkx and compact graph backends
+
+Usage:
+    python benchmarks/graph_backends.py --scale 50
+"""
+import argparse
+import copy
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from database import BACKENDS, MovieDatabase  # noqa: E402
+from run import get_attributes_from_node  # noqa: E402
+
+
+def scaled_csv(csv_file: str, scale: int) -> str:
+    """Write a copy of the catalog repeated ``scale`` times with unique titles"""
+    df = pd.read_csv(csv_file)
+    copies = []
+    for i in range(scale):
+        part = df.copy()
+        if i:
+            part["Series_Title"] = part["Series_Title"] + f" ({i})"
+        copies.append(part)
+    path = Path(tempfile.mkdtemp()) / f"imdb_x{scale}.csv"
+    pd.concat(copies).to_csv(path, index=False)
+    return str(path)
+
+
+def timeit(func, args_list):
+    """Return the median latency of func over args_list in microseconds"""
+    timings = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default="data/imdb_top_1000.csv")
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--samples", type=int, default=1000)
+    args = parser.parse_args()
+
+    csv_file = scaled_csv(args.csv, args.scale) if args.scale > 1 else args.csv
+    loader = MovieDatabase.__new__(MovieDatabase)
+    features = loader.get_features(loader.process_csv(csv_file))
+    print(
+        f"{'backend':<10} {'graph MB':>9} {'build s':>8} {'adj us':>8} "
+        f"{'attrs us':>9} {'query us':>9}"
+    )
+
+    for backend in BACKENDS:
+        # Retained memory of the graph alone, features are copied inside the trace
+        tracemalloc.start()
+        start = time.perf_counter()
+        features_copy = copy.deepcopy(features)
+        if backend == "compact":
+            graph = loader.create_compact_graph(*features_copy)
+        else:
+            graph = loader.create_graph(*features_copy)
+        del features_copy
+        build = time.perf_counter() - start
+        memory = tracemalloc.get_traced_memory()[0] / 2**20
+        tracemalloc.stop()
+
+        database = MovieDatabase(csv_file, backend=backend)
+        rng = random.Random(0)
+        titles = rng.sample(
+            database.index.titles, min(args.samples, len(database.index.titles))
+        )
+        # Bind this backend's objects, they are deleted at the end of the loop
+        adjacency = timeit(lambda t, g=graph: dict(g[t]), [(t,) for t in titles])
+        attributes = timeit(
+            lambda t, db=database: get_attributes_from_node(db.graph, t),
+            [(t,) for t in titles],
+        )
+        query = timeit(
+            lambda t, db=database: db.query_movies(title=t),
+            [(t,) for t in titles[:100]],
+        )
+        print(
+            f"{backend:<10} {memory:>9.1f} {build:>8.2f} {adjacency:>8.1f} "
+            f"{attributes:>9.1f} {query:>9.1f}"
+        )
+        del graph, database
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Measure multi-hop traversals of the movie graph on synthetic catalogs
+
+For each catalog size, times the co-stars of a person and the people who
+worked with two people, read from the precomputed collaboration counts and
+by walking the graph, for the most prolific people. It also times the
+collaboration path between two people found from both ends and from one
+end, and a 3-hop expansion over every edge type with and without the hub
+limit, which reaches genres and years on its second hop.
+
+Usage:
+    python benchmarks/graph_traversal.py --sizes 1000,10000,100000 --queries 200
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from database import MovieDatabase  # noqa: E402
+from suite import synthetic_csv  # noqa: E402
+from traversal import PERSON_EDGES, PERSON_TYPES, expand, neighbors  # noqa: E402
+
+
+def walked_costars(graph, person):
+    """Count the co-stars of a person by walking its titles"""
+    counts = {}
+    for title in neighbors(graph, person, PERSON_EDGES):
+        for other in set(neighbors(graph, title, PERSON_EDGES)):
+            if other != person:
+                counts[other] = counts.get(other, 0) + 1
+    return counts
+
+
+def walked_common(graph, a, b):
+    """Find the people who worked with both, by walking the graph"""
+    first, second = walked_costars(graph, a), walked_costars(graph, b)
+    return sorted(first.keys() & second.keys() - {a, b})
+
+
+def one_sided_path(graph, source, target, max_depth: int = 8):
+    """Breadth-first search from the source only, returning the path length"""
+    seen, frontier = {source}, [source]
+    for depth in range(1, max_depth + 1):
+        following = []
+        for node in frontier:
+            for neighbor in neighbors(graph, node, PERSON_EDGES):
+                if neighbor == target:
+                    return depth
+                if neighbor not in seen:
+                    seen.add(neighbor)
+                    following.append(neighbor)
+        frontier = following
+    return None
+
+
+def p50(func, items) -> float:
+    """Get the median time of a function over the items in microseconds"""
+    timings = []
+    for item in items:
+        start = time.perf_counter()
+        func(*item)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default="data/imdb_top_1000.csv")
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    for size in [int(s) for s in args.sizes.split(",")]:
+        database = MovieDatabase(synthetic_csv(args.csv, size))
+        graph = database.graph
+        start = time.perf_counter()
+        collaborations = database.collaborations
+        build = time.perf_counter() - start
+
+        rng = random.Random(0)
+        people = [
+            node
+            for node, data in graph.nodes(data=True)
+            if data["type"] in PERSON_TYPES and node in collaborations.counts
+        ]
+        # The most prolific people, and pairs of them with a collaborator in common
+        people.sort(key=lambda p: -len(collaborations.counts[p]))
+        singles = [(rng.choice(people[:200]),) for _ in range(args.queries)]
+        pairs = []
+        for (person,) in singles:
+            middle = rng.choice(list(collaborations.counts[person]))
+            pairs.append((person, rng.choice(list(collaborations.counts[middle]))))
+        ends = [tuple(rng.sample(people, 2)) for _ in range(args.queries // 4)]
+        starts = [(rng.choice(people),) for _ in range(args.queries // 4)]
+
+        rows = {
+            "co-stars": (
+                p50(database.co_occurring, singles),
+                p50(lambda p: walked_costars(graph, p), singles),
+            ),
+            "worked with both": (
+                p50(database.co_occurring, pairs),
+                p50(lambda a, b: walked_common(graph, a, b), pairs),
+            ),
+            "path": (
+                p50(database.shortest_path, ends),
+                p50(lambda a, b: one_sided_path(graph, a, b), ends),
+            ),
+            "3-hop expand": (
+                p50(lambda p: expand(graph, p, 3), starts),
+                p50(lambda p: expand(graph, p, 3, max_degree=len(graph)), starts),
+            ),
+        }
+        print(f"{size} titles, collaboration counts built in {build:.2f} s")
+        for name, (fast, slow) in rows.items():
+            print(f"  {name:<17} p50 {fast:9.1f} us  baseline {slow:11.1f} us")
+
+
+if __name__ == "__main__":
+    main()
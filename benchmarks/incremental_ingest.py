@@ -0,0 +1,91 @@
+"""Compare applying a delta of movies with rebuilding the indexes
+
+For each catalog size a synthetic catalog is loaded with its name and
+similarity indexes, then deltas of new titles and removals are applied
+with ``apply_changes``. The time per delta is compared with a full rebuild
+of the attribute, name and similarity indexes, and query_movies latency is
+measured before and after the updates.
+
+Usage:
+    python benchmarks/incremental_ingest.py --sizes 1000,10000,50000 --delta 100
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from attribute_index import AttributeIndex  # noqa: E402
+from database import MovieDatabase  # noqa: E402
+from name_index import NameIndex  # noqa: E402
+from query_batch import query_mix  # noqa: E402
+from semantic_index import SemanticIndex  # noqa: E402
+from suite import synthetic_csv  # noqa: E402
+
+
+def query_p50(database: MovieDatabase, queries) -> float:
+    """Get the median query_movies time in microseconds"""
+    timings = []
+    for params in queries:
+        start = time.perf_counter()
+        database.query_movies.__wrapped__(database, **params)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default="data/imdb_top_1000.csv")
+    parser.add_argument("--sizes", default="1000,10000,50000")
+    parser.add_argument("--delta", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    for size in [int(s) for s in args.sizes.split(",")]:
+        database = MovieDatabase(synthetic_csv(args.csv, size))
+        database.names, database.semantic
+        queries = query_mix(database, args.queries)
+        before = query_p50(database, queries)
+
+        # New titles come from another synthetic catalog
+        additions, _ = database.read_delta(
+            synthetic_csv(args.csv, args.delta * args.rounds, seed=1)
+        )
+        timings = []
+        for i in range(args.rounds):
+            upserts = additions[i * args.delta : (i + 1) * args.delta]
+            live = [
+                title
+                for title in rng.sample(list(database.index.titles), args.delta)
+                if database.graph.has_node(title)
+                and database.graph.nodes[title]["type"] == "title"
+            ]
+            removals = [t for t in live if t not in {m["Title"] for m in upserts}]
+            start = time.perf_counter()
+            database.apply_changes(upserts, removals[: args.delta // 10])
+            timings.append(time.perf_counter() - start)
+        # Removed titles can no longer be queried
+        after = query_p50(database, query_mix(database, args.queries))
+
+        start = time.perf_counter()
+        AttributeIndex(database.graph)
+        NameIndex(database.graph)
+        SemanticIndex.build(database.graph, database.index)
+        rebuild = time.perf_counter() - start
+
+        print(
+            f"{size:>7} titles: delta of {args.delta} "
+            f"p50 {statistics.median(timings) * 1e3:8.1f} ms  "
+            f"max {max(timings) * 1e3:8.1f} ms  rebuild {rebuild * 1e3:8.1f} ms  "
+            f"query p50 {before:6.1f} -> {after:6.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
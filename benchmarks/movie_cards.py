@@ -0,0 +1,62 @@
+"""Measure the cost and size of the movie cards of a response
+
+Times the cards of query_movies results built from the observation text
+and from the recorded results, with every field and with a projection,
+and prints the JSON size of the movies of a response.
+
+Usage:
+    python benchmarks/movie_cards.py --queries 2000 --fields title,year,Rating
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from database import MovieDatabase  # noqa: E402
+from query_batch import query_mix  # noqa: E402
+from results import format_results  # noqa: E402
+from run import get_movies_from_observation  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default="data/imdb_top_1000.csv")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--fields", default="title,year,Rating")
+    args = parser.parse_args()
+
+    database = MovieDatabase(args.csv)
+    results = [
+        database.query_movies(**params) for params in query_mix(database, args.queries)
+    ]
+    results = [result for result in results if result]
+    fields = args.fields.split(",")
+
+    runs = {
+        "parsed text, all fields": (False, None),
+        "recorded, all fields": (True, None),
+        f"recorded, {args.fields}": (True, fields),
+    }
+    for name, (recorded, projection) in runs.items():
+        timings, size = [], 0
+        for result in results:
+            observation = format_results(result)
+            start = time.perf_counter()
+            movies = get_movies_from_observation(
+                database, observation, projection, result if recorded else None
+            )
+            timings.append(time.perf_counter() - start)
+            size += len(json.dumps(movies))
+        print(
+            f"{name:<28} p50 {statistics.median(timings) * 1e6:7.1f} us  "
+            f"{size / len(results):7.0f} bytes per response"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Measure autocomplete and typo resolution latency of the name index
+
+Prefix queries are the first characters of random names, typo queries are
+random names with one or two characters deleted, replaced or swapped.
+
+Usage:
+    python benchmarks/name_lookup.py --scale 100
+"""
+import argparse
+import random
+import statistics
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from database import MovieDatabase  # noqa: E402
+from graph_backends import scaled_csv  # noqa: E402
+from name_index import NameIndex  # noqa: E402
+
+
+def misspell(name: str, rng: random.Random, edits: int) -> str:
+    """Apply random single character edits to a name"""
+    for _ in range(edits):
+        i = rng.randrange(len(name) - 1)
+        edit = rng.choice(["delete", "replace", "swap"])
+        if edit == "delete":
+            name = name[:i] + name[i + 1 :]
+        elif edit == "replace":
+            name = name[:i] + rng.choice(string.ascii_lowercase) + name[i + 1 :]
+        else:
+            name = name[:i] + name[i + 1] + name[i] + name[i + 2 :]
+    return name
+
+
+def percentiles(timings):
+    return statistics.median(timings), statistics.quantiles(timings, n=20)[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default="data/imdb_top_1000.csv")
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    csv_file = scaled_csv(args.csv, args.scale) if args.scale > 1 else args.csv
+    database = MovieDatabase(csv_file, backend="compact")
+    start = time.perf_counter()
+    names = NameIndex(database.graph)
+    print(
+        f"{len(names.names)} names, index built in {time.perf_counter() - start:.2f}s"
+    )
+
+    rng = random.Random(0)
+    long_names = [name for name in names.names if len(name) >= 8]
+    sample = [rng.choice(long_names) for _ in range(args.queries)]
+
+    timings = []
+    for name in sample:
+        prefix = name[: rng.randint(3, 8)]
+        start = time.perf_counter()
+        names.complete(prefix)
+        timings.append((time.perf_counter() - start) * 1e6)
+    p50, p95 = percentiles(timings)
+    print(f"complete  p50 {p50:.0f} us, p95 {p95:.0f} us")
+
+    timings, resolved = [], 0
+    for name in sample:
+        typo = misspell(name, rng, rng.randint(1, 2))
+        start = time.perf_counter()
+        match = names.resolve(typo)
+        timings.append((time.perf_counter() - start) * 1e6)
+        resolved += match is not None and match.lower() == name.lower()
+    p50, p95 = percentiles(timings)
+    print(f"resolve   p50 {p50:.0f} us, p95 {p95:.0f} us")
+    print(f"typos resolved to the original name: {resolved / len(sample):.1%}")
+
+
+if __name__ == "__main__":
+    main()
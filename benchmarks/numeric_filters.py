@@ -0,0 +1,115 @@
+"""Measure numeric filters and ordering against a Python scan of the titles
+
+For each catalog size, queries mixing a genre or an actor with year,
+rating and runtime ranges and an order are timed with the sorted columns
+of query_movies and with a scan reading the attributes of every title
+node, as the filters would run without the numeric index. Queries with
+only an order read their top titles from the sorted columns.
+
+Usage:
+    python benchmarks/numeric_filters.py --sizes 1000,10000,100000 --queries 200
+"""
+import argparse
+import heapq
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from database import MovieDatabase  # noqa: E402
+from numeric_index import numeric_ranges, parse_order, title_values  # noqa: E402
+from results import MovieResult  # noqa: E402
+from suite import synthetic_csv  # noqa: E402
+
+ORDERS = ("-rating", "rating", "-year", "year", "-runtime", "runtime")
+
+
+def filter_queries(database: MovieDatabase, count: int, seed: int = 0):
+    """Sample queries with ranges, with and without a queried attribute"""
+    rng = random.Random(seed)
+    titles = list(database.index.titles)
+    queries = []
+    for i in range(count):
+        movie = database.movie(rng.choice(titles))
+        params = {}
+        if i % 3 == 0:
+            params["genre"] = rng.choice(movie["Genre"])
+        elif i % 3 == 1:
+            params["actor"] = rng.choice(movie["Actors"])
+        first = rng.randint(1950, 2015)
+        params["year_range"] = [first, rng.choice([None, first + 10])]
+        params["min_rating"] = rng.choice([7.8, 8.0, 8.3])
+        if rng.random() < 0.5:
+            params["max_runtime"] = rng.choice([100, 120, 150])
+        params["order_by"] = rng.choice(ORDERS)
+        queries.append(params)
+    return queries
+
+
+def scan(database: MovieDatabase, params, k: int = 5):
+    """Filter, score and order every title in Python"""
+    attributes = database.get_queried_attributes(
+        genre=params.get("genre"), actor=params.get("actor")
+    )
+    ranges = numeric_ranges(
+        params.get("year_range"), params.get("min_rating"), params.get("max_runtime")
+    )
+    column, descending = parse_order(params["order_by"])
+    index = database.index
+    matches = index.candidates(attributes) if attributes else None
+    rows = []
+    for position, title in enumerate(index.titles):
+        values = title_values(database.graph, title)
+        if all(low <= values[c] <= high for c, (low, high) in ranges.items()):
+            count = matches.get(position, 0) if attributes else 0
+            if attributes and not count:
+                continue
+            value = -values[column] if descending else values[column]
+            rows.append((-count, value, position, title, count))
+    top = heapq.nsmallest(k, rows)
+    total = len(attributes)
+    return [MovieResult(t, c / total if total else 1.0) for _, _, _, t, c in top]
+
+
+def p50(func, queries) -> float:
+    """Get the median time of a function over the queries in microseconds"""
+    timings = []
+    for params in queries:
+        start = time.perf_counter()
+        func(params)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default="data/imdb_top_1000.csv")
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    for size in [int(s) for s in args.sizes.split(",")]:
+        database = MovieDatabase(synthetic_csv(args.csv, size))
+        queries = filter_queries(database, args.queries)
+        start = time.perf_counter()
+        database.numeric
+        build = time.perf_counter() - start
+
+        query = database.query_movies.__wrapped__
+        indexed = p50(lambda params: query(database, **params), queries)
+        ordered = [q for q in queries if "genre" not in q and "actor" not in q]
+        top_k = p50(lambda params: query(database, **params), ordered)
+        scanned = p50(lambda params: scan(database, params), queries[:20])
+        print(
+            f"{size:>7} titles: build {build * 1e3:7.1f} ms  "
+            f"scan p50 {scanned:10.1f} us  indexed p50 {indexed:7.1f} us  "
+            f"ordered top-5 p50 {top_k:6.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
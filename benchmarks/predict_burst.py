@@ -0,0 +1,157 @@
+"""Replay a burst of repeated /predict messages with and without shared answers
+
+A few distinct messages that need the agent are each sent many times, in
+different cases and punctuation, by concurrent clients, as when one question
+goes viral. The stub LLM sleeps on every call like a remote model. Each mode
+runs in its own process, with IMDB_ANSWER_CACHE_SIZE=0 for the baseline, and
+reports the agent runs and LLM calls, how the other messages were answered,
+and the latency. Every distinct message is then sent again with the ETag of
+its answer, to count the 304 revalidations.
+
+Usage:
+    python benchmarks/predict_burst.py --messages 8 --repeat 25 --clients 16
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+MODES = {"baseline": {"IMDB_ANSWER_CACHE_SIZE": "0"}, "shared": {}}
+
+
+def variants(question: str, count: int):
+    """Phrase a question in ``count`` trivially different ways"""
+    forms = [question, question.lower(), question.upper(), f"  {question}  "]
+    return [forms[i % len(forms)] + "?!."[i % 3] * (i // 4 % 2) for i in range(count)]
+
+
+def run_burst(args) -> dict:
+    """Send the burst to the app, in this process"""
+    from agent import MovieAgent
+    from database import MovieDatabase
+    from endpoints import service
+    from fastapi.testclient import TestClient
+    from main import app
+    from stubs import StubLLM, StubSearch, director_questions
+
+    database = MovieDatabase(args.csv)
+    recorded = director_questions(database, args.messages)
+    distinct, messages, completions = [], [], {}
+    for question, completion in recorded.items():
+        question = f"Could you recommend {question.lower()} for a quiet evening"
+        distinct.append(question)
+        for variant in variants(question, args.repeat):
+            messages.append(variant)
+            completions[variant.strip()] = completion
+    random.Random(0).shuffle(messages)
+
+    llm = StubLLM(completions=completions, latency=args.latency)
+    initialize = MovieAgent.initialize.__func__
+
+    def offline_initialize(cls, movie_graph, *init_args, **kwargs):
+        kwargs.update(llm=llm, search=StubSearch(latency=args.latency))
+        return initialize(cls, movie_graph, *init_args, **kwargs)
+
+    patch = mock.patch.object(MovieAgent, "initialize", classmethod(offline_initialize))
+    with patch, TestClient(app) as client:
+        if not service.wait(timeout=300):
+            raise RuntimeError(f"Service did not start: {service.errors}")
+
+        def predict(message: str):
+            start = time.perf_counter()
+            response = client.get("/predict", params={"message": message})
+            return response.status_code, time.perf_counter() - start
+
+        # The default stdout handler still prints the agent trace, keep it quiet
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(args.clients) as executor:
+                replies = list(executor.map(predict, messages))
+            elapsed = time.perf_counter() - start
+            counts = service.answers.stats() if service.answers else {}
+            llm_calls = llm.calls
+
+            revalidated = 0
+            for message in distinct:
+                response = client.get("/predict", params={"message": message})
+                tag = response.headers.get("ETag")
+                response = client.get(
+                    "/predict",
+                    params={"message": message},
+                    headers={"If-None-Match": tag or ""},
+                )
+                revalidated += response.status_code == 304
+
+    latencies = sorted(latency for _, latency in replies)
+    statuses = {}
+    for status, _ in replies:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "requests": len(messages),
+        "statuses": statuses,
+        "runs": counts.get("run", len(messages)),
+        "cached": counts.get("cached", 0),
+        "shared": counts.get("shared", 0),
+        "llm_calls": llm_calls,
+        "seconds": elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(0.95 * (len(latencies) - 1))],
+        "revalidated": revalidated,
+        "distinct": len(distinct),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default="data/imdb_top_1000.csv")
+    parser.add_argument("--messages", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=25)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_burst(args)))
+        return
+
+    print(
+        f"{'mode':<9} {'requests':>8} {'runs':>5} {'cached':>6} {'shared':>6} "
+        f"{'LLM calls':>9} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'req/s':>7} "
+        f"{'304s':>5}"
+    )
+    # The agent only builds its clients at startup, dummy keys are enough
+    env = {"OPENAI_API_KEY": "burst", "SERPAPI_API_KEY": "burst", **os.environ}
+    for mode, variables in MODES.items():
+        output = subprocess.run(
+            [sys.executable, __file__, *sys.argv[1:], "--mode", mode],
+            env={**env, **variables},
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        errors = result["requests"] - result["statuses"].get("200", 0)
+        print(
+            f"{mode:<9} {result['requests']:>8} {result['runs']:>5} "
+            f"{result['cached']:>6} {result['shared']:>6} {result['llm_calls']:>9} "
+            f"{errors:>6} {result['p50'] * 1e3:>8.1f} {result['p95'] * 1e3:>8.1f} "
+            f"{result['requests'] / result['seconds']:>7.1f} "
+            f"{result['revalidated']:>2}/{result['distinct']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Compare query_movies_batch throughput against sequential query_movies calls
+
+Both runs start from a fresh database, so neither benefits from warm caches.
+
+Usage:
+    python benchmarks/query_batch.py --queries 5000
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from database import MovieDatabase  # noqa: E402
+
+
+def query_mix(database: MovieDatabase, count: int, seed: int = 0):
+    """Draw parameter dicts from the names in the graph, popular ones repeat"""
+    rng = random.Random(seed)
+    by_type = {}
+    for node, data in database.graph.nodes(data=True):
+        by_type.setdefault(data["type"], []).append(node)
+    fields = ["year", "genre", "director", "actor"]
+    queries = []
+    for _ in range(count):
+        if rng.random() < 0.1:
+            queries.append({"title": rng.choice(by_type["title"])})
+            continue
+        params = {}
+        for field in rng.sample(fields, rng.randint(1, 2)):
+            # Skew towards the first names to get repeated queries
+            names = by_type[field]
+            params[field] = names[int(len(names) * rng.random() ** 3)]
+        queries.append(params)
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default="data/imdb_top_1000.csv")
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--scoring", default="index")
+    args = parser.parse_args()
+
+    queries = query_mix(MovieDatabase(args.csv), args.queries)
+
+    database = MovieDatabase(args.csv, scoring=args.scoring)
+    start = time.perf_counter()
+    sequential = [database.query_movies(**params) for params in queries]
+    sequential_time = time.perf_counter() - start
+
+    database = MovieDatabase(args.csv, scoring=args.scoring)
+    start = time.perf_counter()
+    batch = database.query_movies_batch(queries)
+    batch_time = time.perf_counter() - start
+
+    assert batch == sequential
+    print(f"{'mode':<12} {'seconds':>8} {'queries/s':>10}")
+    for mode, elapsed in [("sequential", sequential_time), ("batch", batch_time)]:
+        print(f"{mode:<12} {elapsed:>8.3f} {len(queries) / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Compare query_movies latency of the index and vectorized scoring modes
+
+Queries are replayed once to warm the token caches, then timed.
+
+Usage:
+    python benchmarks/query_scoring.py --scale 100
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from database import SCORINGS, MovieDatabase  # noqa: E402
+from graph_backends import scaled_csv  # noqa: E402
+
+QUERIES = [
+    {"director": "Christopher Nolan"},
+    {"actor": "Leonardo DiCaprio", "genre": "Drama"},
+    {"year": 2002, "director": "Steven Spielberg"},
+    {"genre": "Sci-Fi", "year": 2010},
+    {"actor": "Tom Hanks"},
+    {"genre": "Drama"},
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default="data/imdb_top_1000.csv")
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--backend", default="compact")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    csv_file = scaled_csv(args.csv, args.scale) if args.scale > 1 else args.csv
+    database = MovieDatabase(csv_file, backend=args.backend)
+    print(f"{len(database.index.titles)} titles, {args.backend} backend")
+
+    rng = random.Random(0)
+    titles = rng.sample(list(database.index.titles[:1000]), 20)
+    queries = QUERIES + [{"title": title} for title in titles]
+
+    print(f"{'scoring':<12} {'p50 us':>8} {'p95 us':>8}")
+    for scoring in SCORINGS:
+        database.scoring = scoring
+        for query in queries:
+            database.query_movies(**query)
+        timings = []
+        for _ in range(args.repeat):
+            for query in queries:
+                start = time.perf_counter()
+                database.query_movies(**query)
+                timings.append((time.perf_counter() - start) * 1e6)
+        p50 = statistics.median(timings)
+        p95 = statistics.quantiles(timings, n=20)[-1]
+        print(f"{scoring:<12} {p50:>8.1f} {p95:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Measure the related titles table against scoring the catalog per query
+
+For each catalog size the table is built, then ``title`` and
+``same_attributes_as`` queries are timed with live scoring and with the
+table, and a delta of new titles is applied to a database keeping it up
+to date, compared with rebuilding it.
+
+Usage:
+    python benchmarks/related_titles.py --sizes 1000,10000 --delta 10
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from database import MovieDatabase  # noqa: E402
+from related import RELATIONS, RelatedTitles  # noqa: E402
+from suite import synthetic_csv  # noqa: E402
+
+
+def related_queries(database: MovieDatabase, count: int, seed: int = 0):
+    """Sample queries on the attributes of a single title"""
+    rng = random.Random(seed)
+    titles = list(database.index.titles)
+    queries = []
+    for _ in range(count):
+        title, relation = rng.choice(titles), rng.choice(list(RELATIONS))
+        if relation == "title":
+            queries.append({"title": title})
+        else:
+            queries.append({"same_attributes_as": {relation: title}})
+    return queries
+
+
+def query_p50(database: MovieDatabase, queries) -> float:
+    """Get the median query_movies time in microseconds"""
+    timings = []
+    for params in queries:
+        start = time.perf_counter()
+        database.query_movies.__wrapped__(database, **params)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default="data/imdb_top_1000.csv")
+    parser.add_argument("--sizes", default="1000,10000")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--delta", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    for size in [int(s) for s in args.sizes.split(",")]:
+        database = MovieDatabase(synthetic_csv(args.csv, size))
+        queries = related_queries(database, args.queries)
+        live = query_p50(database, queries)
+
+        start = time.perf_counter()
+        database.build_related(args.k)
+        build = time.perf_counter() - start
+        table = query_p50(database, queries)
+        nbytes = sum(array.nbytes for array in database.related.arrays().values())
+
+        # New titles come from another synthetic catalog
+        additions, _ = database.read_delta(synthetic_csv(args.csv, args.delta, seed=1))
+        start = time.perf_counter()
+        database.add_movies(additions)
+        update = time.perf_counter() - start
+        start = time.perf_counter()
+        RelatedTitles.build(database, args.k)
+        rebuild = time.perf_counter() - start
+
+        print(
+            f"{size:>7} titles: build {build:7.2f} s  {nbytes / 2**20:6.1f} MiB  "
+            f"query p50 {live:8.1f} -> {table:6.1f} us  "
+            f"add {args.delta} {update * 1e3:8.1f} ms  rebuild {rebuild * 1e3:9.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Compare SearchClient with plain requests against a local SerpAPI stand-in
+
+A stream of agent searches, where popular queries repeat with different
+case and spacing, is sent from several threads to a local server that
+sleeps like the real API and rejects requests above its rate limit. The
+plain client opens a connection per search and never retries; SearchClient
+caches, shares in-flight searches, pools connections and paces requests.
+
+Usage:
+    python benchmarks/search_client.py --searches 400 --distinct 60 --threads 8
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from cache import TTLCache  # noqa: E402
+from search import SearchClient  # noqa: E402
+from stubs import SearchServer  # noqa: E402
+
+
+def search_stream(searches: int, distinct: int, seed: int = 0):
+    """Draw searches from a Zipf-like popularity, with case and spacing variants"""
+    rng = random.Random(seed)
+    queries = [f"Oscar best picture {1950 + i} nominees" for i in range(distinct)]
+    weights = [1 / (rank + 1) for rank in range(distinct)]
+    stream = []
+    for query in rng.choices(queries, weights, k=searches):
+        if rng.random() < 0.3:
+            query = query.lower()
+        if rng.random() < 0.3:
+            query = query.replace(" ", "  ") + " "
+        stream.append(query)
+    return stream
+
+
+def timed_run(search, stream, threads: int):
+    """Run the searches concurrently and time each one"""
+
+    def one(query):
+        start = time.perf_counter()
+        try:
+            search(query)
+            failed = False
+        except Exception:
+            failed = True
+        return time.perf_counter() - start, failed
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        results = list(executor.map(one, stream))
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--searches", type=int, default=400)
+    parser.add_argument("--distinct", type=int, default=60)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--server-rate", type=float, default=20)
+    parser.add_argument("--client-rate", type=float, default=15)
+    args = parser.parse_args()
+
+    stream = search_stream(args.searches, args.distinct)
+    print(
+        f"{'client':>12} {'wall s':>7} {'p50 ms':>7} {'p95 ms':>7} "
+        f"{'sent':>5} {'429s':>5} {'failed':>6} {'hit rate':>8} {'saved s':>8}"
+    )
+    for name in ("requests", "SearchClient"):
+        with SearchServer(latency=args.latency, rate=args.server_rate) as server:
+            if name == "requests":
+                client = None
+
+                def search(query):
+                    response = requests.get(server.url, params={"q": query}, timeout=10)
+                    response.raise_for_status()
+                    return response.json()
+
+            else:
+                client = SearchClient(
+                    api_key="offline",
+                    url=server.url,
+                    cache=TTLCache(
+                        maxsize=4096, ttl=3600, namespace="search_benchmark"
+                    ),
+                    rate=args.client_rate,
+                    burst=int(args.client_rate),
+                    backoff=0.2,
+                )
+                search = client.run
+            wall, results = timed_run(search, stream, args.threads)
+            timings = [t for t, _ in results]
+            failed = sum(f for _, f in results)
+            stats = (
+                client.stats() if client else {"hit_rate": 0.0, "seconds_saved": 0.0}
+            )
+            print(
+                f"{name:>12} {wall:>7.2f} {statistics.median(timings) * 1e3:>7.1f} "
+                f"{statistics.quantiles(timings, n=20)[-1] * 1e3:>7.1f} "
+                f"{server.requests:>5} {server.limited:>5} {failed:>6} "
+                f"{stats['hit_rate']:>8.0%} {stats['seconds_saved']:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Measure the semantic index build time, memory and recall@10
+
+Recall compares the IVF search against an exact scan of all the vectors,
+for title queries and for short free text queries.
+
+Usage:
+    python benchmarks/semantic_search.py --scale 100
+"""
+import argparse
+import random
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from database import MovieDatabase  # noqa: E402
+from graph_backends import scaled_csv  # noqa: E402
+from semantic_index import SemanticIndex, tokenize  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default="data/imdb_top_1000.csv")
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    csv_file = scaled_csv(args.csv, args.scale) if args.scale > 1 else args.csv
+    database = MovieDatabase(csv_file, backend="compact")
+    titles = database.index.titles
+
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    index = SemanticIndex.build(database.graph, database.index)
+    build = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+    print(f"{len(titles)} titles, built in {build:.2f}s")
+    print(
+        f"index size {index.nbytes / 2**20:.1f} MiB, peak RSS +{peak / 2**10:.0f} MiB"
+    )
+
+    rng = random.Random(0)
+    positions = [rng.randrange(len(titles)) for _ in range(args.queries)]
+    queries = [index.vectors[p] for p in positions]
+    for p in positions[: args.queries // 2]:
+        overview = database.graph.nodes[titles[p]]["attributes"]["Overview"]
+        words = tokenize(overview)
+        queries.append(index.encode(" ".join(rng.sample(words, min(4, len(words))))))
+
+    exact = [set(index.search(q, 10, exact=True)[0].tolist()) for q in queries]
+    # Always search the clusters, even on catalogs small enough to scan
+    index.exact_below = 0
+    print(f"{'n_probe':>8} {'recall@10':>10} {'p50 us':>8} {'p95 us':>8}")
+    for n_probe in (1, 4, 8, 16, 32):
+        timings, hits = [], 0
+        for query, expected in zip(queries, exact):
+            start = time.perf_counter()
+            found, _ = index.search(query, 10, n_probe=n_probe)
+            timings.append((time.perf_counter() - start) * 1e6)
+            hits += len(expected & set(found.tolist()))
+        p50 = statistics.median(timings)
+        p95 = statistics.quantiles(timings, n=20)[-1]
+        recall = hits / (10 * len(queries))
+        print(f"{n_probe:>8} {recall:>10.3f} {p50:>8.0f} {p95:>8.0f}")
+
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, 10, exact=True)
+        timings.append((time.perf_counter() - start) * 1e6)
+    print(f"{'exact':>8} {1:>10.3f} {statistics.median(timings):>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Measure the import time of the app and the time until its workers are ready
+
+Each mode runs a master process that imports main.py, as an uvicorn or
+gunicorn master would, then forks the workers. Every worker starts the
+service like the app lifespan does and reports the time from its fork until
+it is ready, and its memory once ready. With IMDB_PRELOAD the master loads
+the database before forking, so the workers only load the agent and share
+the database pages, which PSS splits between them.
+
+Usage:
+    python benchmarks/service_startup.py --workers 4 --scale 50
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1] / "backend"
+
+MASTER = """
+import json, os, sys, time
+sys.path.insert(0, {backend!r})
+start = time.perf_counter()
+import main
+from endpoints import service
+imported = time.perf_counter() - start
+results, results_w = os.pipe()
+hold, hold_w = os.pipe()
+for _ in range({workers}):
+    if os.fork() == 0:
+        os.close(hold_w)
+        forked = time.perf_counter()
+        service.start()
+        service.wait()
+        ready = time.perf_counter() - forked
+        service.fast_path.answer("Movies directed by Christopher Nolan")
+        status = dict(
+            line.split(":", 1)
+            for line in open("/proc/self/smaps_rollup").read().splitlines()[1:]
+        )
+        os.write(results_w, (json.dumps({{
+            "ready": ready if service.ready else None,
+            "rss": int(status["Rss"].split()[0]) / 1024,
+            "pss": int(status["Pss"].split()[0]) / 1024,
+        }}) + "\\n").encode())
+        # Stay alive until every worker reported, so shared pages are split
+        os.read(hold, 1)
+        os._exit(0)
+os.close(results_w)
+with os.fdopen(results) as f:
+    workers = [json.loads(f.readline()) for _ in range({workers})]
+os.close(hold_w)
+for _ in workers:
+    os.wait()
+print(json.dumps({{"import": imported, "workers": workers}}))
+"""
+
+MODES = {
+    "csv": {},
+    "snapshot": {"IMDB_SNAPSHOT": "{snapshot}"},
+    "csv preload": {"IMDB_PRELOAD": "1"},
+    "snapshot preload": {"IMDB_SNAPSHOT": "{snapshot}", "IMDB_PRELOAD": "1"},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default="data/imdb_top_1000.csv")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--scale", type=int, default=1)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BACKEND))
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    from database import MovieDatabase
+    from graph_backends import scaled_csv
+
+    if args.scale > 1:
+        args.csv = scaled_csv(args.csv, args.scale)
+    snapshot = MovieDatabase.build_snapshot(args.csv)
+
+    # The agent only builds its clients at startup, dummy keys are enough
+    env = {"OPENAI_API_KEY": "startup", "SERPAPI_API_KEY": "startup"}
+    env.update(os.environ, IMDB_CSV=args.csv)
+    code = MASTER.format(backend=str(BACKEND), workers=args.workers)
+
+    print(f"{'mode':<17} {'import s':>9} {'ready s':>8} {'RSS MB':>8} {'PSS MB':>8}")
+    for mode, variables in MODES.items():
+        variables = {k: v.format(snapshot=snapshot) for k, v in variables.items()}
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            env={**env, **variables},
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        workers = result["workers"]
+        if any(worker["ready"] is None for worker in workers):
+            print(f"{mode:<17} failed to start")
+            continue
+        mean = {key: sum(w[key] for w in workers) / len(workers) for key in workers[0]}
+        print(
+            f"{mode:<17} {result['import']:>9.3f} {mean['ready']:>8.3f} "
+            f"{mean['rss']:>8.1f} {mean['pss']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Measure query_movies scaling with the number of scoring processes
+
+A synthetic catalog is scored in this process and then with 1 to N worker
+processes. Each run uses a fresh database, so the attribute caches start
+cold, and times sequential query_movies calls and one query_movies_batch
+call over the same queries.
+
+Usage:
+    python benchmarks/sharded_scoring.py --titles 200000 --shards 1,2,4,8
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from database import SCORINGS, MovieDatabase  # noqa: E402
+from query_batch import query_mix  # noqa: E402
+from suite import synthetic_csv  # noqa: E402
+
+
+def run(csv_file: str, shards: int, scoring: str, count: int):
+    """Time sequential and batched queries on a fresh database"""
+    database = MovieDatabase(csv_file, scoring=scoring, shards=shards)
+    queries = query_mix(database, count)
+    timings = []
+    for params in queries:
+        start = time.perf_counter()
+        database.query_movies(**params)
+        timings.append(time.perf_counter() - start)
+
+    # New queries, so the batch does not hit the caches of the first run
+    batch = query_mix(database, count, seed=1)
+    start = time.perf_counter()
+    database.query_movies_batch(batch)
+    batch_seconds = time.perf_counter() - start
+    if database.shards is not None:
+        database.shards.close()
+    return timings, batch_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default="data/imdb_top_1000.csv")
+    parser.add_argument("--titles", type=int, default=200000)
+    parser.add_argument("--shards", default=f"1,2,{os.cpu_count()}")
+    parser.add_argument("--scoring", choices=SCORINGS, default="index")
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    csv_file = synthetic_csv(args.csv, args.titles)
+    print(f"{args.titles} titles, {os.cpu_count()} cores, {args.scoring} scoring")
+    print(f"{'shards':>10} {'p50 ms':>8} {'p95 ms':>8} {'qps':>8} {'batch qps':>10}")
+    for shards in [0] + [int(s) for s in args.shards.split(",")]:
+        timings, batch_seconds = run(csv_file, shards, args.scoring, args.queries)
+        label = shards or "in-process"
+        p95 = statistics.quantiles(timings, n=20)[-1]
+        print(
+            f"{label:>10} {statistics.median(timings) * 1e3:>8.2f} "
+            f"{p95 * 1e3:>8.2f} {len(timings) / sum(timings):>8.0f} "
+            f"{args.queries / batch_seconds:>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
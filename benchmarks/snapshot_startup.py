@@ -0,0 +1,89 @@
+"""Measure worker startup time and memory with and without the graph snapshot
+
+Each worker is a fresh process that loads the database like an uvicorn worker
+importing endpoints.py would. RSS counts every resident page, while PSS splits
+the pages shared with the other workers, so it drops when the snapshot is used.
+
+Usage:
+    python benchmarks/snapshot_startup.py --workers 4
+"""
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1] / "backend"
+
+WORKER = """
+import json, sys, time
+sys.path.insert(0, {backend!r})
+from database import MovieDatabase
+start = time.perf_counter()
+database = {load}
+elapsed = time.perf_counter() - start
+database.query_movies(director="Christopher Nolan")
+status = dict(
+    line.split(":", 1)
+    for line in open("/proc/self/smaps_rollup").read().splitlines()[1:]
+)
+print(json.dumps({{
+    "startup": elapsed,
+    "rss": int(status["Rss"].split()[0]) / 1024,
+    "pss": int(status["Pss"].split()[0]) / 1024,
+}}))
+sys.stdout.flush()
+sys.stdin.read()
+"""
+
+LOADERS = {
+    "csv": "MovieDatabase({csv!r})",
+    "snapshot": "MovieDatabase.load_snapshot(csv_file={csv!r})",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default="data/imdb_top_1000.csv")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--scale", type=int, default=1)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BACKEND))
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    from database import MovieDatabase
+    from graph_backends import scaled_csv
+
+    if args.scale > 1:
+        args.csv = scaled_csv(args.csv, args.scale)
+
+    MovieDatabase.build_snapshot(args.csv)
+
+    print(f"{'mode':<10} {'load s':>10} {'RSS MB':>8} {'PSS MB':>8}")
+    for mode, load in LOADERS.items():
+        code = WORKER.format(backend=str(BACKEND), load=load.format(csv=args.csv))
+        # Keep all workers alive together so shared pages are split between them
+        workers = [
+            subprocess.Popen(
+                [sys.executable, "-c", code],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                text=True,
+            )
+            for _ in range(args.workers)
+        ]
+        results = [json.loads(worker.stdout.readline()) for worker in workers]
+        for worker in workers:
+            worker.communicate("")
+        mean = {
+            key: sum(result[key] for result in results) / len(results)
+            for key in results[0]
+        }
+        print(
+            f"{mode:<10} {mean['startup']:>10.3f} "
+            f"{mean['rss']:>8.1f} {mean['pss']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
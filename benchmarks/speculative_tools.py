@@ -0,0 +1,141 @@
+"""Compare sequential and speculative tool calls of the agent end to end
+
+A query set is replayed through MovieAgent with a stub LLM and a stub
+search tool, both sleeping like remote services. Each question needs web
+context and follows one of three recorded traces: search then look up the
+question in the graph, search then look up the title it found, or only
+look up the question. With ``--rephrase``, the agent rephrases the
+question in every action, as it does in real traces: it searches a few
+keywords and looks up the director, so the graph lookup is only reused when
+its parsed parameters match. The same questions run with and without
+speculation, one request at a time, and the report gives the latency of the
+requests, the extra LLM and search calls spent and how many speculative
+calls the agent used.
+
+Usage:
+    python benchmarks/speculative_tools.py --questions 30 --latency 0.2 \
+        --search-latency 0.5 --rephrase
+"""
+import argparse
+import contextlib
+import io
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from agent import MovieAgent  # noqa: E402
+from database import MovieDatabase  # noqa: E402
+from fast_path import FastPath  # noqa: E402
+from run import get_result_and_thought_using_graph  # noqa: E402
+from speculation import SpendCap  # noqa: E402
+from stubs import StubLLM, StubSearch  # noqa: E402
+
+TRACES = ("search, graph", "search, title", "graph")
+
+
+def replay_set(
+    database: MovieDatabase, count: int, rephrase: bool = False, seed: int = 0
+):
+    """Build questions with their recorded traces, search results and YAML"""
+    rng = random.Random(seed)
+    titles = [title for title in database.index.titles if ":" not in title]
+    traces, results, completions = {}, {}, {}
+    for i, title in enumerate(rng.sample(titles, count)):
+        kind = TRACES[i % len(TRACES)]
+        if rephrase:
+            director = database.movie(title)["Director"][0]
+            question = (
+                f"Which film by {director} did critics call the surprise of "
+                f"season {i}, could you check?"
+            )
+            query = f"{director} surprise of season {i} critics"
+            lookup = f"movies directed by {director}"
+            completions[question] = completions[lookup] = f"director: {director}\n"
+        else:
+            question = (
+                query
+            ) = lookup = f"Which movie did critics call the surprise of season {i}?"
+            completions[question] = f"title: {title}\n"
+        results[query] = f"Critics called {title} the surprise of the season."
+        completions[title] = f"title: {title}\n"
+        if kind == "search, graph":
+            traces[question] = [("Search", query), ("Movies_chain", lookup)]
+        elif kind == "search, title":
+            traces[question] = [("Search", query), ("Movies_chain", title)]
+        else:
+            traces[question] = [("Movies_chain", lookup)]
+    return traces, results, completions
+
+
+def run(database, args, speculate: bool):
+    """Replay the questions one by one and time every request"""
+    traces, results, completions = replay_set(database, args.questions, args.rephrase)
+    llm = StubLLM(completions=completions, traces=traces, latency=args.latency)
+    search = StubSearch(results, latency=args.search_latency)
+    searches = []
+    search_run = search.run
+    search.run = lambda query: searches.append(query) or search_run(query)
+    agent = MovieAgent.initialize(
+        database,
+        llm=llm,
+        search=search,
+        speculate=(lambda question: True) if speculate else None,
+        speculation_budget=SpendCap(args.budget),
+        parse=FastPath(database).parse,
+    )
+    # The outcome counters are shared by every speculator of the process
+    before = {}
+    if agent.speculator is not None:
+        before = {
+            name: counter.value
+            for name, counter in agent.speculator._outcomes["used"].items()
+        }
+    timings = []
+    # The default stdout handler still prints, keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        for question in traces:
+            start = time.perf_counter()
+            get_result_and_thought_using_graph(agent, database, question)
+            timings.append(time.perf_counter() - start)
+    # Let the speculative calls nobody used finish before counting them
+    used = {}
+    if agent.speculator is not None:
+        agent.speculator._executor.shutdown(wait=True)
+        for name, counter in agent.speculator._outcomes["used"].items():
+            used[name] = counter.value - before.get(name, 0)
+    return timings, llm.calls, len(searches), used
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default="data/imdb_top_1000.csv")
+    parser.add_argument("--questions", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--search-latency", type=float, default=0.5)
+    parser.add_argument("--budget", type=int, default=60)
+    parser.add_argument("--rephrase", action="store_true")
+    args = parser.parse_args()
+
+    database = MovieDatabase(args.csv)
+    print(
+        f"{'mode':>11} {'p50 s':>7} {'p95 s':>7} {'mean s':>7} {'LLM calls':>10} "
+        f"{'searches':>9} {'graph used':>11} {'search used':>12}"
+    )
+    for speculate in (False, True):
+        timings, llm_calls, searches, used = run(database, args, speculate)
+        p95 = statistics.quantiles(timings, n=20)[-1]
+        print(
+            f"{'speculative' if speculate else 'sequential':>11} "
+            f"{statistics.median(timings):>7.2f} {p95:>7.2f} "
+            f"{statistics.mean(timings):>7.2f} {llm_calls:>10} {searches:>9} "
+            f"{used.get('Movies_chain', 0):>11.0f} {used.get('Search', 0):>12.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Compare the peak memory of loading a catalog at once and in chunks
+
+Each load runs in a fresh process on a synthetic catalog of the requested
+size. The ``full`` load reads the whole csv file, copies it into dicts and
+then builds the graph, the ``chunked`` load streams chunks of rows into the
+graph. The ``database`` loads run ``MovieDatabase(csv)`` itself, with its
+indexes and aggregate views, reading the csv file in one chunk and in chunks
+of ``--chunksize`` rows. The peak resident memory above the one of the
+imports is printed with the number of graph nodes and the load time.
+
+Usage:
+    python benchmarks/streaming_ingest.py --sizes 10000,100000 --chunksize 10000
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from database import BACKENDS, MovieDatabase  # noqa: E402
+from suite import synthetic_csv  # noqa: E402
+
+MODES = ("full", "chunked", "database full", "database")
+
+
+def peak_rss() -> float:
+    """Get the peak resident memory of the process in MiB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+
+def load(csv_file: str, mode: str, backend: str, chunksize: int):
+    """Build the graph of a catalog and print the peak memory as JSON"""
+    loader = MovieDatabase.__new__(MovieDatabase)
+    before = peak_rss()
+    start = time.perf_counter()
+    if mode.startswith("database"):
+        if mode == "database full":
+            chunksize = sum(1 for _ in open(csv_file))
+        graph = MovieDatabase(csv_file, backend=backend, chunksize=chunksize).graph
+    elif mode == "full":
+        features = loader.get_features(loader.process_csv(csv_file))
+        if backend == "compact":
+            graph = loader.create_compact_graph(*features)
+        else:
+            graph = loader.create_graph(*features)
+        del features
+    else:
+        chunks = loader.read_csv_chunks(csv_file, chunksize)
+        if backend == "compact":
+            graph = loader.create_compact_graph_from_chunks(chunks)
+        else:
+            graph = loader.create_graph_from_chunks(chunks)
+    seconds = time.perf_counter() - start
+    peak = peak_rss() - before
+    print(json.dumps({"peak": peak, "seconds": seconds, "nodes": len(graph)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default="data/imdb_top_1000.csv")
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--chunksize", type=int, default=10000)
+    parser.add_argument("--backend", choices=BACKENDS, default="networkx")
+    parser.add_argument(
+        "--load", nargs=2, metavar=("CSV", "MODE"), help=argparse.SUPPRESS
+    )
+    args = parser.parse_args()
+
+    if args.load:
+        load(*args.load, args.backend, args.chunksize)
+        return
+
+    print(f"{'titles':>8} {'mode':<16} {'peak MiB':>9} {'load s':>7} {'nodes':>8}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        csv_file = synthetic_csv(args.csv, size)
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, __file__, "--load", csv_file, mode]
+                + ["--backend", args.backend, "--chunksize", str(args.chunksize)],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            result = json.loads(output.splitlines()[-1])
+            print(
+                f"{size:>8} {mode:<16} {result['peak']:>9.0f} "
+                f"{result['seconds']:>7.2f} {result['nodes']:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
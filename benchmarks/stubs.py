@@ -0,0 +1,151 @@
+"""Offline stand-ins for the OpenAI LLM and the SerpAPI search tool"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from langchain.llms.base import LLM
+
+GRAPH_PROMPT_MARKER = "Graph parameters here"
+
+
+class StubLLM(LLM):
+    """Deterministic LLM answering the MovieAgent and LLMGraphChain prompts
+
+    Graph chain prompts are answered with the YAML recorded for the question
+    in ``completions``. Agent prompts replay the ``(tool, input)`` actions
+    recorded for the question in ``traces``, one per step, and give the
+    final answer after the last one. Without a trace they call
+    ``Movies_chain`` with the question. Every call sleeps ``latency``
+    seconds to mimic a remote model, and is counted in ``calls``.
+    """
+
+    completions: Dict[str, str] = {}
+    traces: Dict[str, List[Tuple[str, str]]] = {}
+    latency: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    @property
+    def _identifying_params(self) -> Mapping[str, Any]:
+        return {"latency": self.latency}
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None) -> str:
+        time.sleep(self.latency)
+        with _calls_lock:
+            self.calls += 1
+        question = prompt.rsplit("Question: ", 1)[1]
+        if GRAPH_PROMPT_MARKER in prompt:
+            question = question.split("\n", 1)[0].strip().strip('"')
+            return self.completions.get(question, "title: Unknown\n")
+        trace = self.traces.get(question.split("\n", 1)[0].strip())
+        step = question.count("\nObservation:")
+        if trace is not None and step < len(trace):
+            tool, tool_input = trace[step]
+            return f" I should use {tool}\nAction: {tool}\nAction Input: {tool_input}"
+        if "\nObservation:" in question:
+            observation = question.rsplit("\nObservation:", 1)[1].strip()
+            first = observation.split("\n", 1)[0]
+            return f" I now know the final answer\nFinal Answer: {first}"
+        question = question.split("\n", 1)[0].strip()
+        return (
+            " I should look in the movie database\n"
+            f"Action: Movies_chain\nAction Input: {question}"
+        )
+
+
+_calls_lock = threading.Lock()
+
+
+class StubSearch:
+    """Search tool returning canned snippets after a fixed latency"""
+
+    def __init__(self, results: Optional[Dict[str, str]] = None, latency: float = 0.0):
+        self.results = results or {}
+        self.latency = latency
+
+    def run(self, query: str) -> str:
+        time.sleep(self.latency)
+        return self.results.get(query, f"No good search result found for {query}")
+
+
+class SearchServer:
+    """Local HTTP server answering like SerpAPI, for SearchClient
+
+    Every request sleeps ``latency`` seconds and gets an organic result
+    snippet naming its query. Above ``rate`` requests per second it answers
+    429 like a rate-limited API. ``requests`` counts the searches received.
+    Use it as a context manager; ``url`` is set once it runs.
+    """
+
+    def __init__(self, latency: float = 0.0, rate: Optional[float] = None):
+        self.latency = latency
+        self.rate = rate
+        self.requests = 0
+        self.limited = 0
+        self.url = ""
+        self._times: List[float] = []
+        self._lock = threading.Lock()
+
+    def _handle(self, handler: BaseHTTPRequestHandler):
+        query = parse_qs(urlparse(handler.path).query).get("q", [""])[0]
+        with self._lock:
+            now = time.monotonic()
+            self._times = [t for t in self._times if t > now - 1]
+            limited = self.rate is not None and len(self._times) >= self.rate
+            if not limited:
+                self._times.append(now)
+            self.requests += 1
+            self.limited += limited
+        time.sleep(self.latency)
+        if limited:
+            status, body = 429, {"error": "Too many requests"}
+        else:
+            status, body = 200, {"organic_results": [{"snippet": f"About {query}"}]}
+        payload = json.dumps(body).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def __enter__(self) -> "SearchServer":
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self._server.server_port}/search"
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def director_questions(database, count: int) -> Dict[str, str]:
+    """Map "Movies directed by X" questions to their recorded YAML"""
+    directors = sorted(
+        node
+        for node, data in database.graph.nodes(data=True)
+        if data["type"] == "director" and not re.search(r"[\n:]", node)
+    )
+    return {
+        f"Movies directed by {director}": f"director: {director}\n"
+        for director in directors[:count]
+    }
@@ -0,0 +1,268 @@
+"""Offline benchmark suite for the movie graph and the /predict endpoint
+
+Synthetic catalogs of the requested sizes are generated from the names of
+the source csv file. For each one the suite times the graph construction,
+query_movies, get_attributes_from_node and the parsing of the LLM output
+and of the tool observation. /predict is then timed end to end on the
+source catalog, with the stub LLM and search tool, for a mix of questions
+answered by the fast path and by the agent. Latency percentiles and
+throughput are printed per stage and can be saved as JSON and compared
+with an earlier run.
+
+Usage:
+    python benchmarks/suite.py --sizes 10000,100000 --output results.json
+    python benchmarks/suite.py --sizes 10000 --compare results.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from unittest import mock
+
+import pandas as pd
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from agent import MovieAgent  # noqa: E402
+from database import BACKENDS, MovieDatabase  # noqa: E402
+from query_batch import query_mix  # noqa: E402
+from results import format_results  # noqa: E402
+from run import build_dict, get_attributes_from_node  # noqa: E402
+from stubs import StubLLM, StubSearch, director_questions  # noqa: E402
+
+
+def synthetic_csv(csv_file: str, titles: int, seed: int = 0) -> str:
+    """Write a catalog of new titles recombining the source names
+
+    Titles join the first and last words of two source titles, people join
+    first and last names of source people, and the pool of people grows with
+    the catalog, so the graph keeps a realistic number of nodes per title.
+    """
+    source = pd.read_csv(csv_file)
+    source = source[source["Released_Year"] != "PG"]
+    rng = random.Random(seed)
+
+    people = pd.concat(
+        [source[c] for c in ["Director", "Star1", "Star2", "Star3", "Star4"]]
+    )
+    names = [name.split() for name in people.unique() if "," not in name]
+    firsts = [name[0] for name in names]
+    lasts = [name[-1] for name in names if len(name) > 1]
+    n_directors = max(1, titles // 2)
+    n_actors = max(4, titles * 3)
+    directors = [
+        f"{rng.choice(firsts)} {rng.choice(lasts)}" for _ in range(n_directors)
+    ]
+    actors = [f"{rng.choice(firsts)} {rng.choice(lasts)}" for _ in range(n_actors)]
+    genres = sorted({g for genre in source["Genre"] for g in genre.split(", ")})
+    words = [title.split() for title in source["Series_Title"]]
+    overviews = source["Overview"].tolist()
+    posters = source["Poster_Link"].tolist()
+
+    rows, seen = [], set()
+    for _ in range(titles):
+        a, b = rng.choice(words), rng.choice(words)
+        title = " ".join(a[: (len(a) + 1) // 2] + b[len(b) // 2 :])
+        if title in seen:
+            title = f"{title} {len(seen)}"
+        seen.add(title)
+        rows.append(
+            {
+                "Poster_Link": rng.choice(posters),
+                "Series_Title": title,
+                "Released_Year": rng.randint(1920, 2023),
+                "Certificate": "U",
+                "Runtime": f"{rng.randint(70, 210)} min",
+                "Genre": ", ".join(rng.sample(genres, rng.randint(1, 3))),
+                "IMDB_Rating": round(rng.uniform(7.5, 9.3), 1),
+                "Overview": rng.choice(overviews),
+                "Meta_score": rng.randint(40, 100),
+                "Director": rng.choice(directors),
+                "Star1": rng.choice(actors),
+                "Star2": rng.choice(actors),
+                "Star3": rng.choice(actors),
+                "Star4": rng.choice(actors),
+                "No_of_Votes": rng.randint(25000, 2500000),
+                "Gross": "",
+            }
+        )
+    path = Path(tempfile.mkdtemp()) / f"synthetic_{titles}.csv"
+    pd.DataFrame(rows).to_csv(path, index=False)
+    return str(path)
+
+
+def summarize(timings: List[float], elapsed: Optional[float] = None) -> Dict:
+    """Get the latency percentiles in milliseconds and the throughput per second"""
+    if len(timings) > 1:
+        percentiles = statistics.quantiles(timings, n=100, method="inclusive")
+        p50, p95, p99 = statistics.median(timings), percentiles[94], percentiles[98]
+    else:
+        p50 = p95 = p99 = timings[0]
+    return {
+        "count": len(timings),
+        "p50_ms": p50 * 1e3,
+        "p95_ms": p95 * 1e3,
+        "p99_ms": p99 * 1e3,
+        "throughput": len(timings) / (elapsed or sum(timings)),
+    }
+
+
+def timed(func: Callable, items: List) -> Dict:
+    """Time func on every item and summarize the timings"""
+    timings = []
+    start = time.perf_counter()
+    for item in items:
+        item_start = time.perf_counter()
+        func(item)
+        timings.append(time.perf_counter() - item_start)
+    return summarize(timings, time.perf_counter() - start)
+
+
+def run_catalog(csv_file: str, args) -> Dict:
+    """Time the graph stages on one catalog"""
+    results = {}
+    builds = []
+    for _ in range(args.build_repeat):
+        start = time.perf_counter()
+        database = MovieDatabase(csv_file, backend=args.backend, scoring=args.scoring)
+        builds.append(time.perf_counter() - start)
+    results["build"] = summarize(builds)
+
+    queries = query_mix(database, args.queries)
+    results["query_movies"] = timed(
+        lambda params: database.query_movies(**params), queries
+    )
+
+    rng = random.Random(0)
+    titles = rng.choices(database.index.titles, k=args.queries)
+    results["attributes"] = timed(
+        lambda title: get_attributes_from_node(database.graph, title), titles
+    )
+
+    # LLM completions and Movies_chain observations, as the agent sees them
+    outputs = [
+        (
+            yaml.safe_dump(params),
+            format_results(database.query_movies(**params)),
+        )
+        for params in queries
+    ]
+    outputs = [output for output in outputs if output[1]]
+    results["parse"] = timed(
+        lambda output: (yaml.safe_load(output[0]), build_dict(output[1])), outputs
+    )
+    return results
+
+
+def run_predict(args) -> Dict:
+    """Time /predict end to end with the stub LLM and search tool"""
+    database = MovieDatabase(args.csv)
+    recorded = director_questions(database, args.requests)
+
+    # Half of the questions match the fast path, the other half need the agent
+    questions, completions = [], {}
+    for i, (question, completion) in enumerate(recorded.items()):
+        if i % 2:
+            question = f"Could you recommend {question.lower()} for a quiet evening?"
+        questions.append(question)
+        completions[question] = completion
+
+    llm = StubLLM(completions=completions, latency=args.latency)
+    initialize = MovieAgent.initialize.__func__
+
+    def offline_initialize(cls, movie_graph, *init_args, **kwargs):
+        kwargs.update(llm=llm, search=StubSearch(latency=args.latency))
+        return initialize(cls, movie_graph, *init_args, **kwargs)
+
+    from endpoints import service
+    from fastapi.testclient import TestClient
+    from main import app
+
+    # The app starts loading the agent once the client is entered
+    patch = mock.patch.object(MovieAgent, "initialize", classmethod(offline_initialize))
+    with patch, TestClient(app) as client:
+        if not service.wait(timeout=300):
+            raise RuntimeError(f"Service did not start: {service.errors}")
+
+        def predict(question: str):
+            response = client.get("/predict", params={"message": question})
+            response.raise_for_status()
+
+        # The default stdout handler still prints the agent trace, keep it quiet
+        with contextlib.redirect_stdout(io.StringIO()):
+            return timed(predict, questions)
+
+
+def print_results(results: Dict, baseline: Optional[Dict] = None):
+    header = (
+        f"{'catalog':<10} {'stage':<13} {'p50 ms':>9} {'p95 ms':>9} "
+        f"{'p99 ms':>9} {'ops/s':>10}"
+    )
+    print(header + (f" {'p50 vs base':>12}" if baseline else ""))
+    for catalog, stages in results["catalogs"].items():
+        for stage, summary in stages.items():
+            line = (
+                f"{catalog:<10} {stage:<13} {summary['p50_ms']:>9.3f} "
+                f"{summary['p95_ms']:>9.3f} {summary['p99_ms']:>9.3f} "
+                f"{summary['throughput']:>10.1f}"
+            )
+            base = (baseline or {}).get("catalogs", {}).get(catalog, {}).get(stage)
+            if base:
+                line += f" {summary['p50_ms'] / base['p50_ms']:>11.2f}x"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--csv", default="data/imdb_top_1000.csv")
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--backend", default="networkx", choices=BACKENDS)
+    parser.add_argument("--scoring", default="index")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--build-repeat", type=int, default=1)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--skip-predict", action="store_true")
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of an earlier run")
+    args = parser.parse_args()
+
+    results = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "args": vars(args),
+        "catalogs": {},
+    }
+    for size in [int(size) for size in args.sizes.split(",") if size]:
+        csv_file = synthetic_csv(args.csv, size)
+        results["catalogs"][str(size)] = run_catalog(csv_file, args)
+    if not args.skip_predict:
+        results["catalogs"]["source"] = {"predict": run_predict(args)}
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Measure the overhead of the tracing spans, metrics and callback handler
+
+Times an empty span with and without a request trace, the callbacks of one
+agent step through the tracing handler, and query_movies with and without
+its span.
+
+Usage:
+    python benchmarks/tracing_overhead.py --queries 2000
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from langchain.schema import Generation, LLMResult
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import tracing  # noqa: E402
+from callbacks import TracingCallbackHandler  # noqa: E402
+from database import MovieDatabase  # noqa: E402
+from query_batch import query_mix  # noqa: E402
+
+
+def per_call(func, repeat: int) -> float:
+    """Get the mean time of a call in microseconds"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def empty_span():
+    with tracing.span("benchmark"):
+        pass
+
+
+def agent_step(handler: TracingCallbackHandler, response: LLMResult):
+    """Replay the callbacks of one agent step calling the movie tool"""
+    handler.on_chain_start({"name": "AgentExecutor"}, {})
+    handler.on_llm_start({}, [""])
+    handler.on_llm_end(response)
+    handler.on_tool_start({"name": "Movies_chain"}, "")
+    handler.on_chain_start({"name": "LLMGraphChain"}, {})
+    handler.on_llm_start({}, [""])
+    handler.on_llm_end(response)
+    handler.on_chain_end({})
+    handler.on_tool_end("")
+    handler.on_chain_end({})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default="data/imdb_top_1000.csv")
+    parser.add_argument("--repeat", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"empty span, no trace:      {per_call(empty_span, args.repeat):7.2f} us")
+    with tracing.trace() as trace:
+        cost = per_call(empty_span, args.repeat)
+    print(f"empty span, request trace: {cost:7.2f} us ({len(trace.spans)} spans)")
+
+    handler = TracingCallbackHandler()
+    usage = {"prompt_tokens": 900, "completion_tokens": 40, "total_tokens": 940}
+    response = LLMResult(
+        generations=[[Generation(text="")]], llm_output={"token_usage": usage}
+    )
+    cost = per_call(lambda: agent_step(handler, response), args.repeat // 10)
+    print(f"callbacks of an agent step: {cost:6.2f} us")
+
+    database = MovieDatabase(args.csv)
+    queries = query_mix(database, args.queries)
+    funcs = {
+        "untraced": MovieDatabase.query_movies.__wrapped__,
+        "traced": MovieDatabase.query_movies,
+    }
+    # Warm the attribute caches, then alternate the two versions on every query
+    for params in queries:
+        database.query_movies(**params)
+    runs = {name: [] for name in funcs}
+    for params in queries * 2:
+        for name, func in funcs.items():
+            start = time.perf_counter()
+            func(database, **params)
+            runs[name].append(time.perf_counter() - start)
+    for name, timings in runs.items():
+        print(
+            f"query_movies {name:<9} p50 {statistics.median(timings) * 1e6:8.1f} us  "
+            f"mean {statistics.mean(timings) * 1e6:8.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
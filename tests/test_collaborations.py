@@ -0,0 +1,52 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "backend"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from database import MovieDatabase  # noqa: E402
+from traversal import collaboration_answer  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def database():
+    return MovieDatabase(str(ROOT / "data" / "imdb_top_1000.csv"))
+
+
+def test_people_who_worked_with_everyone(database):
+    answer = collaboration_answer(database, "Al Pacino, Robert De Niro")
+    assert answer.splitlines()[0] == "Martin Scorsese: 7 shared movies"
+    assert all(line.endswith("shared movies") for line in answer.splitlines())
+
+
+def test_path_between_two_people(database):
+    answer = collaboration_answer(database, "Christopher Nolan -> Steven Spielberg")
+    path = answer.split(" -> ")
+    assert path[0] == "Christopher Nolan"
+    assert path[-1] == "Steven Spielberg"
+
+
+def test_unknown_person(database):
+    answer = collaboration_answer(database, "Nobody Here Xyz, Tom Hanks")
+    assert answer == "No actor or director named Nobody Here Xyz"
+
+
+def test_agent_run_with_only_collaborations(database, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("SERPAPI_API_KEY", "test")
+    from agent import MovieAgent
+    from run import get_result_and_thought_using_graph
+    from stubs import StubLLM, StubSearch
+
+    question = "Who worked with both Al Pacino and Robert De Niro?"
+    trace = [("Collaborations", "Al Pacino, Robert De Niro")]
+    llm = StubLLM(traces={question: trace})
+    agent = MovieAgent.initialize(database, llm=llm, search=StubSearch())
+
+    result = get_result_and_thought_using_graph(agent, database, question)
+
+    assert result["movies"] == []
+    assert result["response"] == "Martin Scorsese: 7 shared movies"
@@ -0,0 +1,37 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "backend"))
+
+from database import MovieDatabase  # noqa: E402
+from fast_path import FastPath  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def fast_path():
+    return FastPath(MovieDatabase(str(ROOT / "data" / "imdb_top_1000.csv")))
+
+
+def test_only_titles_matching_every_value(fast_path):
+    answer = fast_path.answer("drama movies with Tom Hanks from 1994")
+    assert [movie["title"] for movie in answer["movies"]] == ["Forrest Gump"]
+    assert answer["response"] == "Here are the movies you asked for: Forrest Gump."
+
+
+def test_partial_matches_go_to_the_agent(fast_path):
+    assert fast_path.parse("horror movies from 2010") == {
+        "genre": "Horror",
+        "year": 2010,
+    }
+    assert fast_path.answer("horror movies from 2010") is None
+
+
+def test_batch_answers_in_order(fast_path):
+    questions = ["movies with Tom Hanks", "Who is Tom Hanks?", "Tom Hanks movies"]
+    answers = fast_path.answer_batch(questions)
+    assert answers[0] == fast_path.answer(questions[0])
+    assert answers[1] is None
+    assert answers[2] is answers[0]
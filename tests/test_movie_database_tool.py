@@ -0,0 +1,45 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "backend"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from cache import TTLCache, normalize_question  # noqa: E402
+from database import MovieDatabase  # noqa: E402
+from movie_database_tool import LLMGraphChain  # noqa: E402
+from stubs import StubLLM  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def database():
+    return MovieDatabase(str(ROOT / "data" / "imdb_top_1000.csv"))
+
+
+def chain(database, completions):
+    return LLMGraphChain(
+        llm=StubLLM(completions=completions),
+        graph=database,
+        question_cache=TTLCache(maxsize=16),
+    )
+
+
+def test_accepted_parameters_are_cached(database):
+    question = "Movies directed by Christopher Nolan"
+    tool = chain(database, {question: "director: Christopher Nolan\n"})
+
+    assert "The Dark Knight" in tool.run(question)
+    assert tool.question_cache.get(normalize_question(question)) == {
+        "director": "Christopher Nolan"
+    }
+
+
+def test_rejected_parameters_are_not_cached(database):
+    question = "Movies with a budget of a million"
+    tool = chain(database, {question: "budget: 1000000\n"})
+
+    with pytest.raises(TypeError):
+        tool.run(question)
+    assert tool.question_cache.get(normalize_question(question)) is None
@@ -0,0 +1,50 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "backend"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from aggregates import stats_answer  # noqa: E402
+from database import MovieDatabase  # noqa: E402
+from results import capture_results  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def database():
+    return MovieDatabase(str(ROOT / "data" / "imdb_top_1000.csv"))
+
+
+def test_group_keeps_its_best_rated_titles(database):
+    with capture_results() as runs:
+        answer = stats_answer(database, "director: Christopher Nolan")
+    assert answer.startswith("Christopher Nolan (director): 8 movies")
+    assert runs.results[None][0].title == "The Dark Knight"
+
+
+@pytest.mark.parametrize(
+    "text", ["hello", "actor: Nobody Here Xyz", "decade: foo", "rank: genre"]
+)
+def test_other_answers_keep_no_result(database, text):
+    with capture_results() as runs:
+        stats_answer(database, text)
+    assert runs.results[None] == []
+
+
+def test_agent_run_with_an_unparsed_stats_input(database, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("SERPAPI_API_KEY", "test")
+    from agent import MovieAgent
+    from run import get_result_and_thought_using_graph
+    from stubs import StubLLM, StubSearch
+
+    question = "Stats for name?"
+    llm = StubLLM(traces={question: [("Movie_stats", "name")]})
+    agent = MovieAgent.initialize(database, llm=llm, search=StubSearch())
+
+    result = get_result_and_thought_using_graph(agent, database, question)
+
+    assert result["movies"] == []
+    assert result["response"].startswith("Give one of director")